@@ -1,43 +1,103 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Query
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
-from typing import List
+from fastapi.responses import HTMLResponse, StreamingResponse
+from typing import Any, Dict, List, Literal, Optional
 import uuid
+import math
+import logging
+import time
 import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta
+from celery import states
 
 from app.models.models import SearchHistory
 from .schemas import (
-    WeatherRequest, WeatherResponse, CitySuggestionsResponse,
-    UserHistoryResponse, SearchStatsResponse, HealthResponse
+    WeatherRequest, WeatherResponse, CitySuggestionsResponse, CoordsWeatherResponse,
+    UserHistoryResponse, SearchStatsResponse, HealthResponse, BatchWeatherRequest
 )
 from .services.weather_service import WeatherService
+from .services.search_service import (
+    get_weather_for_user, get_user_history_page, lookup_error, record_search, stats_store
+)
+from .services.cache_service import CacheEntry, normalize_city_key
+from .services.rate_limiter import UpstreamUnavailable
+from .services.stats_service import STATS_WINDOWS
+from .services.geo_index import CityIndex, normalize_city_name
+from app.core.config import settings
+from app.core.serialization import FastJSONResponse, dumps
+from app.core.static_assets import static_url
+from app.core.http_cache import cache_headers, etag_matches, make_etag, not_modified
+from app.core.metrics import observe_db
+from app.core.tracing import span
 from app.celery_dir.tasks import get_weather_async
+from app.celery_dir.celery_app import celery_app
+from app.celery_dir.result_waiter import CeleryResultWaiter
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = static_url
 weather_service = WeatherService()
+result_waiter = CeleryResultWaiter(celery_app)
+city_index = CityIndex()
 
 
 async def wait_for_celery_task(task, timeout=30):
-    """Асинхронное ожидание Celery задачи"""
-    max_iterations = timeout * 10  # Проверяем каждые 100мс
+    """Асинхронное ожидание Celery задачи (через pub/sub, без опроса)"""
+    try:
+        with span("celery.wait", **{"celery.task_id": task.id}):
+            meta = await result_waiter.wait(task.id, timeout)
+    except asyncio.TimeoutError:
+        raise Exception("Task timeout exceeded")
     
-    for _ in range(max_iterations):
-        if task.ready():
-            if task.successful():
-                return task.result
-            else:
-                # Если задача завершилась с ошибкой
-                raise Exception(f"Task failed: {task.info}")
-        
-        # Асинхронная пауза 100мс
-        await asyncio.sleep(0.1)
+    if meta["status"] == states.SUCCESS:
+        return meta["result"]
+    
+    # Если задача завершилась с ошибкой
+    error = meta["result"]
+    if isinstance(error, dict):
+        error = celery_app.backend.exception_to_python(error)
+    raise Exception(f"Task failed: {error}")
+
+
+def lookup_error_response(result: Dict[str, Any]) -> HTTPException:
+    """HTTP ошибка для результата получения погоды с ошибкой"""
+    if result.get("status_code") == 503:
+        # Retry-After подсказывает клиенту, когда API снова будет доступен
+        retry_after = max(1, math.ceil(result.get("retry_after") or 0))
+        return HTTPException(status_code=503, detail=result["error"], headers={"Retry-After": str(retry_after)})
+    return HTTPException(status_code=404, detail=result["error"])
+
+
+def log_weather_lookup(route: str, city: str, result: Dict[str, Any]):
+    """Сэмплируемое событие о получении погоды (результат целиком - только на DEBUG)"""
+    logger.info(
+        "Weather lookup finished", extra={"sample": route, "city": city, "error": result.get("error")}
+    )
+    logger.debug("Weather lookup result for %s: %s", city, result, extra={"sample": route})
+
+
+async def run_weather_lookup(city: str, user_id: str, timeout: float = 30):
+    """Получение погоды в режиме выполнения, выбранном для развертывания"""
+    if settings.WEATHER_EXECUTION_MODE == "inline":
+        # Запрос выполняется прямо в event loop веб-приложения
+        lookup = get_weather_for_user(weather_service, city, user_id)
+        try:
+            return await asyncio.wait_for(lookup, timeout)
+        except asyncio.TimeoutError:
+            raise
+        except Exception as e:
+            return lookup_error(e)
     
-    # Если таймаут превышен
-    raise Exception("Task timeout exceeded")
+    # Запускаем Celery задачу
+    task = get_weather_async.delay(city, user_id)
+    logger.debug("Weather task %s published for %s", task.id, city)
+    
+    # Асинхронно ожидаем результат
+    return await wait_for_celery_task(task, timeout=timeout)
 
 
 @router.get("/", response_class=HTMLResponse, include_in_schema=False)
@@ -47,10 +107,10 @@ async def home(request: Request):
     recent_cities = []
     
     if user_id:
-        recent_searches = await SearchHistory.filter(
-            user_id=user_id
-        ).order_by("-timestamp").limit(5)
-        recent_cities = [search.city for search in recent_searches]
+        with observe_db("recent_cities"):
+            recent_cities = await SearchHistory.filter(
+                user_id=user_id
+            ).order_by("-timestamp").limit(5).values_list("city", flat=True)
     
     return templates.TemplateResponse("index.html", {
         "request": request,
@@ -59,13 +119,34 @@ async def home(request: Request):
 
 
 @router.get("/cities/suggestions", response_model=CitySuggestionsResponse)
-async def get_city_suggestions(q: str):
+async def get_city_suggestions(q: str, request: Request):
     """Автодополнение городов"""
     try:
-        suggestions = await weather_service.search_cities(q)
-        return CitySuggestionsResponse(suggestions=suggestions)
+        # Ответ зависит только от запроса и содержимого индекса. ETag слабый:
+        # тело отдается в разных Content-Encoding (gzip, br, без сжатия)
+        etag = make_etag("suggestions", city_index.version, normalize_city_name(q), weak=True)
+        headers = cache_headers(etag, settings.SUGGESTIONS_CACHE_MAX_AGE)
+        if etag_matches(request, etag):
+            return not_modified(headers)
+        
+        # Сначала локальный индекс, внешний API - только при промахе
+        suggestions = city_index.search(q, limit=5)
+        if not suggestions:
+            suggestions = await weather_service.search_cities(q)
+            # Сохраняем только каноническое название: запрос мог быть опечаткой
+            # или общим префиксом нескольких городов
+            for city in suggestions:
+                city_index.add(city)
+            headers = cache_headers(
+                make_etag("suggestions", city_index.version, normalize_city_name(q), weak=True),
+                settings.SUGGESTIONS_CACHE_MAX_AGE
+            )
+        response = CitySuggestionsResponse(suggestions=suggestions)
+        return FastJSONResponse(content=response.model_dump(), headers=headers)
+    except UpstreamUnavailable as e:
+        raise lookup_error_response(lookup_error(e))
     except Exception as e:
-        print(f"Error in city suggestions: {e}")  # Добавляем логирование
+        logger.exception("City suggestions failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -77,29 +158,23 @@ async def get_weather(request: Request, weather_request: WeatherRequest):
         if not user_id:
             user_id = str(uuid.uuid4())
         
-        print(f"Starting weather task for city: {weather_request.city}, user: {user_id}")
-        
-        # Запускаем Celery задачу
-        task = get_weather_async.delay(weather_request.city, user_id)
-        print(f"Task ID: {task.id}")
-        
-        # Асинхронно ожидаем результат
-        result = await wait_for_celery_task(task, timeout=30)
-        
-        print(f"Task completed with result: {result}")
+        result = await run_weather_lookup(weather_request.city, user_id)
+        log_weather_lookup("weather", weather_request.city, result)
         
         if "error" in result:
-            raise HTTPException(status_code=404, detail=result["error"])
+            raise lookup_error_response(result)
         
-        response = JSONResponse(content=result)
+        response = FastJSONResponse(content=result)
         response.set_cookie(key="user_id", value=user_id, max_age=30*24*3600)
         
         return response
     
+    except HTTPException:
+        raise
     except asyncio.TimeoutError:
         raise HTTPException(status_code=408, detail="Request timeout - weather service is taking too long")
     except Exception as e:
-        print(f"Error in get_weather: {e}")  # Добавляем логирование
+        logger.exception("Get weather failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -114,7 +189,7 @@ async def start_weather_task(request: Request, weather_request: WeatherRequest):
         
         task = get_weather_async.delay(weather_request.city, user_id)
         
-        response = JSONResponse(content={"task_id": task.id})
+        response = FastJSONResponse(content={"task_id": task.id})
         response.set_cookie(key="user_id", value=user_id, max_age=30*24*3600)
         
         return response
@@ -123,95 +198,172 @@ async def start_weather_task(request: Request, weather_request: WeatherRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/weather/batch")
+async def get_weather_batch(batch_request: BatchWeatherRequest):
+    """Погода для списка городов и координат (NDJSON, строка на каждый результат)"""
+    results = weather_service.get_weather_batch(
+        batch_request.cities,
+        [(point.lat, point.lon) for point in batch_request.coords]
+    )
+    
+    async def stream():
+        async for item in results:
+            yield dumps(item) + b"\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/weather/coords", response_model=CoordsWeatherResponse)
+async def get_weather_by_coords(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180)
+):
+    """Получение текущей погоды по координатам (через кэш ячеек geohash)"""
+    try:
+        result = await weather_service.get_weather_by_coords_cached(lat, lon)
+        return FastJSONResponse(content=result)
+    except UpstreamUnavailable as e:
+        raise lookup_error_response(lookup_error(e))
+    except Exception as e:
+        logger.exception("Get weather by coords failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def weather_cache_headers(key: str, entry: Optional[CacheEntry], private: bool) -> Dict[str, str]:
+    """ETag и Cache-Control по версии записи города в кэше погоды"""
+    if entry is None:
+        return {"Cache-Control": "no-cache"}
+    # Слабый ETag: в теле есть время ответа (timestamp), оно меняется при той же записи кэша
+    etag = make_etag("weather", key, entry.stored_at, weak=True)
+    return cache_headers(etag, weather_service.cache.soft_ttl - entry.age(time.time()), private=private)
+
+
 @router.get("/weather/{city}", response_model=WeatherResponse)
 async def get_weather_by_city(city: str, request: Request):
     """Получение прогноза погоды по названию города (GET запрос)"""
     try:
         user_id = request.cookies.get("user_id")
-        if not user_id:
+        new_user = not user_id
+        if new_user:
             user_id = str(uuid.uuid4())
         
-        print(f"Starting weather task for city: {city}, user: {user_id}")
+        key = normalize_city_key(city)
+        if request.headers.get("if-none-match") and not new_user:
+            # Данные в кэше не изменились - отвечаем 304 без запроса погоды
+            entry = await weather_service.cache.get_shared_entry(key)
+            if entry is not None and entry.age(time.time()) < weather_service.cache.soft_ttl:
+                headers = weather_cache_headers(key, entry, private=False)
+                if etag_matches(request, headers["ETag"]):
+                    await record_search(user_id, entry.value)
+                    return not_modified(headers)
         
-        # Запускаем Celery задачу
-        task = get_weather_async.delay(city, user_id)
-        print(f"Task ID: {task.id}")
-        
-        # Асинхронно ожидаем результат
-        result = await wait_for_celery_task(task, timeout=30)
-        
-        print(f"Task completed with result: {result}")
+        result = await run_weather_lookup(city, user_id)
+        log_weather_lookup("weather_by_city", city, result)
         
         if "error" in result:
-            raise HTTPException(status_code=404, detail=result["error"])
+            raise lookup_error_response(result)
         
-        response = JSONResponse(content=result)
-        response.set_cookie(key="user_id", value=user_id, max_age=30*24*3600)
+        # Ответ с Set-Cookie не должен попадать в общие кэши
+        entry = await weather_service.cache.get_shared_entry(key)
+        headers = weather_cache_headers(key, entry, private=new_user)
+        response = FastJSONResponse(content=result, headers=headers)
+        if new_user:
+            response.set_cookie(key="user_id", value=user_id, max_age=30*24*3600)
         
         return response
     
+    except HTTPException:
+        raise
     except asyncio.TimeoutError:
         raise HTTPException(status_code=408, detail="Request timeout - weather service is taking too long")
     except Exception as e:
-        print(f"Error in get_weather_by_city: {e}")  # Добавляем логирование
+        logger.exception("Get weather by city failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def stats_response(stats_data: List[Dict[str, Any]], window: str, headers: Dict[str, str]) -> FastJSONResponse:
+    content = SearchStatsResponse(stats=stats_data, window=window).model_dump()
+    return FastJSONResponse(content=content, headers=headers)
+
+
 @router.get("/stats", response_model=SearchStatsResponse)
-async def get_search_stats():
+async def get_search_stats(request: Request, window: Literal["all", "hour", "day", "month"] = "all"):
     """Статистика поиска городов"""
     try:
+        # Версия растет при каждом обновлении счетчиков, окна к тому же сдвигаются
+        # со временем, поэтому их ETag меняется не реже раза в STATS_UNION_TTL
+        headers = {"Cache-Control": "no-cache"}
+        version = await stats_store.version()
+        if version:
+            period = int(time.time() // settings.STATS_UNION_TTL) if window != "all" else 0
+            headers = cache_headers(make_etag("stats", window, version, period, weak=True), settings.STATS_UNION_TTL)
+            if etag_matches(request, headers["ETag"]):
+                return not_modified(headers)
+        
+        # Счетчики, которые обновляются при записи истории поиска
+        stats_data = await stats_store.top(window, limit=20)
+        if stats_data is not None:
+            return stats_response(stats_data, window, headers)
+        
         from tortoise import connections
         
-        # Получаем соединение с базой данных
+        # Статистика еще не построена или Redis недоступен - считаем по таблице
         conn = connections.get("default")
         
-        # Выполняем raw запрос
-        result = await conn.execute_query_dict(
-            """
-            SELECT city, COUNT(*) as count 
-            FROM search_history 
-            GROUP BY city 
-            ORDER BY count DESC 
-            LIMIT 20
-            """
-        )
+        with observe_db("search_stats"):
+            if window == "all":
+                result = await conn.execute_query_dict(
+                    """
+                    SELECT city, COUNT(*) as count 
+                    FROM search_history 
+                    GROUP BY city 
+                    ORDER BY count DESC 
+                    LIMIT 20
+                    """
+                )
+            else:
+                size, count = STATS_WINDOWS[window]
+                result = await conn.execute_query_dict(
+                    """
+                    SELECT city, COUNT(*) as count 
+                    FROM search_history 
+                    WHERE timestamp >= $1
+                    GROUP BY city 
+                    ORDER BY count DESC 
+                    LIMIT 20
+                    """,
+                    [datetime.utcnow() - timedelta(seconds=size * count)]
+                )
         
         # Теперь result это список словарей
         stats_data = [{"city": row["city"], "count": row["count"]} for row in result]
         
-        return SearchStatsResponse(stats=stats_data)
+        return stats_response(stats_data, window, headers)
         
     except Exception as e:
-        print(f"Error in get_search_stats: {e}")  # Добавляем логирование
+        logger.exception("Get search stats failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/user/history", response_model=UserHistoryResponse)
-async def get_user_history(request: Request):
-    """История поиска пользователя"""
+async def get_user_history(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """История поиска пользователя (постранично, next_cursor - следующая страница)"""
     user_id = request.cookies.get("user_id")
     if not user_id:
         return UserHistoryResponse(history=[])
     
     try:
-        history = await SearchHistory.filter(
-            user_id=user_id
-        ).order_by("-timestamp").limit(50)
-        
-        result = [
-            {
-                "city": h.city,
-                "timestamp": h.timestamp,
-                "temperature": h.temperature
-            }
-            for h in history
-        ]
-        
-        return UserHistoryResponse(history=result)
+        history, next_cursor = await get_user_history_page(user_id, limit, cursor)
+        return UserHistoryResponse(history=history, next_cursor=next_cursor)
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error in get_user_history: {e}")  # Добавляем логирование
+        logger.exception("Get user history failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
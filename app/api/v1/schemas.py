@@ -1,12 +1,33 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional
 from datetime import datetime
 
+from app.core.config import settings
+
 
 class WeatherRequest(BaseModel):
     city: str
 
 
+class Coordinates(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+
+class BatchWeatherRequest(BaseModel):
+    cities: List[str] = []
+    coords: List[Coordinates] = []
+
+    @model_validator(mode="after")
+    def check_size(self):
+        total = len(self.cities) + len(self.coords)
+        if total == 0:
+            raise ValueError("Нужно указать хотя бы один город или координаты")
+        if total > settings.BATCH_MAX_ITEMS:
+            raise ValueError(f"Не более {settings.BATCH_MAX_ITEMS} городов и координат за запрос")
+        return self
+
+
 class WeatherResponse(BaseModel):
     city: str
     country: str
@@ -18,8 +39,23 @@ class WeatherResponse(BaseModel):
     timestamp: datetime
 
 
+class CoordsWeatherResponse(BaseModel):
+    city: str
+    country: str
+    temperature: float
+    feels_like: float
+    humidity: int
+    description: str
+    weather_code: int
+    wind_speed: float
+    # Код погоды OpenWeatherMap (нет у других источников)
+    weather_id: Optional[int] = None
+    tile: str
+
+
 class CityResponse(BaseModel):
     name: str
+    display_name: Optional[str] = None
     country: str
     lat: float
     lon: float
@@ -37,6 +73,7 @@ class SearchHistoryItem(BaseModel):
 
 class UserHistoryResponse(BaseModel):
     history: List[SearchHistoryItem]
+    next_cursor: Optional[str] = None
 
 
 class SearchStatsItem(BaseModel):
@@ -46,6 +83,7 @@ class SearchStatsItem(BaseModel):
 
 class SearchStatsResponse(BaseModel):
     stats: List[SearchStatsItem]
+    window: str = "all"
 
 
 class HealthResponse(BaseModel):
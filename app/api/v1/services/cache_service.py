@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from app.core.redis_client import get_redis
+from app.core.serialization import dumps, loads
+from .singleflight import SingleFlight
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_city_key(city: str) -> str:
+    """Нормализованный ключ города для кэша ("  New   York " -> "new york")"""
+    return " ".join(city.split()).casefold()
+
+
+class CacheEntry:
+    """Значение в кэше с временем сохранения"""
+
+    __slots__ = ("value", "stored_at")
+
+    def __init__(self, value: Any, stored_at: float):
+        self.value = value
+        self.stored_at = stored_at
+
+    def age(self, now: float) -> float:
+        return now - self.stored_at
+
+
+class LRUCache:
+    """Ограниченный по размеру LRU кэш с TTL"""
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry.age(self._clock()) >= self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CacheEntry):
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class WeatherCache:
+    """Двухуровневый кэш: LRU в памяти процесса + Redis.
+
+    Записи старше soft_ttl отдаются сразу, а в фоне запускается их обновление
+    (stale-while-revalidate). Записи старше hard_ttl считаются отсутствующими,
+    но хранятся еще stale_ttl секунд на случай недоступности внешнего API.
+    Одновременные промахи по одному ключу объединяются в один запрос.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "weather",
+        maxsize: int = settings.WEATHER_CACHE_MAXSIZE,
+        soft_ttl: float = settings.WEATHER_CACHE_SOFT_TTL,
+        hard_ttl: float = settings.WEATHER_CACHE_HARD_TTL,
+        stale_ttl: float = settings.WEATHER_CACHE_STALE_TTL,
+        redis_url: Optional[str] = settings.REDIS_URL,
+        redis: Optional[aioredis.Redis] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.namespace = namespace
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.stale_ttl = stale_ttl
+        self.redis_url = redis_url
+        self._clock = clock
+        self._local = LRUCache(maxsize, hard_ttl + stale_ttl, clock)
+        self._redis = redis
+        self._refreshing: Set[str] = set()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self._flight = SingleFlight(namespace, redis_url=redis_url, redis=redis)
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        # Переданный клиент или общий клиент процесса
+        if self._redis is not None:
+            return self._redis
+        return get_redis(self.redis_url)
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """Поиск записи сначала в памяти процесса, затем в Redis"""
+        entry = self._get_local(key)
+        if entry is not None:
+            return entry
+        return await self.get_shared_entry(key)
+
+    async def get_shared_entry(self, key: str) -> Optional[CacheEntry]:
+        """Запись из Redis, общая для всех процессов (без Redis - из памяти)"""
+        if self._get_redis() is None:
+            return self._get_local(key)
+        entry = await self._read_shared(key)
+        if entry is None or entry.age(self._clock()) >= self.hard_ttl:
+            return None
+        self._local.set(key, entry)
+        return entry
+
+    async def get_stale_entry(self, key: str) -> Optional[CacheEntry]:
+        """Последняя сохраненная запись, даже старше hard_ttl.
+
+        Используется, когда внешний API недоступен: устаревшие данные лучше ошибки.
+        """
+        entries = [self._local.get(key)]
+        if self._get_redis() is not None:
+            entries.append(await self._read_shared(key))
+        entries = [entry for entry in entries if entry is not None]
+        return max(entries, key=lambda entry: entry.stored_at, default=None)
+
+    def _get_local(self, key: str) -> Optional[CacheEntry]:
+        entry = self._local.get(key)
+        if entry is None or entry.age(self._clock()) >= self.hard_ttl:
+            return None
+        return entry
+
+    async def _read_shared(self, key: str) -> Optional[CacheEntry]:
+        try:
+            raw = await self._get_redis().get(self._redis_key(key))
+        except RedisError as e:
+            logger.warning("Redis cache read failed for %s: %s", key, e)
+            return None
+        if raw is None:
+            return None
+        payload = loads(raw)
+        return CacheEntry(payload["value"], payload["stored_at"])
+
+    async def set(self, key: str, value: Any) -> CacheEntry:
+        """Сохранение значения в оба уровня кэша"""
+        entry = CacheEntry(value, self._clock())
+        self._local.set(key, entry)
+
+        redis = self._get_redis()
+        if redis is not None:
+            payload = dumps({"value": value, "stored_at": entry.stored_at})
+            try:
+                await redis.set(self._redis_key(key), payload, ex=int(self.hard_ttl + self.stale_ttl))
+            except RedisError as e:
+                logger.warning("Redis cache write failed for %s: %s", key, e)
+        return entry
+
+    async def delete(self, key: str):
+        self._local.delete(key)
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.delete(self._redis_key(key))
+            except RedisError as e:
+                logger.warning("Redis cache delete failed for %s: %s", key, e)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Значение из кэша или результат fetch() с сохранением в кэш"""
+        entry = await self.get_entry(key)
+        if entry is not None:
+            if entry.age(self._clock()) >= self.soft_ttl:
+                CACHE_REQUESTS.labels(self.namespace, "stale").inc()
+                self._schedule_refresh(key, fetch)
+            else:
+                CACHE_REQUESTS.labels(self.namespace, "hit").inc()
+            return entry.value
+
+        CACHE_REQUESTS.labels(self.namespace, "miss").inc()
+        return await self._flight.do(
+            key,
+            lambda: self._fetch_and_store(key, fetch),
+            lookup=lambda: self._lookup(key)
+        )
+
+    async def refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Принудительное обновление записи независимо от ее возраста"""
+        return await self._flight.do(key, lambda: self._fetch_and_store(key, fetch))
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        await self.set(key, value)
+        return value
+
+    async def _lookup(self, key: str) -> Any:
+        entry = await self.get_entry(key)
+        return entry.value if entry is not None else None
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]):
+        """Фоновое обновление устаревшей записи (не более одного на ключ)"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(key, fetch))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]):
+        try:
+            # Запись могли уже обновить другой процесс или прогрев кэша
+            entry = await self.get_shared_entry(key)
+            if entry is not None and entry.age(self._clock()) < self.soft_ttl:
+                return
+            await self.refresh(key, fetch)
+        except Exception as e:
+            logger.warning("Background refresh failed for %s: %s", key, e)
+        finally:
+            self._refreshing.discard(key)
+
+    async def close(self):
+        """Остановка фоновых обновлений (общий клиент Redis закрывается при остановке процесса)"""
+        for task in list(self._refresh_tasks):
+            task.cancel()
+        if self._refresh_tasks:
+            await asyncio.gather(*self._refresh_tasks, return_exceptions=True)
@@ -0,0 +1,131 @@
+import bisect
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+_EPOCH = date(1970, 1, 1)
+_DAY = 86400
+
+
+class CompactForecast:
+    """Прогноз OpenWeatherMap (/forecast) в колоночном виде.
+
+    Ответ API разбирается один раз: время, температура, вероятность и
+    количество осадков хранятся в массивах array, описания погоды - один
+    раз в списке, на который ссылаются индексы. Агрегаты по дням считаются
+    по срезам массивов, границы суток - по часовому поясу города
+    (city.timezone), а не по дате UTC. Компактная форма сериализуется
+    в JSON (to_dict/from_dict) для хранения в кэше вместо сырого ответа.
+    """
+
+    __slots__ = ("timestamps", "temps", "pop", "rain", "weather", "descriptions", "tz_offset")
+
+    def __init__(
+        self,
+        timestamps: Iterable[int],
+        temps: Iterable[float],
+        pop: Iterable[float],
+        rain: Iterable[float],
+        weather: Iterable[int],
+        descriptions: List[str],
+        tz_offset: int = 0,
+    ):
+        self.timestamps = array("q", timestamps)
+        self.temps = array("d", temps)
+        self.pop = array("d", pop)
+        self.rain = array("d", rain)
+        self.weather = array("H", weather)
+        self.descriptions = descriptions
+        self.tz_offset = tz_offset
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_payload(cls, data: Dict[str, Any]) -> "CompactForecast":
+        """Разбор ответа /forecast"""
+        items = data.get("list", [])
+        descriptions: List[str] = []
+        indexes: Dict[str, int] = {}
+        weather = array("H")
+        for item in items:
+            description = item["weather"][0].get("description", "") if item.get("weather") else ""
+            idx = indexes.get(description)
+            if idx is None:
+                idx = indexes[description] = len(descriptions)
+                descriptions.append(description.title())
+            weather.append(idx)
+
+        return cls(
+            timestamps=(item["dt"] for item in items),
+            temps=(item["main"]["temp"] for item in items),
+            pop=(item.get("pop", 0) for item in items),
+            rain=(item.get("rain", {}).get("3h", 0) for item in items),
+            weather=weather,
+            descriptions=descriptions,
+            tz_offset=data.get("city", {}).get("timezone", 0),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamps": self.timestamps.tolist(),
+            "temps": self.temps.tolist(),
+            "pop": self.pop.tolist(),
+            "rain": self.rain.tolist(),
+            "weather": self.weather.tolist(),
+            "descriptions": self.descriptions,
+            "tz_offset": self.tz_offset,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompactForecast":
+        return cls(**data)
+
+    def _local_time(self, timestamp: int) -> datetime:
+        return datetime.fromtimestamp(timestamp, timezone(timedelta(seconds=self.tz_offset)))
+
+    def day_bounds(self) -> List[Tuple[int, int, int]]:
+        """Границы суток по местному времени: (номер дня, начало, конец среза)"""
+        days = [(timestamp + self.tz_offset) // _DAY for timestamp in self.timestamps]
+        bounds = []
+        start = 0
+        while start < len(days):
+            end = bisect.bisect_right(days, days[start], start)
+            bounds.append((days[start], start, end))
+            start = end
+        return bounds
+
+    def hourly(self, points: int = 8) -> List[Dict[str, Any]]:
+        """Ближайшие points отрезков прогноза (время - местное время города)"""
+        return [
+            {
+                "time": self._local_time(timestamp).isoformat(),
+                "temperature": round(temp),
+                "weather": self.descriptions[weather],
+                "precipitation_probability": round(pop * 100),
+            }
+            for timestamp, temp, weather, pop in zip(
+                self.timestamps[:points], self.temps[:points], self.weather[:points], self.pop[:points]
+            )
+        ]
+
+    def daily(self, days: int = 5) -> List[Dict[str, Any]]:
+        """Минимум, максимум и сумма осадков по местным суткам"""
+        result = []
+        for day, start, end in self.day_bounds()[:days]:
+            # Погода дня - отрезок, ближайший к местному полудню
+            noon = day * _DAY + _DAY // 2 - self.tz_offset
+            midday = min(range(start, end), key=lambda i: abs(self.timestamps[i] - noon))
+            temps = self.temps[start:end]
+            result.append({
+                "date": (_EPOCH + timedelta(days=day)).isoformat(),
+                "temp_max": round(max(temps)),
+                "temp_min": round(min(temps)),
+                "weather": self.descriptions[self.weather[midday]],
+                "precipitation": round(sum(self.rain[start:end]), 1),
+            })
+        return result
+
+    def summary(self, days: int = 5, hourly_points: int = 8) -> Dict[str, List[Dict[str, Any]]]:
+        return {"daily": self.daily(days), "hourly": self.hourly(hourly_points)}
@@ -0,0 +1,128 @@
+import math
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_EARTH_RADIUS_KM = 6371.0
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    """Geohash точки: соседние точки внутри одной ячейки дают одинаковую строку"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    result = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(result) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                bits = bits * 2 + 1
+                lon_range[0] = mid
+            else:
+                bits = bits * 2
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = bits * 2 + 1
+                lat_range[0] = mid
+            else:
+                bits = bits * 2
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            result.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(result)
+
+
+def geohash_center(geohash: str) -> Tuple[float, float]:
+    """Центр ячейки geohash (lat, lon)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между точками по поверхности Земли в километрах"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * _EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class NearestPointIndex:
+    """Сеточный индекс точек для поиска ближайшей закэшированной ячейки.
+
+    Точки раскладываются по ячейкам сетки размером cell_km, поиск
+    просматривает только ячейки в радиусе max_km от запроса. Хранится не
+    больше maxsize точек: при переполнении удаляются давно не добавлявшиеся
+    и не найденные точки (как в LRU кэше ячеек).
+    """
+
+    def __init__(self, cell_km: float = 5.0, maxsize: Optional[int] = None):
+        self.cell_deg = cell_km / 111.0
+        self.maxsize = maxsize
+        self._cells: Dict[Tuple[int, int], Dict[str, Tuple[float, float]]] = {}
+        self._points: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def add(self, key: str, lat: float, lon: float):
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, {})[key] = (lat, lon)
+        self._points[key] = cell
+        while self.maxsize is not None and len(self._points) > self.maxsize:
+            self.remove(next(iter(self._points)))
+
+    def remove(self, key: str):
+        cell = self._points.pop(key, None)
+        if cell is None:
+            return
+        points = self._cells.get(cell)
+        if points is not None:
+            points.pop(key, None)
+            if not points:
+                del self._cells[cell]
+
+    def nearest(self, lat: float, lon: float, max_km: float) -> Optional[str]:
+        """Ключ ближайшей точки не дальше max_km или None"""
+        row, col = self._cell(lat, lon)
+        lat_cells = math.ceil(max_km / (self.cell_deg * 111.0))
+        # Градус долготы короче у полюсов, поэтому по долготе смотрим шире
+        lon_km = self.cell_deg * 111.0 * max(math.cos(math.radians(lat)), 0.01)
+        lon_cells = min(math.ceil(max_km / lon_km), 360)
+
+        best_key, best_distance = None, max_km
+        for d_row in range(-lat_cells, lat_cells + 1):
+            for d_col in range(-lon_cells, lon_cells + 1):
+                for key, (p_lat, p_lon) in self._cells.get((row + d_row, col + d_col), {}).items():
+                    distance = haversine_km(lat, lon, p_lat, p_lon)
+                    if distance <= best_distance:
+                        best_key, best_distance = key, distance
+        if best_key is not None:
+            self._points.move_to_end(best_key)
+        return best_key
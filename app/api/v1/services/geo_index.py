@@ -0,0 +1,187 @@
+import bisect
+import csv
+import difflib
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+def normalize_city_name(name: str) -> str:
+    """Нормализация названия для поиска ("  Ростов-на-Дону " -> "ростов-на-дону")"""
+    return " ".join(name.split()).casefold().replace("ё", "е")
+
+
+def _display_name(name: str, state: str, country: str) -> str:
+    return ", ".join(part for part in (name, state, country) if part)
+
+
+class CityIndex:
+    """Префиксный индекс городов в памяти процесса для автодополнения.
+
+    Все названия (включая альтернативные) хранятся в отсортированном списке,
+    поиск по префиксу - бинарный поиск по нему. Для коротких префиксов
+    (самые частые запросы при наборе) топ городов по населению посчитан
+    заранее. Если по префиксу ничего не найдено, используется нечеткое
+    сравнение с названиями, начинающимися с тех же символов.
+    """
+
+    def __init__(self, prefix_cache_len: int = 3, top_k: int = 10, max_scan: int = 200):
+        self.prefix_cache_len = prefix_cache_len
+        self.top_k = top_k
+        self.max_scan = max_scan
+        self._cities: List[Dict[str, Any]] = []
+        self._populations: List[int] = []
+        self._keys: List[Tuple[str, int]] = []
+        self._top: Dict[str, List[int]] = {}
+        self._ids: Dict[Tuple[str, str, float, float], int] = {}
+        # Отпечаток содержимого: одинаков в процессах, загрузивших те же города
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def _identity(self, city: Dict[str, Any]) -> Tuple[str, str, float, float]:
+        return (
+            normalize_city_name(city["name"]),
+            city["country"],
+            round(float(city["lat"]), 1),
+            round(float(city["lon"]), 1),
+        )
+
+    def _append(self, city: Dict[str, Any], population: int) -> Optional[int]:
+        identity = self._identity(city)
+        if identity in self._ids:
+            return None
+        idx = len(self._cities)
+        self._ids[identity] = idx
+        self.version = zlib.crc32(repr(identity).encode("utf-8"), self.version)
+        self._cities.append({
+            "name": city["name"],
+            "display_name": city.get("display_name") or _display_name(
+                city["name"], city.get("state", ""), city["country"]
+            ),
+            "country": city["country"],
+            "lat": float(city["lat"]),
+            "lon": float(city["lon"]),
+        })
+        self._populations.append(population)
+        return idx
+
+    def _names(self, idx: int, alternate_names: Iterable[str]) -> List[str]:
+        names = {normalize_city_name(self._cities[idx]["name"])}
+        names.update(normalize_city_name(name) for name in alternate_names if name)
+        return sorted(names)
+
+    def _remember_prefixes(self, key: str, idx: int):
+        for length in range(1, min(len(key), self.prefix_cache_len) + 1):
+            top = self._top.setdefault(key[:length], [])
+            if idx in top:
+                continue
+            top.append(idx)
+            top.sort(key=lambda i: -self._populations[i])
+            del top[self.top_k:]
+
+    def add(self, city: Dict[str, Any], alternate_names: Sequence[str] = (), population: int = 0):
+        """Добавление одного города (например, найденного во внешнем API)"""
+        idx = self._append(city, population)
+        if idx is None:
+            return
+        for key in self._names(idx, alternate_names):
+            bisect.insort(self._keys, (key, idx))
+            self._remember_prefixes(key, idx)
+
+    def add_many(self, cities: Iterable[Tuple[Dict[str, Any], Sequence[str], int]]):
+        """Пакетная загрузка городов с одной сортировкой индекса"""
+        new_keys = []
+        for city, alternate_names, population in cities:
+            idx = self._append(city, population)
+            if idx is not None:
+                new_keys.extend((key, idx) for key in self._names(idx, alternate_names))
+        self._keys.extend(new_keys)
+        self._keys.sort()
+        for key, idx in new_keys:
+            self._remember_prefixes(key, idx)
+
+    def load_file(self, path: str) -> int:
+        """Загрузка справочника городов: CSV приложения или cities*.txt GeoNames"""
+        before = len(self)
+        with open(path, encoding="utf-8", newline="") as f:
+            if path.endswith(".txt"):
+                self.add_many(self._read_geonames(f))
+            else:
+                self.add_many(self._read_csv(f))
+        return len(self) - before
+
+    @staticmethod
+    def _read_csv(f):
+        for row in csv.DictReader(f):
+            city = {
+                "name": row["name"],
+                "state": row.get("state", ""),
+                "country": row["country"],
+                "lat": row["lat"],
+                "lon": row["lon"],
+            }
+            alternate_names = [name for name in row.get("alternate_names", "").split("|") if name]
+            yield city, alternate_names, int(row.get("population") or 0)
+
+    @staticmethod
+    def _read_geonames(f):
+        # Формат дампа GeoNames: geonameid, name, asciiname, alternatenames,
+        # latitude, longitude, ..., country code (8), ..., population (14)
+        for line in f:
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) < 15:
+                continue
+            city = {"name": columns[1], "country": columns[8], "lat": columns[4], "lon": columns[5]}
+            alternate_names = [columns[2]] + columns[3].split(",")
+            yield city, alternate_names, int(columns[14] or 0)
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Города, название которых начинается с query, по убыванию населения"""
+        q = normalize_city_name(query)
+        if not q:
+            return []
+
+        if len(q) <= self.prefix_cache_len:
+            ids = list(self._top.get(q, []))
+        else:
+            ids = self._scan_prefix(q)
+            ids.sort(key=lambda i: (normalize_city_name(self._cities[i]["name"]) != q, -self._populations[i]))
+
+        if len(ids) < limit:
+            for idx in self._fuzzy(q, limit):
+                if idx not in ids:
+                    ids.append(idx)
+
+        return [dict(self._cities[i]) for i in ids[:limit]]
+
+    def _scan_prefix(self, prefix: str) -> List[int]:
+        ids: List[int] = []
+        position = bisect.bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and len(ids) < self.max_scan:
+            key, idx = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            if idx not in ids:
+                ids.append(idx)
+            position += 1
+        return ids
+
+    def _fuzzy(self, q: str, limit: int, cutoff: float = 0.75) -> List[int]:
+        """Нечеткий поиск среди названий с теми же первыми символами"""
+        scored: Dict[int, float] = {}
+        for key, idx in self._keys_with_prefix(q[:2] if len(q) > 3 else q[:1]):
+            ratio = difflib.SequenceMatcher(None, q, key[:len(q)]).ratio()
+            if ratio >= cutoff and ratio > scored.get(idx, 0):
+                scored[idx] = ratio
+        return sorted(scored, key=lambda i: (-scored[i], -self._populations[i]))[:limit]
+
+    def _keys_with_prefix(self, prefix: str):
+        position = bisect.bisect_left(self._keys, (prefix,))
+        end = position + self.max_scan * 10
+        while position < min(end, len(self._keys)):
+            key, idx = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            yield key, idx
+            position += 1
@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from tortoise.exceptions import IntegrityError, ValidationError
+
+from app.core.config import settings
+from app.core.metrics import observe_db
+from app.core.redis_client import get_redis
+from app.core.serialization import dumps, loads
+from app.models.models import SearchHistory
+from .stats_service import SearchStatsStore
+
+
+logger = logging.getLogger(__name__)
+
+
+# Атомарный перенос пачки событий из общей очереди в очередь обработки
+_CLAIM_SCRIPT = """
+local items = redis.call("LRANGE", KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call("LTRIM", KEYS[1], #items, -1)
+    redis.call("RPUSH", KEYS[2], unpack(items))
+end
+return items
+"""
+
+# Возврат событий упавшего обработчика в общую очередь
+_REQUEUE_SCRIPT = """
+local items = redis.call("LRANGE", KEYS[1], 0, -1)
+if #items > 0 then
+    redis.call("RPUSH", KEYS[2], unpack(items))
+    redis.call("DEL", KEYS[1])
+end
+return #items
+"""
+
+# Ошибки конкретной строки: повтор пачки с ней не поможет
+_ROW_ERRORS = (ValidationError, IntegrityError)
+# Ошибки разбора события из очереди
+_EVENT_ERRORS = (ValidationError, KeyError, TypeError, ValueError)
+
+_USER_ID_MAX_LENGTH = SearchHistory._meta.fields_map["user_id"].max_length
+_CITY_MAX_LENGTH = SearchHistory._meta.fields_map["city"].max_length
+
+
+class PartialWriteError(Exception):
+    """Запись пачки прервана: remaining - события, которые нужно повторить"""
+
+    def __init__(self, error: Exception, written: List[Dict[str, Any]], remaining: List[Dict[str, Any]]):
+        super().__init__(str(error))
+        self.written = written
+        self.remaining = remaining
+
+
+class SearchHistoryBuffer:
+    """Буфер отложенной записи истории поиска.
+
+    События сначала попадают в список Redis (это все, чего ждет запрос
+    пользователя), затем фоновая задача пачками пишет их в Postgres одним
+    многострочным INSERT. Перед записью пачка переносится в личную очередь
+    обработки; если процесс упадет, очередь вернется в общую после истечения
+    его lease, поэтому события доставляются хотя бы один раз.
+
+    Если пачка не записывается, строки пишутся по одной. Строки с ошибками
+    данных переносятся в список dead-letter ({namespace}:dead), чтобы одно
+    плохое событие не останавливало запись истории. При других ошибках
+    (недоступна БД) запись останавливается, а незаписанные события остаются
+    в очереди до следующей попытки; в dead-letter они попадают только после
+    max_attempts неудачных попыток подряд.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "search_history",
+        redis_url: Optional[str] = settings.REDIS_URL,
+        redis: Optional[aioredis.Redis] = None,
+        batch_size: int = settings.HISTORY_BATCH_SIZE,
+        flush_interval: float = settings.HISTORY_FLUSH_INTERVAL,
+        lease_ttl: int = settings.HISTORY_LEASE_TTL,
+        max_attempts: int = settings.HISTORY_MAX_ATTEMPTS,
+        stats: Optional[SearchStatsStore] = None,
+    ):
+        self.namespace = namespace
+        self.redis_url = redis_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lease_ttl = lease_ttl
+        self.max_attempts = max_attempts
+        self.stats = stats
+        self.consumer_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._redis = redis
+        self._local: List[Dict[str, Any]] = []
+        # Неудачные попытки записи подряд (сбрасываются после успешной)
+        self._failed_attempts = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def pending_key(self) -> str:
+        return f"{self.namespace}:pending"
+
+    @property
+    def dead_key(self) -> str:
+        return f"{self.namespace}:dead"
+
+    def _processing_key(self, consumer_id: str) -> str:
+        return f"{self.namespace}:processing:{consumer_id}"
+
+    def _lease_key(self, consumer_id: str) -> str:
+        return f"{self.namespace}:lease:{consumer_id}"
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        # Переданный клиент или общий клиент процесса
+        if self._redis is not None:
+            return self._redis
+        return get_redis(self.redis_url)
+
+    async def record(
+        self,
+        user_id: str,
+        city: str,
+        temperature: float,
+        timestamp: Optional[datetime] = None,
+    ):
+        """Постановка события поиска в очередь на запись"""
+        # user_id приходит из cookie: длинное значение не должно ломать запись пачки
+        event = {
+            "user_id": user_id[:_USER_ID_MAX_LENGTH],
+            "city": city[:_CITY_MAX_LENGTH],
+            "temperature": temperature,
+            "timestamp": (timestamp or datetime.utcnow()).isoformat(),
+        }
+
+        redis = self._get_redis()
+        length = None
+        if redis is not None:
+            try:
+                length = await redis.rpush(self.pending_key, dumps(event))
+            except RedisError as e:
+                logger.warning("Failed to enqueue search history event: %s", e)
+        if length is None:
+            self._local.append(event)
+            length = len(self._local)
+
+        if length >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """Запуск фоновой записи в БД"""
+        if self._flusher is not None:
+            return
+        # Процессы prefork пула Celery создаются fork'ом после импорта модуля
+        self.consumer_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = asyncio.Event()
+        await self._recover_orphans()
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фоновой записи с финальным сбросом буфера"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Final search history flush failed: %s", e)
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.delete(self._lease_key(self.consumer_id))
+            except RedisError:
+                pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_recovery = loop.time() + self.lease_ttl
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self._renew_lease()
+                await self.flush()
+                if loop.time() >= next_recovery:
+                    await self._recover_orphans()
+                    next_recovery = loop.time() + self.lease_ttl
+            except Exception as e:
+                logger.error("Search history flush failed: %s", e)
+
+    async def flush(self) -> int:
+        """Запись накопленных событий в БД, возвращает число записанных строк"""
+        written = 0
+
+        if self._local:
+            events, self._local = self._local, []
+            try:
+                written += await self._write(events)
+            except PartialWriteError as e:
+                self._local = e.remaining + self._local
+                raise
+            except Exception:
+                self._local = events + self._local
+                raise
+
+        redis = self._get_redis()
+        if redis is None:
+            return written
+
+        processing_key = self._processing_key(self.consumer_id)
+        while True:
+            # Сначала дописываем пачку, запись которой ранее не удалась
+            items = await redis.lrange(processing_key, 0, -1)
+            if not items:
+                items = await redis.eval(
+                    _CLAIM_SCRIPT, 2, self.pending_key, processing_key, self.batch_size
+                )
+            if not items:
+                return written
+
+            try:
+                written += await self._write([loads(item) for item in items])
+            except PartialWriteError as e:
+                # Записанные события убираем из очереди обработки, чтобы не было дублей
+                pipe = redis.pipeline(transaction=True)
+                pipe.delete(processing_key)
+                if e.remaining:
+                    pipe.rpush(processing_key, *[dumps(event) for event in e.remaining])
+                await pipe.execute()
+                raise
+            await redis.delete(processing_key)
+
+    async def _write(self, events: List[Dict[str, Any]]) -> int:
+        """Запись пачки, возвращает число записанных строк"""
+        try:
+            written = await self._insert(events)
+        except PartialWriteError as e:
+            self._failed_attempts += 1
+            await self._count(e.written)
+            raise
+        except Exception:
+            self._failed_attempts += 1
+            raise
+        self._failed_attempts = 0
+        await self._count(written)
+        return len(written)
+
+    async def _count(self, written: List[Dict[str, Any]]):
+        if self.stats is not None and written:
+            # Повторная запись пачки здесь дала бы дубли в БД,
+            # расхождения счетчиков исправляет периодическая сверка
+            try:
+                await self.stats.increment(written)
+            except RedisError as e:
+                logger.warning("Failed to update search stats: %s", e)
+
+    async def _insert(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Запись событий в БД, возвращает записанные события"""
+        rows = []
+        dead = []
+        for event in events:
+            try:
+                rows.append((event, SearchHistory(
+                    user_id=event["user_id"],
+                    city=event["city"],
+                    temperature=event["temperature"],
+                    timestamp=datetime.fromisoformat(event["timestamp"]),
+                )))
+            except _EVENT_ERRORS as e:
+                dead.append((event, e))
+
+        try:
+            with observe_db("history_insert"):
+                await SearchHistory.bulk_create([row for _, row in rows], batch_size=self.batch_size)
+            written = [event for event, _ in rows]
+        except Exception as e:
+            logger.warning("Search history batch insert failed, inserting %s rows one by one: %s", len(rows), e)
+            written = []
+            for position, (event, row) in enumerate(rows):
+                try:
+                    with observe_db("history_insert"):
+                        await row.save()
+                    written.append(event)
+                except _ROW_ERRORS as row_error:
+                    dead.append((event, row_error))
+                except Exception as row_error:
+                    # Вероятно, недоступна БД: незаписанные строки повторятся позже.
+                    # После max_attempts неудач подряд строка считается плохой
+                    if self._failed_attempts + 1 < self.max_attempts:
+                        if dead:
+                            await self._dead_letter(dead)
+                        remaining = [event for event, _ in rows[position:]]
+                        raise PartialWriteError(e, written, remaining) from row_error
+                    dead.append((event, row_error))
+
+        if dead:
+            await self._dead_letter(dead)
+        return written
+
+    async def _dead_letter(self, dead: List[Tuple[Dict[str, Any], Exception]]):
+        """Перенос незаписываемых событий в список dead-letter"""
+        logger.error(
+            "Moved %s search history events to dead letter list %s: %s",
+            len(dead), self.dead_key, dead[0][1],
+        )
+        redis = self._get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.rpush(self.dead_key, *[
+                dumps({"event": event, "error": str(error)}) for event, error in dead
+            ])
+        except RedisError as e:
+            logger.error("Failed to store dead letter search history events %s: %s", dead, e)
+
+    async def _renew_lease(self):
+        redis = self._get_redis()
+        if redis is not None:
+            await redis.set(self._lease_key(self.consumer_id), 1, ex=self.lease_ttl)
+
+    async def _recover_orphans(self):
+        """Возврат событий из очередей обработки процессов без живого lease"""
+        redis = self._get_redis()
+        if redis is None:
+            return
+        try:
+            await self._renew_lease()
+            prefix = self._processing_key("")
+            async for key in redis.scan_iter(match=f"{prefix}*"):
+                consumer_id = key.decode()[len(prefix):]
+                if consumer_id == self.consumer_id:
+                    continue
+                if await redis.exists(self._lease_key(consumer_id)):
+                    continue
+                moved = await redis.eval(_REQUEUE_SCRIPT, 2, key, self.pending_key)
+                if moved:
+                    logger.warning("Requeued %s search history events from %s", moved, consumer_id)
+        except RedisError as e:
+            logger.warning("Search history recovery failed: %s", e)
@@ -0,0 +1,194 @@
+import logging
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import observe_db
+from app.models.models import SearchHistory
+
+
+logger = logging.getLogger(__name__)
+
+TABLE = SearchHistory._meta.db_table
+# Секция по умолчанию: принимает записи, для которых нет секции по времени
+DEFAULT_PARTITION = f"{TABLE}_default"
+# search_history_p20240101_20240102: диапазон [начало, конец) в UTC
+_PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{8}})_(\d{{8}})$")
+
+Period = Tuple[date, date]
+
+
+def partition_name(start: date, end: date) -> str:
+    return f"{TABLE}_p{start:%Y%m%d}_{end:%Y%m%d}"
+
+
+def parse_partition_name(name: str) -> Optional[Period]:
+    """Диапазон секции по ее имени (None для чужих таблиц)"""
+    match = _PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return (
+        datetime.strptime(match.group(1), "%Y%m%d").date(),
+        datetime.strptime(match.group(2), "%Y%m%d").date(),
+    )
+
+
+def _bound(day: date) -> str:
+    return f"'{day.isoformat()} 00:00:00+00'"
+
+
+def _create_partition(start: date, end: date, has_default: bool) -> str:
+    create = (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(start, end)}" PARTITION OF "{TABLE}" '
+        f"FOR VALUES FROM ({_bound(start)}) TO ({_bound(end)})"
+    )
+    if not has_default:
+        return create
+    # Postgres не создает секцию, пока подходящие ей записи лежат в секции по
+    # умолчанию: переносим их через временную таблицу. Скрипт из нескольких
+    # команд выполняется одним запросом, то есть в одной транзакции.
+    moved = f"{TABLE}_moved"
+    return (
+        f'CREATE TEMP TABLE "{moved}" (LIKE "{TABLE}") ON COMMIT DROP;\n'
+        f'WITH moved_rows AS (DELETE FROM "{DEFAULT_PARTITION}" '
+        f'WHERE "timestamp" >= {_bound(start)} AND "timestamp" < {_bound(end)} RETURNING *) '
+        f'INSERT INTO "{moved}" SELECT * FROM moved_rows;\n'
+        f"{create};\n"
+        f'INSERT INTO "{TABLE}" SELECT * FROM "{moved}"'
+    )
+
+
+class HistoryRetention:
+    """Хранение истории поиска в секциях по времени.
+
+    Таблица search_history секционирована по timestamp (миграция
+    2_..._partition_search_history). Задача очистки заранее создает секции
+    на premake_days дней вперед, чтобы вставке всегда было куда писать, и
+    удаляет секции, целиком вышедшие за срок хранения: DROP TABLE секции
+    выполняется мгновенно и не оставляет мертвых строк, в отличие от DELETE.
+    Если таблица не секционирована (миграция не применена), старые записи
+    удаляются через DELETE, как раньше.
+
+    Записи, для которых не нашлось секции (обслуживание не выполнялось
+    дольше premake_days), попадают в секцию search_history_default, а не
+    теряются с ошибкой вставки. При обслуживании для них создаются
+    недостающие секции и записи переносятся туда, устаревшие удаляются;
+    непустая секция по умолчанию отмечается в логе.
+    """
+
+    def __init__(
+        self,
+        partition_days: int = settings.HISTORY_PARTITION_DAYS,
+        premake_days: int = settings.HISTORY_PARTITION_PREMAKE_DAYS,
+        retention_days: int = settings.HISTORY_RETENTION_DAYS,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self.partition_days = partition_days
+        self.premake_days = premake_days
+        self.retention_days = retention_days
+        self._clock = clock
+
+    def period(self, day: date) -> Period:
+        """Границы секции, содержащей день (недельные секции начинаются с понедельника)"""
+        # Порядковый номер 1 - понедельник 0001-01-01
+        start = date.fromordinal((day.toordinal() - 1) // self.partition_days * self.partition_days + 1)
+        return start, start + timedelta(days=self.partition_days)
+
+    def cutoff(self) -> date:
+        """Записи раньше этого дня (UTC) вышли за срок хранения"""
+        return self._clock().date() - timedelta(days=self.retention_days)
+
+    def plan(self, existing: List[Period], oldest: Optional[date] = None) -> Tuple[List[Period], List[Period]]:
+        """Секции, которые нужно создать и удалить: (create, drop)
+
+        oldest - день самой старой записи в секции по умолчанию: секции
+        создаются начиная с него (но не раньше срока хранения).
+        """
+        today = self._clock().date()
+        cutoff = self.cutoff()
+        drop = sorted(period for period in existing if period[1] <= cutoff)
+
+        create: List[Period] = []
+        first_day = today if oldest is None else min(today, max(oldest, cutoff))
+        start, end = self.period(first_day)
+        last_day = today + timedelta(days=self.premake_days)
+        while start <= last_day:
+            # Секции, созданные с другой шириной, не пересоздаем
+            if not any(start < e and s < end for s, e in existing):
+                create.append((start, end))
+            start, end = end, end + timedelta(days=self.partition_days)
+        return create, drop
+
+    async def apply(self, conn) -> Dict[str, Any]:
+        """Обслуживание секций (или DELETE для несекционированной таблицы)"""
+        with observe_db("history_retention"):
+            return await self._apply(conn)
+
+    async def _apply(self, conn) -> Dict[str, Any]:
+        if not await self.is_partitioned(conn):
+            cutoff = self._clock() - timedelta(days=self.retention_days)
+            deleted_count = await SearchHistory.filter(timestamp__lt=cutoff).using_db(conn).delete()
+            return {"deleted_count": deleted_count}
+
+        has_default = await self.has_default_partition(conn)
+        default_rows, oldest = await self.default_partition_rows(conn) if has_default else (0, None)
+        if default_rows:
+            logger.warning(
+                "%s search history rows found in %s, moving them to time partitions", default_rows, DEFAULT_PARTITION
+            )
+            # Устаревшие записи из секции по умолчанию просто удаляем
+            await conn.execute_script(
+                f'DELETE FROM "{DEFAULT_PARTITION}" WHERE "timestamp" < {_bound(self.cutoff())}'
+            )
+
+        create, drop = self.plan(await self.list_partitions(conn), oldest)
+        for start, end in create:
+            await conn.execute_script(_create_partition(start, end, has_default))
+        for start, end in drop:
+            await conn.execute_script(f'DROP TABLE IF EXISTS "{partition_name(start, end)}"')
+
+        result: Dict[str, Any] = {
+            "created": [partition_name(*period) for period in create],
+            "dropped": [partition_name(*period) for period in drop],
+        }
+        if has_default:
+            if default_rows:
+                default_rows, _ = await self.default_partition_rows(conn)
+            if default_rows:
+                logger.error(
+                    "%s search history rows remain in %s after partition maintenance", default_rows, DEFAULT_PARTITION
+                )
+            result["default_rows"] = default_rows
+        return result
+
+    async def is_partitioned(self, conn) -> bool:
+        rows = await conn.execute_query_dict(
+            "SELECT relkind = 'p' AS partitioned FROM pg_class WHERE oid = to_regclass($1)", [TABLE]
+        )
+        return bool(rows) and rows[0]["partitioned"]
+
+    async def has_default_partition(self, conn) -> bool:
+        rows = await conn.execute_query_dict("SELECT to_regclass($1) IS NOT NULL AS present", [DEFAULT_PARTITION])
+        return bool(rows) and rows[0]["present"]
+
+    async def default_partition_rows(self, conn) -> Tuple[int, Optional[date]]:
+        """Число записей в секции по умолчанию и день самой старой из них"""
+        rows = await conn.execute_query_dict(
+            f'SELECT count(*) AS total, min("timestamp") AS oldest FROM "{DEFAULT_PARTITION}"'
+        )
+        oldest = rows[0]["oldest"]
+        return rows[0]["total"], oldest.astimezone(timezone.utc).date() if oldest is not None else None
+
+    async def list_partitions(self, conn) -> List[Period]:
+        rows = await conn.execute_query_dict(
+            """
+            SELECT child.relname AS name
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass($1)
+            """,
+            [TABLE]
+        )
+        periods = (parse_partition_name(row["name"]) for row in rows)
+        return [period for period in periods if period is not None]
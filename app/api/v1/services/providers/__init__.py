@@ -0,0 +1,49 @@
+from typing import Callable, Optional
+
+import aiohttp
+
+from app.core.config import settings
+from .base import WeatherProvider
+from .hedging import HedgedRequests
+from .open_meteo import OpenMeteoProvider
+from .openweathermap import OpenWeatherMapProvider
+
+
+def create_provider(
+    session: Callable[[], aiohttp.ClientSession], name: str = settings.WEATHER_PROVIDER
+) -> WeatherProvider:
+    """Основной источник погоды (WEATHER_PROVIDER)"""
+    if name == "openweathermap":
+        return OpenWeatherMapProvider(session)
+    if name == "open-meteo":
+        return OpenMeteoProvider(session)
+    raise ValueError(f"Unknown weather provider: {name}")
+
+
+def create_backup_provider(
+    session: Callable[[], aiohttp.ClientSession], name: str = settings.WEATHER_BACKUP_PROVIDER
+) -> Optional[WeatherProvider]:
+    """Резервный источник для hedged запросов (WEATHER_BACKUP_PROVIDER)"""
+    if not name:
+        return None
+    if name == "openweathermap":
+        # Реплика: тот же API по другому адресу (или сам API, если основной
+        # источник - другой), свой предохранитель и лимит
+        return OpenWeatherMapProvider(
+            session,
+            base_url=settings.WEATHER_BACKUP_URL or settings.WEATHER_API_BASE_URL,
+            namespace="upstream:owm-backup",
+        )
+    if name == "open-meteo":
+        return OpenMeteoProvider(session, namespace="upstream:open-meteo-backup")
+    raise ValueError(f"Unknown weather provider: {name}")
+
+
+__all__ = [
+    "HedgedRequests",
+    "OpenMeteoProvider",
+    "OpenWeatherMapProvider",
+    "WeatherProvider",
+    "create_backup_provider",
+    "create_provider",
+]
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+
+from app.core.metrics import UPSTREAM_REQUEST_DURATION
+from app.core.tracing import span
+from ..forecast import CompactForecast
+from ..rate_limiter import CircuitBreaker, RateLimiter, UpstreamUnavailable
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    """Значение заголовка Retry-After в секундах (число или HTTP дата)"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class WeatherProvider(ABC):
+    """Источник погоды.
+
+    Ответы приводятся к общему виду: current() и current_by_coords() -
+    словарь с ключами city, country, temperature, feels_like, humidity,
+    description, weather_code (упрощенный код WMO для emoji), wind_speed
+    (км/ч); forecast() - CompactForecast с шагом 3 часа; search_cities() -
+    список словарей name, display_name, country, lat, lon. У каждого
+    источника свой лимит запросов и предохранитель, HTTP сессия - общая.
+    """
+
+    name = "base"
+
+    def __init__(
+        self,
+        session: Callable[[], aiohttp.ClientSession],
+        namespace: str,
+        rate_limiter: Optional[RateLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self._session = session
+        self.rate_limiter = rate_limiter or RateLimiter(namespace)
+        self.breaker = breaker or CircuitBreaker(namespace)
+
+    @asynccontextmanager
+    async def _upstream_get(self, url: str, params: Dict[str, Any]):
+        """GET запрос к API через лимит запросов и предохранитель источника"""
+        await self.breaker.check()
+        await self.rate_limiter.acquire()
+        endpoint = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            with span(
+                f"upstream {endpoint}", kind="client",
+                **{"http.method": "GET", "http.url": url, "upstream.provider": self.name},
+            ) as current:
+                async with self._session().get(url, params=params) as response:
+                    UPSTREAM_REQUEST_DURATION.labels(self.name, endpoint, str(response.status)).observe(
+                        time.perf_counter() - started
+                    )
+                    if current is not None:
+                        current.set_attribute("http.status_code", response.status)
+                    if response.status == 429 or response.status >= 500:
+                        retry_after = _retry_after(response) if response.status == 429 else None
+                        await self.breaker.record_failure(retry_after)
+                        raise UpstreamUnavailable(
+                            retry_after or 0,
+                            f"Сервис погоды временно недоступен ({response.status})"
+                        )
+                    await self.breaker.record_success()
+                    yield response
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            status = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            UPSTREAM_REQUEST_DURATION.labels(self.name, endpoint, status).observe(time.perf_counter() - started)
+            await self.breaker.record_failure()
+            raise UpstreamUnavailable(0, f"Сервис погоды временно недоступен: {e}") from e
+
+    @abstractmethod
+    async def current(self, city: str) -> Dict[str, Any]:
+        """Текущая погода в городе"""
+
+    @abstractmethod
+    async def current_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
+        """Текущая погода по координатам"""
+
+    @abstractmethod
+    async def forecast(self, city: str) -> CompactForecast:
+        """Прогноз на 5 дней с шагом 3 часа"""
+
+    @abstractmethod
+    async def search_cities(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Поиск городов по названию"""
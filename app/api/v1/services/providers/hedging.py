@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_HEDGE_WINS, UPSTREAM_HEDGES
+from ..rate_limiter import UpstreamUnavailable
+
+
+logger = logging.getLogger(__name__)
+
+
+class HedgedRequests:
+    """Hedged запросы к источнику погоды.
+
+    Если основной источник не ответил за квантиль quantile своих последних
+    window ответов (в пределах [min_delay, max_delay]), отправляется
+    резервный запрос; используется первый успешный ответ, второй запрос
+    отменяется. Пока замеров меньше min_samples, задержка - max_delay.
+
+    Резервные запросы ограничены бюджетом: каждый запрос добавляет budget
+    токена (не больше burst), резервный запрос расходует токен - так при
+    медленном основном источнике нагрузка растет не больше чем на долю
+    budget. При UpstreamUnavailable основного (429, 5xx, открытый
+    предохранитель) резервный запрос отправляется сразу и без бюджета.
+    Остальные ошибки основного до отправки резервного запроса (например,
+    "город не найден") возвращаются как есть.
+    """
+
+    def __init__(
+        self,
+        quantile: float = settings.HEDGE_QUANTILE,
+        min_delay: float = settings.HEDGE_MIN_DELAY,
+        max_delay: float = settings.HEDGE_MAX_DELAY,
+        budget: float = settings.HEDGE_BUDGET,
+        window: int = settings.HEDGE_WINDOW,
+        min_samples: int = 20,
+        burst: float = 10,
+    ):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.window = window
+        self.min_samples = min_samples
+        self.burst = burst
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._tokens = burst
+
+    def record(self, operation: str, latency: float):
+        samples = self._latencies.get(operation)
+        if samples is None:
+            samples = self._latencies[operation] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def delay(self, operation: str) -> float:
+        """Сколько ждать основной источник перед резервным запросом (сек)"""
+        samples = self._latencies.get(operation)
+        if samples is None or len(samples) < self.min_samples:
+            return self.max_delay
+        ordered = sorted(samples)
+        value = ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+        return min(self.max_delay, max(self.min_delay, value))
+
+    def _take_token(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def run(
+        self,
+        operation: str,
+        primary: Callable[[], Awaitable[Any]],
+        backup: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> Any:
+        """Результат основного источника или резервного, если он ответил раньше"""
+        self._tokens = min(self.burst, self._tokens + self.budget)
+        started = time.perf_counter()
+        primary_task = asyncio.ensure_future(primary())
+        tasks = {primary_task: "primary"}
+        try:
+            if backup is None:
+                return await primary_task
+
+            done, _ = await asyncio.wait({primary_task}, timeout=self.delay(operation))
+            if done:
+                error = primary_task.exception()
+                if not isinstance(error, UpstreamUnavailable):
+                    return primary_task.result()
+                reason = "failover"
+            elif self._take_token():
+                reason = "hedge"
+            else:
+                UPSTREAM_HEDGES.labels(operation, "throttled").inc()
+                return await primary_task
+
+            UPSTREAM_HEDGES.labels(operation, reason).inc()
+            tasks[asyncio.ensure_future(backup())] = "backup"
+
+            pending = {task for task in tasks if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        UPSTREAM_HEDGE_WINS.labels(operation, tasks[task]).inc()
+                        return task.result()
+                    logger.warning("%s %s request failed: %s", operation, tasks[task], task.exception())
+            # Оба запроса с ошибкой - ошибка основного источника
+            return primary_task.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Основной запрос, проигравший резервному, учитывается временем до
+            # отмены: ответ был бы не раньше, и квантиль не должен занижаться
+            if primary_task.cancelled():
+                if len(tasks) > 1:
+                    self.record(operation, time.perf_counter() - started)
+            elif primary_task.exception() is None:
+                self.record(operation, time.perf_counter() - started)
@@ -0,0 +1,188 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+
+from app.core.config import settings
+from app.core.serialization import loads
+from ..cache_service import normalize_city_key
+from ..forecast import CompactForecast
+from ..rate_limiter import CircuitBreaker, RateLimiter
+from .base import WeatherProvider
+
+
+# Описания кодов погоды WMO (как описания OpenWeatherMap с lang=ru)
+WMO_DESCRIPTIONS = {
+    0: "ясно", 1: "преимущественно ясно", 2: "переменная облачность", 3: "пасмурно",
+    45: "туман", 48: "изморозь",
+    51: "легкая морось", 53: "морось", 55: "сильная морось", 56: "ледяная морось", 57: "сильная ледяная морось",
+    61: "небольшой дождь", 63: "дождь", 65: "сильный дождь", 66: "ледяной дождь", 67: "сильный ледяной дождь",
+    71: "небольшой снег", 73: "снег", 75: "сильный снег", 77: "снежная крупа",
+    80: "небольшой ливень", 81: "ливень", 82: "сильный ливень", 85: "снегопад", 86: "сильный снегопад",
+    95: "гроза", 96: "гроза с градом", 99: "сильная гроза с градом",
+}
+
+# Прогноз OpenWeatherMap - 40 отрезков по 3 часа, почасовой Open-Meteo сводится к нему
+_SLOT_HOURS = 3
+_SLOTS = 40
+
+
+def simplify_wmo_code(code: int) -> int:
+    """Код WMO в упрощенные коды для emoji (те же, что у OpenWeatherMap)"""
+    if code in (0, 1, 2, 3):
+        return code
+    if code in (45, 48):
+        return 45
+    if 51 <= code <= 57:
+        return 51
+    if 61 <= code <= 67 or 80 <= code <= 82:
+        return 61
+    if 71 <= code <= 77 or code in (85, 86):
+        return 71
+    if code >= 95:
+        return 95
+    return 1
+
+
+def current_from_payload(place: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Текущая погода из ответа /forecast?current=..."""
+    current = data["current"]
+    code = int(current.get("weather_code", 0))
+    return {
+        "city": place["name"],
+        "country": place.get("country_code", ""),
+        "temperature": current["temperature_2m"],
+        "feels_like": current.get("apparent_temperature", current["temperature_2m"]),
+        "humidity": current.get("relative_humidity_2m", 0),
+        "description": WMO_DESCRIPTIONS.get(code, ""),
+        "weather_code": simplify_wmo_code(code),
+        "wind_speed": current.get("wind_speed_10m", 0),  # уже в км/ч
+    }
+
+
+def forecast_from_payload(data: Dict[str, Any], now: Optional[float] = None) -> CompactForecast:
+    """Почасовой прогноз (/forecast?hourly=..., timeformat=unixtime) по 3 часа.
+
+    Температура - на начало отрезка, вероятность осадков - максимум,
+    количество осадков - сумма, погода - самый "сильный" код WMO отрезка.
+    """
+    hourly = data["hourly"]
+    times: List[int] = hourly["time"]
+    now = time.time() if now is None else now
+    start = next((i for i, timestamp in enumerate(times) if timestamp >= now), len(times))
+
+    timestamps, temps, pop, rain, weather = [], [], [], [], []
+    descriptions: List[str] = []
+    indexes: Dict[int, int] = {}
+    for i in range(start, min(len(times), start + _SLOTS * _SLOT_HOURS), _SLOT_HOURS):
+        slot = slice(i, min(len(times), i + _SLOT_HOURS))
+        code = max(hourly["weather_code"][slot])
+        idx = indexes.get(code)
+        if idx is None:
+            idx = indexes[code] = len(descriptions)
+            descriptions.append(WMO_DESCRIPTIONS.get(code, "").title())
+        timestamps.append(times[i])
+        temps.append(hourly["temperature_2m"][i])
+        pop.append(max(value or 0 for value in hourly["precipitation_probability"][slot]) / 100)
+        rain.append(sum(value or 0 for value in hourly["precipitation"][slot]))
+        weather.append(idx)
+
+    return CompactForecast(
+        timestamps=timestamps, temps=temps, pop=pop, rain=rain, weather=weather,
+        descriptions=descriptions, tz_offset=data.get("utc_offset_seconds", 0),
+    )
+
+
+def place_to_city(place: Dict[str, Any]) -> Dict[str, Any]:
+    """Результат геокодирования Open-Meteo в формате подсказок городов"""
+    parts = [place["name"], place.get("admin1", ""), place.get("country_code", "")]
+    return {
+        "name": place["name"],
+        "display_name": ", ".join(part for part in parts if part),
+        "country": place.get("country_code", ""),
+        "lat": place["latitude"],
+        "lon": place["longitude"],
+    }
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """Open-Meteo: город ищется через API геокодирования, координаты кэшируются"""
+
+    name = "open-meteo"
+
+    def __init__(
+        self,
+        session: Callable[[], aiohttp.ClientSession],
+        base_url: str = settings.OPEN_METEO_URL,
+        geo_url: str = settings.OPEN_METEO_GEO_URL,
+        namespace: str = "upstream:open-meteo",
+        rate_limiter: Optional[RateLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        places_maxsize: int = 1024,
+    ):
+        super().__init__(session, namespace, rate_limiter, breaker)
+        self.base_url = base_url
+        self.geo_url = geo_url
+        self.places_maxsize = places_maxsize
+        self._places: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def _get_json(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._upstream_get(url, params) as response:
+            if response.status != 200:
+                raise Exception(f"Ошибка API Open-Meteo ({response.status}): {await response.text()}")
+            return await response.json(loads=loads)
+
+    async def _locate(self, city: str) -> Dict[str, Any]:
+        """Координаты города (координаты не меняются - кэш в памяти процесса)"""
+        key = normalize_city_key(city)
+        place = self._places.get(key)
+        if place is not None:
+            self._places.move_to_end(key)
+            return place
+
+        data = await self._get_json(
+            f"{self.geo_url}/search", {"name": city, "count": 1, "language": "ru", "format": "json"}
+        )
+        results = data.get("results") or []
+        if not results:
+            raise Exception("Город не найден")
+        place = self._places[key] = results[0]
+        if len(self._places) > self.places_maxsize:
+            self._places.popitem(last=False)
+        return place
+
+    async def search_cities(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        data = await self._get_json(
+            f"{self.geo_url}/search", {"name": query, "count": limit, "language": "ru", "format": "json"}
+        )
+        return [place_to_city(place) for place in data.get("results") or []]
+
+    async def _current_at(self, place: Dict[str, Any]) -> Dict[str, Any]:
+        data = await self._get_json(f"{self.base_url}/forecast", {
+            "latitude": place["latitude"],
+            "longitude": place["longitude"],
+            "current": "temperature_2m,relative_humidity_2m,apparent_temperature,weather_code,wind_speed_10m",
+            "timezone": "auto",
+        })
+        return current_from_payload(place, data)
+
+    async def current(self, city: str) -> Dict[str, Any]:
+        return await self._current_at(await self._locate(city))
+
+    async def current_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
+        # У Open-Meteo нет обратного геокодирования: название места неизвестно
+        return await self._current_at({"name": "", "latitude": lat, "longitude": lon})
+
+    async def forecast(self, city: str) -> CompactForecast:
+        place = await self._locate(city)
+        data = await self._get_json(f"{self.base_url}/forecast", {
+            "latitude": place["latitude"],
+            "longitude": place["longitude"],
+            "hourly": "temperature_2m,precipitation_probability,precipitation,weather_code",
+            # Лишний день - чтобы 40 отрезков по 3 часа поместились от текущего часа
+            "forecast_days": 6,
+            "timezone": "auto",
+            "timeformat": "unixtime",
+        })
+        return forecast_from_payload(data)
@@ -0,0 +1,167 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+
+from app.core.config import settings
+from app.core.serialization import loads
+from ..forecast import CompactForecast
+from ..rate_limiter import CircuitBreaker, RateLimiter
+from .base import WeatherProvider
+
+
+def map_weather_code(openweather_id: int) -> int:
+    """Маппинг OpenWeatherMap ID в упрощенные коды для emoji"""
+    # Группируем похожие условия
+    if 200 <= openweather_id <= 299:  # Thunderstorm
+        return 95
+    elif 300 <= openweather_id <= 399:  # Drizzle
+        return 51
+    elif 500 <= openweather_id <= 599:  # Rain
+        return 61
+    elif 600 <= openweather_id <= 699:  # Snow
+        return 71
+    elif 700 <= openweather_id <= 799:  # Atmosphere (fog, mist, etc.)
+        return 45
+    elif openweather_id == 800:  # Clear sky
+        return 0
+    elif openweather_id == 801:  # Few clouds
+        return 1
+    elif openweather_id == 802:  # Scattered clouds
+        return 2
+    elif openweather_id in [803, 804]:  # Broken/overcast clouds
+        return 3
+    else:
+        return 1  # Default to partly cloudy
+
+
+class OpenWeatherMapProvider(WeatherProvider):
+    """OpenWeatherMap (основной источник или его реплика по другому адресу)"""
+
+    name = "openweathermap"
+
+    def __init__(
+        self,
+        session: Callable[[], aiohttp.ClientSession],
+        base_url: str = settings.WEATHER_API_BASE_URL,
+        geo_url: str = settings.WEATHER_GEO_URL,
+        api_key: str = settings.WEATHER_API_KEY,
+        namespace: str = "upstream:owm",
+        rate_limiter: Optional[RateLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        super().__init__(session, namespace, rate_limiter, breaker)
+        self.base_url = base_url
+        self.geo_url = geo_url
+        self.api_key = api_key
+
+    async def search_cities(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Поиск городов по названию"""
+        url = f"{self.geo_url}/direct"
+        params = {
+            "q": query,
+            "limit": limit,
+            "appid": self.api_key
+        }
+
+        async with self._upstream_get(url, params) as response:
+            if response.status == 200:
+                data = await response.json(loads=loads)
+                return [
+                    {
+                        "name": item["name"],
+                        "display_name": f"{item['name']}, {item.get('state', '')}, {item['country']}".replace(", ,", ",").strip(", "),
+                        "country": item["country"],
+                        "lat": item["lat"],
+                        "lon": item["lon"]
+                    }
+                    for item in data
+                ]
+            else:
+                raise Exception(f"API Error: {response.status}")
+
+    async def current(self, city: str) -> Dict[str, Any]:
+        """Получение текущей погоды с улучшенной обработкой ошибок"""
+        url = f"{self.base_url}/weather"
+        params = {
+            "q": city,
+            "appid": self.api_key,
+            "units": "metric",
+            "lang": "ru"
+        }
+
+        async with self._upstream_get(url, params) as response:
+            if response.status == 200:
+                data = await response.json(loads=loads)
+
+                # Проверяем наличие всех необходимых ключей
+                if "main" not in data:
+                    raise Exception(f"Missing 'main' section in API response for {city}")
+                if "temp" not in data["main"]:
+                    raise Exception(f"Missing 'temp' in main section for {city}")
+                if "weather" not in data or len(data["weather"]) == 0:
+                    raise Exception(f"Missing weather information for {city}")
+
+                return {
+                    "city": data.get("name", city),
+                    "country": data.get("sys", {}).get("country", ""),
+                    "temperature": data["main"]["temp"],
+                    "feels_like": data["main"].get("feels_like", data["main"]["temp"]),
+                    "humidity": data["main"].get("humidity", 0),
+                    "description": data["weather"][0].get("description", ""),
+                    "weather_code": map_weather_code(data["weather"][0].get("id", 800)),
+                    "wind_speed": data.get("wind", {}).get("speed", 0) * 3.6,  # м/с в км/ч
+                }
+            elif response.status == 404:
+                raise Exception("Город не найден")
+            elif response.status == 401:
+                raise Exception("Неверный API ключ OpenWeather")
+            else:
+                error_text = await response.text()
+                raise Exception(f"Ошибка API OpenWeather ({response.status}): {error_text}")
+
+    async def forecast(self, city: str) -> CompactForecast:
+        """Запрос прогноза на 5 дней с шагом 3 часа"""
+        url = f"{self.base_url}/forecast"
+        params = {
+            "q": city,
+            "appid": self.api_key,
+            "units": "metric",
+            "lang": "ru"
+        }
+
+        async with self._upstream_get(url, params) as response:
+            if response.status == 200:
+                return CompactForecast.from_payload(await response.json(loads=loads))
+            elif response.status == 404:
+                raise Exception("Город не найден")
+            else:
+                raise Exception(f"Ошибка API: {response.status}")
+
+    async def current_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
+        """Получение погоды по координатам"""
+        url = f"{self.base_url}/weather"
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": self.api_key,
+            "units": "metric",
+            "lang": "ru"
+        }
+
+        async with self._upstream_get(url, params) as response:
+            if response.status == 200:
+                data = await response.json(loads=loads)
+                return {
+                    "city": data.get("name", ""),
+                    "country": data.get("sys", {}).get("country", ""),
+                    "temperature": data["main"]["temp"],
+                    "feels_like": data["main"]["feels_like"],
+                    "humidity": data["main"]["humidity"],
+                    "description": data["weather"][0]["description"],
+                    "weather_code": map_weather_code(data["weather"][0]["id"]),
+                    "wind_speed": data.get("wind", {}).get("speed", 0) * 3.6,  # м/с в км/ч
+                    # Исходный код OpenWeatherMap (прежнее поле ответа /weather/coords)
+                    "weather_id": data["weather"][0]["id"],
+                }
+            else:
+                raise Exception(f"API Error: {response.status}")
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Callable, Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# Токен-бакет: пополнение по времени Redis, списание одного токена.
+# Возвращает 0, если токен получен, иначе сколько секунд ждать следующего
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class UpstreamUnavailable(Exception):
+    """Внешний API временно недоступен (лимит запросов или открытый breaker)"""
+
+    def __init__(self, retry_after: float, message: str = "Сервис погоды временно недоступен"):
+        super().__init__(message)
+        self.retry_after = max(0.0, retry_after)
+
+
+class RateLimiter:
+    """Токен-бакет, общий для всех процессов через Redis.
+
+    Все процессы расходуют один лимит запросов к внешнему API. Если токена
+    нет, запрос ждет его не дольше max_wait, иначе отклоняется сразу,
+    не дожидаясь ответа 429. Без Redis лимит считается в памяти процесса.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "upstream:owm",
+        redis_url: Optional[str] = settings.REDIS_URL,
+        redis: Optional[aioredis.Redis] = None,
+        rate: float = settings.UPSTREAM_RATE_LIMIT,
+        burst: float = settings.UPSTREAM_RATE_BURST,
+        max_wait: float = settings.UPSTREAM_RATE_MAX_WAIT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.namespace = namespace
+        self.redis_url = redis_url
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._clock = clock
+        self._redis = redis
+        self._tokens = burst
+        self._updated_at: Optional[float] = None
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        # Переданный клиент или общий клиент процесса
+        if self._redis is not None:
+            return self._redis
+        return get_redis(self.redis_url)
+
+    @property
+    def bucket_key(self) -> str:
+        return f"{self.namespace}:bucket"
+
+    async def _take(self) -> float:
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                return float(await redis.eval(_TOKEN_BUCKET_SCRIPT, 1, self.bucket_key, self.rate, self.burst))
+            except RedisError as e:
+                logger.warning("Shared rate limiter unavailable, using local bucket: %s", e)
+        return self._take_local()
+
+    def _take_local(self) -> float:
+        now = self._clock()
+        if self._updated_at is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        """Получение разрешения на запрос к API"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while True:
+            wait = await self._take()
+            if wait <= 0:
+                return
+            if loop.time() + wait > deadline:
+                raise UpstreamUnavailable(wait, "Превышен лимит запросов к API")
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Предохранитель для внешнего API, общий для всех процессов через Redis.
+
+    После failure_threshold ошибок подряд (429, 5xx, таймауты) запросы
+    к API не выполняются в течение backoff, который растет экспоненциально
+    до max_backoff и случайно уменьшается до половины, чтобы процессы не
+    возобновляли запросы одновременно. Retry-After из ответа 429 открывает
+    предохранитель сразу на указанное время. Первый успешный запрос
+    сбрасывает счетчик ошибок.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "upstream:owm",
+        redis_url: Optional[str] = settings.REDIS_URL,
+        redis: Optional[aioredis.Redis] = None,
+        failure_threshold: int = settings.UPSTREAM_FAILURE_THRESHOLD,
+        base_backoff: float = settings.UPSTREAM_BACKOFF_BASE,
+        max_backoff: float = settings.UPSTREAM_BACKOFF_MAX,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.namespace = namespace
+        self.redis_url = redis_url
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._redis = redis
+        self._failures = 0
+        self._shared_failures = 0
+        self._open_until = 0.0
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        # Переданный клиент или общий клиент процесса
+        if self._redis is not None:
+            return self._redis
+        return get_redis(self.redis_url)
+
+    @property
+    def failures_key(self) -> str:
+        return f"{self.namespace}:failures"
+
+    @property
+    def open_key(self) -> str:
+        return f"{self.namespace}:open_until"
+
+    def backoff(self, failures: int) -> float:
+        """Пауза после failures ошибок подряд (с jitter)"""
+        exponent = min(failures - self.failure_threshold, 32)
+        delay = min(self.max_backoff, self.base_backoff * 2 ** exponent)
+        return random.uniform(delay / 2, delay)
+
+    async def check(self):
+        """Исключение UpstreamUnavailable, если запросы к API приостановлены"""
+        open_until = self._open_until
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                # Счетчик ошибок читается тем же запросом: по нему record_success
+                # решает, нужно ли сбрасывать общее состояние
+                shared, failures = await redis.mget(self.open_key, self.failures_key)
+                self._shared_failures = int(failures or 0)
+                if shared is not None:
+                    open_until = max(open_until, float(shared))
+            except RedisError as e:
+                logger.warning("Circuit breaker state read failed: %s", e)
+
+        remaining = open_until - self._clock()
+        if remaining > 0:
+            raise UpstreamUnavailable(remaining)
+
+    async def record_success(self):
+        # Общий счетчик сбрасываем, только если ошибки были: в этом процессе
+        # или в других (по значению, прочитанному в check())
+        if self._failures == 0 and self._shared_failures == 0 and self._open_until == 0:
+            return
+        self._failures = 0
+        self._shared_failures = 0
+        self._open_until = 0.0
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.delete(self.failures_key)
+            except RedisError as e:
+                logger.warning("Circuit breaker reset failed: %s", e)
+
+    async def record_failure(self, retry_after: Optional[float] = None):
+        """Учет ошибки API; retry_after - значение заголовка Retry-After"""
+        self._failures += 1
+        failures = self._failures
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                pipe = redis.pipeline(transaction=True)
+                pipe.incr(self.failures_key)
+                pipe.expire(self.failures_key, int(self.max_backoff * 2) + 1)
+                failures, _ = await pipe.execute()
+            except RedisError as e:
+                logger.warning("Circuit breaker state update failed: %s", e)
+
+        if retry_after is not None:
+            delay = retry_after
+        elif failures >= self.failure_threshold:
+            delay = self.backoff(failures)
+        else:
+            return
+
+        self._open_until = max(self._open_until, self._clock() + delay)
+        logger.warning("Upstream requests paused for %.1fs after %s failures", delay, failures)
+        if redis is not None and delay > 0:
+            try:
+                await redis.set(self.open_key, self._open_until, px=int(delay * 1000))
+            except RedisError as e:
+                logger.warning("Circuit breaker state update failed: %s", e)
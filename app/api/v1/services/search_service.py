@@ -0,0 +1,153 @@
+import base64
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from tortoise.expressions import Q
+
+from app.core.metrics import observe_db
+from app.models.models import SearchHistory
+from .history_buffer import SearchHistoryBuffer
+from .rate_limiter import UpstreamUnavailable
+from .stats_service import SearchStatsStore, STATS_WINDOWS
+from .weather_service import WeatherService
+
+
+# Общие на процесс буфер записи истории поиска и статистика городов
+stats_store = SearchStatsStore()
+history_buffer = SearchHistoryBuffer(stats=stats_store)
+
+
+async def get_weather_for_user(
+    weather_service: WeatherService, city: str, user_id: str
+) -> Dict[str, Any]:
+    """Получение погоды и запись запроса в историю поиска пользователя"""
+    weather_data = await weather_service.get_weather_by_city(city)
+    
+    await record_search(user_id, weather_data)
+    
+    weather_data["timestamp"] = datetime.now().isoformat()
+    
+    return weather_data
+
+
+async def record_search(user_id: str, weather_data: Dict[str, Any]):
+    """Запись запроса погоды в историю поиска пользователя"""
+    # Запись в БД выполняется в фоне пачками
+    await history_buffer.record(
+        user_id=user_id,
+        city=weather_data["city"],
+        temperature=weather_data["current"]["temperature"],
+        timestamp=datetime.utcnow()
+    )
+
+
+def lookup_error(error: Exception) -> Dict[str, Any]:
+    """Результат с ошибкой получения погоды (JSON-совместимый, для задач Celery)"""
+    result = {"error": str(error)}
+    if isinstance(error, UpstreamUnavailable):
+        result["status_code"] = 503
+        result["retry_after"] = error.retry_after
+    return result
+
+
+async def reconcile_search_stats():
+    """Сверка счетчиков статистики с таблицей search_history"""
+    from tortoise import connections
+    
+    conn = connections.get("default")
+    with observe_db("stats_reconcile"):
+        totals = await conn.execute_query_dict(
+            """
+            SELECT city, COUNT(*) as count
+            FROM search_history
+            GROUP BY city
+            """
+        )
+        
+        buckets = {}
+        for window, (size, count) in STATS_WINDOWS.items():
+            buckets[window] = await conn.execute_query_dict(
+                """
+                SELECT city,
+                       FLOOR(EXTRACT(EPOCH FROM timestamp) / $1) * $1 as bucket,
+                       COUNT(*) as count
+                FROM search_history
+                WHERE timestamp >= $2
+                GROUP BY 1, 2
+                """,
+                [size, datetime.utcnow() - timedelta(seconds=size * count)]
+            )
+    
+    await stats_store.rebuild(totals, buckets)
+    return {"cities": len(totals)}
+
+
+async def get_popular_cities(limit: int) -> List[Dict[str, Any]]:
+    """Самые запрашиваемые за последний час города (city, count)"""
+    cities = await stats_store.top("hour", limit)
+    if cities is not None:
+        return cities
+    
+    from tortoise import connections
+    
+    conn = connections.get("default")
+    with observe_db("popular_cities"):
+        return await conn.execute_query_dict(
+            """
+            SELECT city, COUNT(*) as count
+            FROM search_history
+            WHERE timestamp >= $1
+            GROUP BY city
+            ORDER BY count DESC
+            LIMIT $2
+            """,
+            [datetime.utcnow() - timedelta(hours=1), limit]
+        )
+
+
+def encode_history_cursor(timestamp: datetime, record_id: int) -> str:
+    """Курсор страницы истории: позиция последней отданной записи"""
+    raw = f"{timestamp.isoformat()}|{record_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Разбор курсора истории, ValueError для некорректного значения"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        timestamp, record_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Некорректный курсор истории") from e
+
+
+async def get_user_history_page(
+    user_id: str, limit: int, cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Страница истории поиска пользователя (от новых к старым) и курсор следующей.
+
+    Keyset-пагинация по (timestamp, id): запрос идет по индексу
+    (user_id, timestamp, id) и не зависит от глубины страницы, в отличие от OFFSET.
+    """
+    conditions = [Q(user_id=user_id)]
+    if cursor:
+        timestamp, record_id = decode_history_cursor(cursor)
+        # timestamp__lte задает границу диапазона индекса, id различает записи с одинаковым временем
+        conditions.append(Q(timestamp__lte=timestamp))
+        conditions.append(Q(timestamp__lt=timestamp) | Q(id__lt=record_id))
+    
+    with observe_db("user_history"):
+        rows = await SearchHistory.filter(*conditions).order_by(
+            "-timestamp", "-id"
+        ).limit(limit + 1).values("id", "city", "temperature", "timestamp")
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+    
+    history = [
+        {"city": row["city"], "timestamp": row["timestamp"], "temperature": row["temperature"]}
+        for row in rows
+    ]
+    return history, next_cursor
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.serialization import dumps, loads
+from .rate_limiter import UpstreamUnavailable
+
+
+logger = logging.getLogger(__name__)
+
+
+# Снимаем блокировку только если она все еще принадлежит нам
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов в один.
+
+    Внутри процесса все вызовы с одним ключом ждут одну и ту же задачу.
+    Между процессами (веб-реплики, воркеры Celery) лидер выбирается через
+    блокировку в Redis, остальные ждут результат через pub/sub.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        redis_url: Optional[str] = settings.REDIS_URL,
+        redis: Optional[aioredis.Redis] = None,
+        lock_ttl: float = settings.SINGLEFLIGHT_LOCK_TTL,
+        wait_timeout: float = settings.SINGLEFLIGHT_WAIT_TIMEOUT,
+    ):
+        self.namespace = namespace
+        self.redis_url = redis_url
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self._redis = redis
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        # Переданный клиент или общий клиент процесса
+        if self._redis is not None:
+            return self._redis
+        return get_redis(self.redis_url)
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        lookup: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> Any:
+        """Выполнение fn() один раз для всех одновременных вызовов с ключом key.
+
+        lookup() используется ожидающими процессами, чтобы забрать результат
+        лидера (например, из кэша), если сообщение pub/sub было пропущено.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn, lookup))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+        # Отмена одного из ожидающих не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        lookup: Optional[Callable[[], Awaitable[Any]]],
+    ) -> Any:
+        redis = self._get_redis()
+        if redis is None:
+            return await fn()
+
+        lock_key = f"{self.namespace}:lock:{key}"
+        channel = f"{self.namespace}:done:{key}"
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = await redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except RedisError as e:
+            logger.warning("Single-flight lock failed for %s: %s", key, e)
+            return await fn()
+
+        if acquired:
+            return await self._lead(redis, lock_key, channel, token, fn)
+        return await self._follow(redis, lock_key, channel, fn, lookup)
+
+    async def _lead(self, redis: aioredis.Redis, lock_key: str, channel: str, token: str, fn):
+        """Выполнение запроса лидером и публикация результата"""
+        try:
+            result = await fn()
+        except Exception as e:
+            error = {"error": str(e)}
+            if isinstance(e, UpstreamUnavailable):
+                error["retry_after"] = e.retry_after
+            await self._publish(redis, channel, error)
+            raise
+        else:
+            await self._publish(redis, channel, {"value": result})
+            return result
+        finally:
+            try:
+                await redis.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except RedisError as e:
+                logger.warning("Single-flight unlock failed for %s: %s", lock_key, e)
+
+    async def _publish(self, redis: aioredis.Redis, channel: str, payload: Dict[str, Any]):
+        try:
+            await redis.publish(channel, dumps(payload))
+        except (RedisError, TypeError) as e:
+            logger.warning("Single-flight publish failed for %s: %s", channel, e)
+
+    async def _follow(self, redis: aioredis.Redis, lock_key: str, channel: str, fn, lookup):
+        """Ожидание результата лидера из другого процесса"""
+        try:
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(channel)
+        except RedisError as e:
+            logger.warning("Single-flight subscribe failed for %s: %s", channel, e)
+            return await fn()
+
+        try:
+            # Лидер мог завершиться до подписки
+            if lookup is not None:
+                value = await lookup()
+                if value is not None:
+                    return value
+            if not await redis.exists(lock_key):
+                return await fn()
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.wait_timeout
+            while (remaining := deadline - loop.time()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message is None or message["type"] != "message":
+                    continue
+                payload = loads(message["data"])
+                if "retry_after" in payload:
+                    raise UpstreamUnavailable(payload["retry_after"], payload["error"])
+                if "error" in payload:
+                    raise Exception(payload["error"])
+                return payload["value"]
+
+            logger.warning("Single-flight wait timed out for %s", channel)
+            return await fn()
+        except RedisError as e:
+            logger.warning("Single-flight wait failed for %s: %s", channel, e)
+            return await fn()
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.aclose()
+            except RedisError:
+                pass
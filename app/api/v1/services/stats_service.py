@@ -0,0 +1,175 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+# Окно статистики -> (размер корзины в секундах, число корзин)
+STATS_WINDOWS: Dict[str, Tuple[int, int]] = {
+    "hour": (300, 12),
+    "day": (3600, 24),
+    "month": (86400, 30),
+}
+
+
+def _to_epoch(timestamp: Any) -> float:
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+class SearchStatsStore:
+    """Инкрементальная статистика поиска городов в sorted set'ах Redis.
+
+    Счетчики увеличиваются при записи истории поиска, поэтому топ городов
+    читается за O(log N + top) вместо GROUP BY по всей таблице. Для окон
+    (час/день/30 дней) счетчики хранятся по временным корзинам с TTL,
+    а окно собирается через ZUNIONSTORE и кэшируется на несколько секунд.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "search_stats",
+        redis_url: Optional[str] = settings.REDIS_URL,
+        redis: Optional[aioredis.Redis] = None,
+        union_ttl: int = settings.STATS_UNION_TTL,
+    ):
+        self.namespace = namespace
+        self.redis_url = redis_url
+        self.union_ttl = union_ttl
+        self._redis = redis
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        # Переданный клиент или общий клиент процесса
+        if self._redis is not None:
+            return self._redis
+        return get_redis(self.redis_url)
+
+    @property
+    def all_key(self) -> str:
+        return f"{self.namespace}:all"
+
+    @property
+    def ready_key(self) -> str:
+        # Выставляется после первой сверки с таблицей
+        return f"{self.namespace}:ready"
+
+    @property
+    def version_key(self) -> str:
+        return f"{self.namespace}:version"
+
+    def _bucket_key(self, window: str, bucket_start: int) -> str:
+        return f"{self.namespace}:{window}:{bucket_start}"
+
+    def _bucket_start(self, window: str, epoch: float) -> int:
+        size, _ = STATS_WINDOWS[window]
+        return int(epoch // size) * size
+
+    def _bucket_ttl(self, window: str) -> int:
+        size, count = STATS_WINDOWS[window]
+        return size * (count + 1)
+
+    async def increment(self, events: Iterable[Dict[str, Any]]):
+        """Учет записанных событий поиска (city, timestamp)"""
+        redis = self._get_redis()
+        if redis is None:
+            return
+        pipe = redis.pipeline(transaction=False)
+        for event in events:
+            epoch = _to_epoch(event["timestamp"])
+            pipe.zincrby(self.all_key, 1, event["city"])
+            for window in STATS_WINDOWS:
+                key = self._bucket_key(window, self._bucket_start(window, epoch))
+                pipe.zincrby(key, 1, event["city"])
+                pipe.expire(key, self._bucket_ttl(window))
+        pipe.incr(self.version_key)
+        await pipe.execute()
+
+    async def top(self, window: str = "all", limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+        """Топ городов за окно; None, если статистика недоступна или не построена"""
+        redis = self._get_redis()
+        if redis is None:
+            return None
+        try:
+            if not await redis.exists(self.ready_key):
+                return None
+            if window == "all":
+                key = self.all_key
+            else:
+                key = await self._window_union(redis, window)
+            rows = await redis.zrevrange(key, 0, limit - 1, withscores=True)
+        except RedisError as e:
+            logger.warning("Stats store read failed: %s", e)
+            return None
+        return [{"city": city.decode(), "count": int(score)} for city, score in rows]
+
+    async def _window_union(self, redis: aioredis.Redis, window: str) -> str:
+        size, count = STATS_WINDOWS[window]
+        current = self._bucket_start(window, time.time())
+        union_key = f"{self.namespace}:{window}:union:{current}"
+        if not await redis.exists(union_key):
+            keys = [self._bucket_key(window, current - i * size) for i in range(count)]
+            pipe = redis.pipeline(transaction=True)
+            pipe.zunionstore(union_key, keys)
+            pipe.expire(union_key, self.union_ttl)
+            await pipe.execute()
+        return union_key
+
+    async def version(self) -> int:
+        """Номер версии статистики (растет при каждом обновлении)"""
+        redis = self._get_redis()
+        if redis is None:
+            return 0
+        try:
+            return int(await redis.get(self.version_key) or 0)
+        except RedisError as e:
+            logger.warning("Stats store read failed: %s", e)
+            return 0
+
+    async def rebuild(
+        self,
+        totals: List[Dict[str, Any]],
+        buckets: Dict[str, List[Dict[str, Any]]],
+    ):
+        """Перестроение счетчиков по сырой таблице (сверка).
+
+        totals - строки (city, count) за все время,
+        buckets - для каждого окна строки (city, bucket, count).
+        """
+        redis = self._get_redis()
+        if redis is None:
+            return
+        pipe = redis.pipeline(transaction=True)
+        pipe.delete(self.all_key)
+        if totals:
+            pipe.zadd(self.all_key, {row["city"]: row["count"] for row in totals})
+
+        now = time.time()
+        for window, rows in buckets.items():
+            # Сбрасываем все корзины окна: в корзинах без строк в таблице
+            # иначе остались бы старые счетчики
+            size, count = STATS_WINDOWS[window]
+            current = self._bucket_start(window, now)
+            pipe.delete(*[self._bucket_key(window, current - i * size) for i in range(count + 1)])
+
+            grouped: Dict[int, Dict[str, int]] = {}
+            for row in rows:
+                grouped.setdefault(int(row["bucket"]), {})[row["city"]] = row["count"]
+            for bucket_start, mapping in grouped.items():
+                key = self._bucket_key(window, bucket_start)
+                pipe.zadd(key, mapping)
+                pipe.expire(key, self._bucket_ttl(window))
+        pipe.set(self.ready_key, int(time.time()))
+        pipe.incr(self.version_key)
+        await pipe.execute()
@@ -0,0 +1,64 @@
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.core.config import settings
+from .cache_service import normalize_city_key
+from .weather_service import WeatherService
+
+
+class CacheWarmer:
+    """Планирование прогрева кэша погоды популярных городов.
+
+    Раз в interval секунд планировщик получает топ городов по числу
+    запросов и для каждого считает, когда обновить запись в кэше: чем
+    популярнее город, тем чаще (от min_refresh до max_refresh секунд).
+    max_refresh меньше soft TTL кэша, поэтому запросы пользователей к
+    популярным городам не доходят до API. Города без записи в кэше и
+    просроченные равномерно распределяются по интервалу, чтобы не
+    отправлять все запросы к API одновременно.
+    """
+
+    def __init__(
+        self,
+        weather_service: WeatherService,
+        interval: float = settings.WARMUP_INTERVAL,
+        min_refresh: float = settings.WARMUP_MIN_REFRESH,
+        max_refresh: float = settings.WARMUP_MAX_REFRESH,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.weather_service = weather_service
+        self.interval = interval
+        self.min_refresh = min_refresh
+        self.max_refresh = max_refresh
+        self._clock = clock
+
+    def refresh_interval(self, count: int, max_count: int) -> float:
+        """Интервал обновления города пропорционально его доле запросов"""
+        share = count / max_count if max_count else 0
+        return self.max_refresh - (self.max_refresh - self.min_refresh) * share
+
+    async def plan(self, cities: List[Dict[str, Any]]) -> List[Tuple[str, float, float]]:
+        """Обновления на ближайший интервал: (город, задержка, интервал обновления)"""
+        now = self._clock()
+        max_count = max((row["count"] for row in cities), default=0)
+        planned: List[Tuple[str, float, float]] = []
+        overdue: List[Tuple[str, float]] = []
+
+        for row in cities:
+            refresh_every = self.refresh_interval(row["count"], max_count)
+            entry = await self.weather_service.cache.get_shared_entry(normalize_city_key(row["city"]))
+            if entry is None:
+                overdue.append((row["city"], refresh_every))
+                continue
+            delay = entry.stored_at + refresh_every - now
+            if delay <= 0:
+                overdue.append((row["city"], refresh_every))
+            elif delay < self.interval:
+                planned.append((row["city"], delay, refresh_every))
+
+        # Города отсортированы по популярности, самые популярные обновятся первыми
+        step = self.interval / len(overdue) if overdue else 0
+        for i, (city, refresh_every) in enumerate(overdue):
+            planned.append((city, i * step, refresh_every))
+
+        return sorted(planned, key=lambda item: item[1])
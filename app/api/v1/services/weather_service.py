@@ -1,226 +1,265 @@
 import aiohttp
 import asyncio
-from typing import List, Dict, Any
+import logging
+import time
+from functools import partial
+from typing import List, Dict, Any, Optional, Awaitable, AsyncIterator, Callable, Tuple
 from datetime import datetime, timedelta
 from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from .cache_service import WeatherCache, normalize_city_key
+from .forecast import CompactForecast
+from .geo_cache import NearestPointIndex, geohash_encode, geohash_center
+from .providers import HedgedRequests, create_backup_provider, create_provider
+from .rate_limiter import UpstreamUnavailable
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _timed(name: str, timings: Dict[str, float], aw: Awaitable[Any]) -> Any:
+    """Замер времени выполнения вызова (в миллисекундах)"""
+    started = time.perf_counter()
+    try:
+        return await aw
+    finally:
+        timings[name] = (time.perf_counter() - started) * 1000
+
+
+async def _gather_or_cancel(*aws: Awaitable[Any]) -> List[Any]:
+    """Параллельное выполнение с отменой остальных вызовов при первой ошибке"""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in tasks:
+            if task in done and task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 class WeatherService:
     def __init__(self):
-        self.api_key = settings.WEATHER_API_KEY
-        self.base_url = "http://api.openweathermap.org/data/2.5"
-        self.geo_url = "http://api.openweathermap.org/geo/1.0"
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.provider = create_provider(self._get_session)
+        self.backup_provider = create_backup_provider(self._get_session)
+        self.hedging = HedgedRequests()
+        self.cache = WeatherCache("weather:city")
+        self.tile_cache = WeatherCache("weather:tile")
+        self.forecast_cache = WeatherCache("weather:forecast")
+        # Не больше точек, чем ячеек в LRU кэше tile_cache
+        self._cached_tiles = NearestPointIndex(
+            cell_km=settings.COORDS_NEAREST_MAX_KM, maxsize=settings.WEATHER_CACHE_MAXSIZE
+        )
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая HTTP сессия с пулом соединений (создается лениво)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.HTTP_POOL_LIMIT,
+                limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=settings.HTTP_REQUEST_TIMEOUT),
+            )
+        return self._session
+    
+    async def _get_cached_or_stale(self, cache: WeatherCache, key: str, fetch) -> Dict[str, Any]:
+        """Значение из кэша; при недоступном API - последнее сохраненное"""
+        try:
+            return dict(await cache.get_or_fetch(key, fetch))
+        except UpstreamUnavailable:
+            entry = await cache.get_stale_entry(key)
+            if entry is None:
+                raise
+            CACHE_REQUESTS.labels(cache.namespace, "degraded").inc()
+            logger.warning("Upstream unavailable, serving stale weather for %s", key)
+            return dict(entry.value, stale=True)
+    
+    async def start(self):
+        """Открытие HTTP сессии при старте приложения"""
+        self._get_session()
+    
+    async def close(self):
+        """Закрытие HTTP сессии, всех соединений пула и кэша"""
+        await self.cache.close()
+        await self.tile_cache.close()
+        await self.forecast_cache.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     async def search_cities(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Поиск городов по названию"""
-        url = f"{self.geo_url}/direct"
-        params = {
-            "q": query,
-            "limit": limit,
-            "appid": self.api_key
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return [
-                        {
-                            "name": item["name"],
-                            "display_name": f"{item['name']}, {item.get('state', '')}, {item['country']}".replace(", ,", ",").strip(", "),
-                            "country": item["country"],
-                            "lat": item["lat"],
-                            "lon": item["lon"]
-                        }
-                        for item in data
-                    ]
-                else:
-                    raise Exception(f"API Error: {response.status}")
-    
-    def _map_weather_code(self, openweather_id: int) -> int:
-        """Маппинг OpenWeatherMap ID в упрощенные коды для emoji"""
-        # Группируем похожие условия
-        if 200 <= openweather_id <= 299:  # Thunderstorm
-            return 95
-        elif 300 <= openweather_id <= 399:  # Drizzle
-            return 51
-        elif 500 <= openweather_id <= 599:  # Rain
-            return 61
-        elif 600 <= openweather_id <= 699:  # Snow
-            return 71
-        elif 700 <= openweather_id <= 799:  # Atmosphere (fog, mist, etc.)
-            return 45
-        elif openweather_id == 800:  # Clear sky
-            return 0
-        elif openweather_id == 801:  # Few clouds
-            return 1
-        elif openweather_id == 802:  # Scattered clouds
-            return 2
-        elif openweather_id in [803, 804]:  # Broken/overcast clouds
-            return 3
-        else:
-            return 1  # Default to partly cloudy
+        return await self.provider.search_cities(query, limit)
+    
+    async def _from_providers(self, operation: str, *args) -> Any:
+        """Запрос к основному источнику, при задержке - и к резервному"""
+        backup = None
+        if self.backup_provider is not None:
+            backup = partial(getattr(self.backup_provider, operation), *args)
+        return await self.hedging.run(operation, partial(getattr(self.provider, operation), *args), backup)
     
     async def get_weather_by_city(self, city: str) -> Dict[str, Any]:
-        """Получение погоды по названию города"""
+        """Получение погоды по названию города (через кэш)"""
+        return await self._get_cached_or_stale(
+            self.cache,
+            normalize_city_key(city),
+            lambda: self._fetch_weather_by_city(city)
+        )
+    
+    async def refresh_city(self, city: str, min_age: float = 0) -> bool:
+        """Обновление погоды города в кэше, если запись старше min_age секунд"""
+        key = normalize_city_key(city)
+        entry = await self.cache.get_shared_entry(key)
+        if entry is not None and entry.age(time.time()) < min_age:
+            return False
+        await self.cache.refresh(key, lambda: self._fetch_weather_by_city(city))
+        return True
+    
+    async def _fetch_weather_by_city(self, city: str) -> Dict[str, Any]:
+        """Получение погоды по названию города из источников погоды"""
         try:
-            # Получаем текущую погоду
-            current_weather = await self._get_current_weather(city)
-            
-            # Получаем прогноз
-            forecast_data = await self._get_forecast(city)
+            # Текущая погода и прогноз запрашиваются параллельно
+            timings: Dict[str, float] = {}
+            current_weather, forecast_data = await _timed("total", timings, _gather_or_cancel(
+                _timed("current", timings, self._get_current_weather(city)),
+                _timed("forecast", timings, self._get_forecast(city)),
+            ))
+            logger.info(
+                "Weather for %s fetched: current=%.1fms forecast=%.1fms total=%.1fms",
+                city, timings["current"], timings["forecast"], timings["total"]
+            )
             
             return {
                 "city": current_weather["city"],
                 "current": {
                     "temperature": round(current_weather["temperature"]),
                     "weather": current_weather["description"].title(),
-                    "weather_code": self._map_weather_code(current_weather["weather_id"]),
+                    "weather_code": current_weather["weather_code"],
                     "humidity": current_weather["humidity"],
                     "wind_speed": round(current_weather.get("wind_speed", 0)),
                 },
                 "daily_forecast": forecast_data.get("daily", []),
                 "hourly_forecast": forecast_data.get("hourly", [])
             }
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             raise Exception(f"Ошибка получения данных о погоде: {str(e)}")
     
 
     async def _get_current_weather(self, city: str) -> Dict[str, Any]:
-        """Получение текущей погоды с улучшенной обработкой ошибок"""
-        url = f"{self.base_url}/weather"
-        params = {
-            "q": city,
-            "appid": self.api_key,
-            "units": "metric",
-            "lang": "ru"
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Добавляем отладочную информацию
-                    print(f"OpenWeather API response for {city}: {data}")
-                    
-                    # Проверяем наличие всех необходимых ключей
-                    if "main" not in data:
-                        raise Exception(f"Missing 'main' section in API response for {city}")
-                    if "temp" not in data["main"]:
-                        raise Exception(f"Missing 'temp' in main section for {city}")
-                    if "weather" not in data or len(data["weather"]) == 0:
-                        raise Exception(f"Missing weather information for {city}")
-                    
-                    return {
-                        "city": data.get("name", city),
-                        "country": data.get("sys", {}).get("country", ""),
-                        "temperature": data["main"]["temp"],
-                        "feels_like": data["main"].get("feels_like", data["main"]["temp"]),
-                        "humidity": data["main"].get("humidity", 0),
-                        "description": data["weather"][0].get("description", ""),
-                        "weather_id": data["weather"][0].get("id", 800),
-                        "wind_speed": data.get("wind", {}).get("speed", 0) * 3.6,  # м/с в км/ч
-                    }
-                elif response.status == 404:
-                    raise Exception("Город не найден")
-                elif response.status == 401:
-                    raise Exception("Неверный API ключ OpenWeather")
-                elif response.status == 429:
-                    raise Exception("Превышен лимит запросов к API")
-                else:
-                    error_text = await response.text()
-                    raise Exception(f"Ошибка API OpenWeather ({response.status}): {error_text}")
+        """Текущая погода в нормализованном виде (см. WeatherProvider)"""
+        return await self._from_providers("current", city)
     
     async def _get_forecast(self, city: str) -> Dict[str, Any]:
-        """Получение прогноза погоды"""
-        url = f"{self.base_url}/forecast"
-        params = {
-            "q": city,
-            "appid": self.api_key,
-            "units": "metric",
-            "lang": "ru"
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Обрабатываем почасовой прогноз (первые 8 часов)
-                    hourly_forecast = []
-                    for i, item in enumerate(data["list"][:8]):
-                        hourly_forecast.append({
-                            "time": item["dt_txt"],
-                            "temperature": round(item["main"]["temp"]),
-                            "weather": item["weather"][0]["description"].title(),
-                            "precipitation_probability": round(item.get("pop", 0) * 100)
-                        })
-                    
-                    # Обрабатываем дневной прогноз (группируем по дням)
-                    daily_forecast = []
-                    daily_data = {}
-                    
-                    for item in data["list"]:
-                        date_str = item["dt_txt"].split()[0]  # Получаем только дату
-                        
-                        if date_str not in daily_data:
-                            daily_data[date_str] = {
-                                "temps": [],
-                                "weather": item["weather"][0]["description"],
-                                "precipitation": 0
-                            }
-                        
-                        daily_data[date_str]["temps"].append(item["main"]["temp"])
-                        if "rain" in item:
-                            daily_data[date_str]["precipitation"] += item["rain"].get("3h", 0)
-                    
-                    # Формируем итоговый дневной прогноз
-                    for date_str, day_data in list(daily_data.items())[:5]:
-                        daily_forecast.append({
-                            "date": date_str,
-                            "temp_max": round(max(day_data["temps"])),
-                            "temp_min": round(min(day_data["temps"])),
-                            "weather": day_data["weather"].title(),
-                            "precipitation": round(day_data["precipitation"], 1)
-                        })
-                    
-                    return {
-                        "daily": daily_forecast,
-                        "hourly": hourly_forecast
-                    }
-                elif response.status == 404:
-                    raise Exception("Город не найден")
-                else:
-                    raise Exception(f"Ошибка API: {response.status}")
+        """Получение прогноза погоды (дневного и почасового)"""
+        forecast = await self._request_forecast(city)
+        # Компактный прогноз сохраняется, чтобы другие горизонты считались без запроса к API
+        await self.forecast_cache.set(normalize_city_key(city), forecast.to_dict())
+        return forecast.summary(settings.FORECAST_DAYS, settings.FORECAST_HOURLY_POINTS)
+    
+    async def _request_forecast(self, city: str) -> CompactForecast:
+        """Запрос прогноза на 5 дней с шагом 3 часа"""
+        return await self._from_providers("forecast", city)
     
     async def get_weather_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
         """Получение погоды по координатам"""
-        url = f"{self.base_url}/weather"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "appid": self.api_key,
-            "units": "metric",
-            "lang": "ru"
-        }
+        return await self.provider.current_by_coords(lat, lon)
+    
+    async def get_weather_by_coords_cached(self, lat: float, lon: float) -> Dict[str, Any]:
+        """Получение погоды по координатам через кэш ячеек geohash.
+        
+        Все запросы внутри одной ячейки обслуживаются одним запросом к API
+        (по координатам центра ячейки). Если ячейка еще не в кэше, но рядом
+        есть закэшированная, используется она.
+        """
+        tile = geohash_encode(lat, lon, settings.COORDS_GEOHASH_PRECISION)
+        
+        if await self.tile_cache.get_entry(tile) is None:
+            nearest = self._cached_tiles.nearest(lat, lon, settings.COORDS_NEAREST_MAX_KM)
+            if nearest is not None:
+                entry = await self.tile_cache.get_entry(nearest)
+                if entry is not None:
+                    return dict(entry.value)
+                self._cached_tiles.remove(nearest)
+        
+        center_lat, center_lon = geohash_center(tile)
+        
+        async def fetch():
+            weather = await self.get_weather_by_coords(center_lat, center_lon)
+            weather["tile"] = tile
+            return weather
+        
+        weather = await self._get_cached_or_stale(self.tile_cache, tile, fetch)
+        self._cached_tiles.add(tile, center_lat, center_lon)
+        return weather
+    
+    async def get_weather_batch(
+        self,
+        cities: List[str],
+        coords: List[Tuple[float, float]],
+        concurrency: int = settings.BATCH_CONCURRENCY,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Погода для набора городов и координат по мере готовности.
+        
+        Повторяющиеся запросы объединяются, попадания в кэш отдаются сразу,
+        промахи запрашиваются параллельно, но не более concurrency одновременно.
+        """
+        queries: Dict[str, Tuple[Dict[str, Any], Callable, WeatherCache]] = {}
+        for city in cities:
+            key = normalize_city_key(city)
+            if key and f"city:{key}" not in queries:
+                queries[f"city:{key}"] = (
+                    {"city": city}, partial(self.get_weather_by_city, city), self.cache
+                )
+        for lat, lon in coords:
+            tile = geohash_encode(lat, lon, settings.COORDS_GEOHASH_PRECISION)
+            if f"tile:{tile}" not in queries:
+                queries[f"tile:{tile}"] = (
+                    {"lat": lat, "lon": lon}, partial(self.get_weather_by_coords_cached, lat, lon), self.tile_cache
+                )
+        
+        async def run(query: Dict[str, Any], fetch) -> Dict[str, Any]:
+            try:
+                return {"query": query, "status": "ok", "data": await fetch()}
+            except Exception as e:
+                return {"query": query, "status": "error", "error": str(e)}
+        
+        semaphore = asyncio.Semaphore(concurrency)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        "city": data["name"],
-                        "country": data["sys"]["country"],
-                        "temperature": data["main"]["temp"],
-                        "feels_like": data["main"]["feels_like"],
-                        "humidity": data["main"]["humidity"],
-                        "description": data["weather"][0]["description"],
-                        "weather_id": data["weather"][0]["id"]
-                    }
-                else:
-                    raise Exception(f"API Error: {response.status}")
+        async def run_limited(query: Dict[str, Any], fetch) -> Dict[str, Any]:
+            async with semaphore:
+                return await run(query, fetch)
+        
+        misses = []
+        for key, (query, fetch, cache) in queries.items():
+            if await cache.get_entry(key.split(":", 1)[1]) is not None:
+                yield await run(query, fetch)
+            else:
+                misses.append(asyncio.create_task(run_limited(query, fetch)))
+        
+        try:
+            for next_result in asyncio.as_completed(misses):
+                yield await next_result
+        finally:
+            # Клиент мог отключиться, не дочитав ответ
+            for task in misses:
+                task.cancel()
     
     async def get_forecast(self, city: str, days: int = 5) -> Dict[str, Any]:
-        """Получение прогноза на несколько дней (старый метод для совместимости)"""
-        return await self._get_forecast(city)
\ No newline at end of file
+        """Получение прогноза на несколько дней (через кэш компактного прогноза)"""
+        async def fetch():
+            return (await self._request_forecast(city)).to_dict()
+        
+        forecast = await self.forecast_cache.get_or_fetch(normalize_city_key(city), fetch)
+        return CompactForecast.from_dict(forecast).summary(days, settings.FORECAST_HOURLY_POINTS)
\ No newline at end of file
@@ -1,5 +1,16 @@
 from celery import Celery
+from celery.schedules import crontab
 from app.core.config import settings
+from app.core.logging import instrument_celery_logging
+from app.core.metrics import instrument_celery
+from app.core.tracing import instrument_celery_tracing
+from app.core.serialization import CELERY_SERIALIZER, register_celery_serializer
+
+
+register_celery_serializer()
+instrument_celery()
+instrument_celery_logging()
+instrument_celery_tracing()
 
 
 celery_app = Celery(
@@ -11,10 +22,28 @@ celery_app = Celery(
 
 
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer=CELERY_SERIALIZER,
+    # json оставлен для сообщений, отправленных до перехода на fastjson
+    accept_content=[CELERY_SERIALIZER, "json"],
+    result_serializer=CELERY_SERIALIZER,
+    result_accept_content=[CELERY_SERIALIZER, "json"],
     timezone="UTC",
     enable_utc=True,
     result_expires=3600,  
+    beat_schedule={
+        "reconcile-search-stats": {
+            "task": "app.celery_dir.tasks.reconcile_search_stats",
+            "schedule": settings.STATS_RECONCILE_INTERVAL,
+        },
+        "warm-popular-cities": {
+            "task": "app.celery_dir.tasks.warm_popular_cities",
+            "schedule": settings.WARMUP_INTERVAL,
+            # Устаревший план бесполезен, следующий запуск построит новый
+            "options": {"expires": settings.WARMUP_INTERVAL},
+        },
+        "cleanup-old-searches": {
+            "task": "app.celery_dir.tasks.cleanup_old_searches",
+            "schedule": crontab(hour=settings.CLEANUP_HOUR, minute=0),
+        },
+    },
 )
\ No newline at end of file
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+import redis.asyncio as aioredis
+from celery import Celery, states
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+
+class CeleryResultWaiter:
+    """Асинхронное ожидание результатов Celery задач без опроса.
+
+    Redis backend Celery публикует метаданные задачи в канал с именем ключа
+    результата (celery-task-meta-<id>). Все ожидающие запросы процесса
+    используют одно pub/sub соединение, и обработчик просыпается сразу,
+    как только результат записан.
+    """
+
+    def __init__(self, app: Celery, redis_url: str = settings.REDIS_URL):
+        self.app = app
+        self.redis_url = redis_url
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+
+    def _get_redis(self) -> aioredis.Redis:
+        return get_redis(self.redis_url)
+
+    async def wait(self, task_id: str, timeout: float) -> Dict[str, Any]:
+        """Ожидание завершения задачи, возвращает метаданные результата"""
+        key = self.app.backend.get_key_for_task(task_id).decode()
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(key, set())
+        first = not waiters
+        waiters.add(future)
+
+        try:
+            if first:
+                await self._subscribe(key)
+            # Задача могла завершиться до подписки на канал
+            raw = await self._get_redis().get(key)
+            if raw is not None:
+                self._resolve(key, raw)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            waiters.discard(future)
+            if not waiters:
+                self._waiters.pop(key, None)
+                await self._unsubscribe(key)
+
+    async def _subscribe(self, key: str):
+        if self._pubsub is None:
+            self._pubsub = self._get_redis().pubsub()
+        await self._pubsub.subscribe(key)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _unsubscribe(self, key: str):
+        if self._pubsub is None:
+            return
+        try:
+            await self._pubsub.unsubscribe(key)
+        except RedisError as e:
+            logger.warning("Failed to unsubscribe from %s: %s", key, e)
+
+    async def _listen(self):
+        """Чтение сообщений pub/sub и пробуждение ожидающих запросов"""
+        pubsub = self._pubsub
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+                self._resolve(message["channel"].decode(), message["data"])
+        except RedisError as e:
+            logger.error("Celery result listener failed: %s", e)
+            for waiters in self._waiters.values():
+                for future in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+            self._pubsub = None
+
+    def _resolve(self, key: str, raw: bytes):
+        waiters = self._waiters.get(key)
+        if not waiters:
+            return
+        meta = self.app.backend.decode_result(raw)
+        if meta["status"] not in states.READY_STATES:
+            return
+        for future in waiters:
+            if not future.done():
+                future.set_result(meta)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
@@ -1,83 +1,214 @@
 import asyncio
-from datetime import datetime
+import logging
+import threading
+from typing import Optional
+from celery.signals import worker_process_init, worker_process_shutdown, worker_ready
 from tortoise import Tortoise
 
 from .celery_app import celery_app
 from app.api.v1.services.weather_service import WeatherService
+from app.api.v1.services.search_service import (
+    get_weather_for_user, get_popular_cities, history_buffer, lookup_error,
+    reconcile_search_stats as _reconcile_search_stats
+)
+from app.api.v1.services.warmup_service import CacheWarmer
+from app.api.v1.services.partition_service import HistoryRetention
+from app.core.config import settings
 from app.core.database import TORTOISE_ORM
-from app.models.models import SearchHistory
+from app.core.logging import setup_logging
+from app.core.redis_client import close_redis
+from app.core.tracing import setup_tracing, shutdown_tracing
+
+
+logger = logging.getLogger(__name__)
+
+# Один event loop, одна HTTP сессия и один пул соединений с БД на процесс воркера
+weather_service = WeatherService()
+cache_warmer = CacheWarmer(weather_service)
+history_retention = HistoryRetention()
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+_worker_thread: Optional[threading.Thread] = None
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def _get_worker_loop() -> asyncio.AbstractEventLoop:
+    """Event loop процесса воркера в отдельном потоке (создается один раз).
+
+    Loop работает постоянно, а не только пока выполняется задача: иначе
+    фоновые задачи (запись истории и продление ее lease, фоновое обновление
+    кэша) замирают между задачами Celery. Поток не переживает fork, поэтому
+    в дочернем процессе prefork пула loop создается заново.
+    """
+    global _worker_loop, _worker_thread
+    if _worker_loop is None or _worker_loop.is_closed() or not _worker_thread.is_alive():
+        _worker_loop = asyncio.new_event_loop()
+        _worker_thread = threading.Thread(target=_run_loop, args=(_worker_loop,), name="worker-loop", daemon=True)
+        _worker_thread.start()
+    return _worker_loop
+
+
+def _run_coroutine(coro):
+    """Выполнение корутины в потоке event loop с ожиданием результата.
+
+    run_coroutine_threadsafe запускает корутину с копией contextvars
+    текущего потока - идентификатор запроса и контекст трассировки задачи
+    сохраняются.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_worker_loop())
+    try:
+        return future.result()
+    except BaseException:
+        # Прерывание задачи (например, soft time limit) отменяет и корутину
+        future.cancel()
+        raise
+
+
+def run_in_worker_loop(coro):
+    """Выполнение корутины в постоянном event loop воркера"""
+    # Без prefork пула (--pool=solo) worker_process_init не вызывается
+    if not Tortoise._inited:
+        _run_coroutine(_init_worker_resources())
+    return _run_coroutine(coro)
+
+
+async def _init_worker_resources():
+    setup_logging()
+    setup_tracing(f"{settings.TRACING_SERVICE_NAME}-worker")
+    if not Tortoise._inited:
+        await Tortoise.init(config=TORTOISE_ORM)
+    await weather_service.start()
+    await history_buffer.start()
+
+
+async def _close_worker_resources():
+    await history_buffer.stop()
+    await weather_service.close()
+    await close_redis()
+    await Tortoise.close_connections()
+    shutdown_tracing()
+
+
+@worker_ready.connect
+def reconcile_on_startup(**kwargs):
+    """Сверка статистики при запуске воркера.
+
+    Без нее счетчики не используются до первого запуска по расписанию
+    (STATS_RECONCILE_INTERVAL), и /stats все это время считает GROUP BY.
+    """
+    reconcile_search_stats.delay()
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Инициализация ресурсов процесса воркера"""
+    _run_coroutine(_init_worker_resources())
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    """Освобождение ресурсов процесса воркера"""
+    global _worker_loop, _worker_thread
+    if _worker_loop is None or _worker_loop.is_closed() or not _worker_thread.is_alive():
+        return
+    try:
+        _run_coroutine(_close_worker_resources())
+    finally:
+        _worker_loop.call_soon_threadsafe(_worker_loop.stop)
+        _worker_thread.join()
+        _worker_loop.close()
+        _worker_loop = None
+        _worker_thread = None
 
 
 @celery_app.task
 def get_weather_async(city: str, user_id: str):
     """Асинхронная задача получения погоды"""
-    return asyncio.run(_get_weather_task(city, user_id))
+    return run_in_worker_loop(_get_weather_task(city, user_id))
 
 
 async def _get_weather_task(city: str, user_id: str):
     """Внутренняя асинхронная функция для получения погоды"""
     try:
-        await Tortoise.init(config=TORTOISE_ORM)
-        
-        weather_service = WeatherService()
-        weather_data = await weather_service.get_weather_by_city(city)
-        
-        # Добавляем отладочную информацию
-        print(f"Weather data structure: {weather_data}")
-        print(f"Available top-level keys: {list(weather_data.keys())}")
-        
-        # ИСПРАВЛЕНИЕ: Правильный путь к температуре
-        # Было: temperature=weather_data["temperature"]
-        # Стало: temperature=weather_data["current"]["temperature"]
-        temperature = weather_data["current"]["temperature"]
-        
-        await SearchHistory.create(
-            user_id=user_id,
-            city=weather_data["city"],
-            temperature=temperature,  # Используем извлеченную температуру
-            timestamp=datetime.utcnow()
-        )
-        
-        weather_data["timestamp"] = datetime.now().isoformat()
-        
-        return weather_data
+        return await get_weather_for_user(weather_service, city, user_id)
         
     except KeyError as e:
-        print(f"KeyError in _get_weather_task: {e}")
-        if 'weather_data' in locals():
-            print(f"Available keys in weather_data: {list(weather_data.keys())}")
-            if 'current' in weather_data:
-                print(f"Available keys in current: {list(weather_data['current'].keys())}")
+        logger.exception("Unexpected weather data format for %s", city)
         return {"error": f"Missing key: {str(e)}"}
     except Exception as e:
-        print(f"Error in _get_weather_task: {e}")
-        return {"error": str(e)}
-    finally:
-        await Tortoise.close_connections()
+        logger.warning("Weather lookup failed for %s: %s", city, e)
+        return lookup_error(e)
 
 
 @celery_app.task
 def cleanup_old_searches():
     """Задача для очистки старых записей поиска"""
-    return asyncio.run(_cleanup_old_searches_task())
+    return run_in_worker_loop(_cleanup_old_searches_task())
 
 
 async def _cleanup_old_searches_task():
-    """Удаление записей старше 30 дней"""
+    """Удаление записей старше HISTORY_RETENTION_DAYS дней и создание новых секций"""
     try:
-        await Tortoise.init(config=TORTOISE_ORM)
-        
-        from datetime import timedelta
-        cutoff_date = datetime.utcnow() - timedelta(days=30)
-        
-        deleted_count = await SearchHistory.filter(
-            timestamp__lt=cutoff_date
-        ).delete()
-        
-        return {"deleted_count": deleted_count}
+        return await history_retention.apply(Tortoise.get_connection("default"))
         
     except Exception as e:
-        print(f"Error in _cleanup_old_searches_task: {e}")
+        logger.exception("Search history cleanup failed")
+        return {"error": str(e)}
+
+
+@celery_app.task
+def reconcile_search_stats():
+    """Задача сверки счетчиков статистики поиска с таблицей"""
+    return run_in_worker_loop(_reconcile_search_stats_task())
+
+
+async def _reconcile_search_stats_task():
+    try:
+        return await _reconcile_search_stats()
+    except Exception as e:
+        logger.exception("Search stats reconciliation failed")
+        return {"error": str(e)}
+
+
+@celery_app.task
+def warm_popular_cities():
+    """Задача планирования прогрева кэша популярных городов"""
+    plan = run_in_worker_loop(_plan_warmup_task())
+    if isinstance(plan, dict):
+        return plan
+    
+    for city, delay, refresh_every in plan:
+        # Если обновление не успело выполниться, его заново запланирует следующий запуск
+        refresh_city.apply_async(
+            args=[city, refresh_every / 2],
+            countdown=delay,
+            expires=delay + settings.WARMUP_INTERVAL
+        )
+    return {"scheduled": len(plan)}
+
+
+async def _plan_warmup_task():
+    try:
+        cities = await get_popular_cities(settings.WARMUP_TOP_N)
+        return await cache_warmer.plan(cities)
+    except Exception as e:
+        logger.exception("Cache warmup planning failed")
+        return {"error": str(e)}
+
+
+@celery_app.task
+def refresh_city(city: str, min_age: float = 0):
+    """Задача обновления погоды города в кэше"""
+    return run_in_worker_loop(_refresh_city_task(city, min_age))
+
+
+async def _refresh_city_task(city: str, min_age: float):
+    try:
+        refreshed = await weather_service.refresh_city(city, min_age=min_age)
+        return {"city": city, "refreshed": refreshed}
+    except Exception as e:
+        logger.exception("Cache refresh failed for %s", city)
         return {"error": str(e)}
-    finally:
-        await Tortoise.close_connections()
\ No newline at end of file
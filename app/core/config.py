@@ -7,8 +7,126 @@ class Settings(BaseSettings):
     DATABASE_USER: str = os.getenv("DATABASE_USER", "")
     DATABASE_PASSWORD: str = os.getenv("DATABASE_PASSWORD", "")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "")
+    DATABASE_POOL_MINSIZE: int = int(os.getenv("DATABASE_POOL_MINSIZE", "1"))
+    DATABASE_POOL_MAXSIZE: int = int(os.getenv("DATABASE_POOL_MAXSIZE", "10"))
     WEATHER_API_KEY: str = os.getenv("WEATHER_API_KEY", "")
+    # Адреса OpenWeatherMap (для нагрузочных тестов - локальная замена benchmarks/mock_owm.py)
+    WEATHER_API_BASE_URL: str = os.getenv("WEATHER_API_BASE_URL", "http://api.openweathermap.org/data/2.5")
+    WEATHER_GEO_URL: str = os.getenv("WEATHER_GEO_URL", "http://api.openweathermap.org/geo/1.0")
+
+    # Основной источник погоды: "openweathermap" или "open-meteo"
+    WEATHER_PROVIDER: str = os.getenv("WEATHER_PROVIDER", "openweathermap")
+    # Резервный источник для hedged запросов погоды: "" (выключен), "openweathermap"
+    # (реплика по адресу WEATHER_BACKUP_URL) или "open-meteo"
+    WEATHER_BACKUP_PROVIDER: str = os.getenv("WEATHER_BACKUP_PROVIDER", "")
+    WEATHER_BACKUP_URL: str = os.getenv("WEATHER_BACKUP_URL", "")
+    OPEN_METEO_URL: str = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1")
+    OPEN_METEO_GEO_URL: str = os.getenv("OPEN_METEO_GEO_URL", "https://geocoding-api.open-meteo.com/v1")
+    # Резервный запрос - если основной источник не ответил за квантиль своих
+    # последних HEDGE_WINDOW ответов (не меньше MIN и не больше MAX секунд);
+    # HEDGE_BUDGET - доля запросов, которые можно продублировать
+    HEDGE_QUANTILE: float = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+    HEDGE_MIN_DELAY: float = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+    HEDGE_MAX_DELAY: float = float(os.getenv("HEDGE_MAX_DELAY", "2"))
+    HEDGE_WINDOW: int = int(os.getenv("HEDGE_WINDOW", "200"))
+    HEDGE_BUDGET: float = float(os.getenv("HEDGE_BUDGET", "0.1"))
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+    # Режим выполнения синхронных эндпоинтов погоды: "celery" или "inline"
+    WEATHER_EXECUTION_MODE: str = os.getenv("WEATHER_EXECUTION_MODE", "celery")
+
+    # Справочник городов для автодополнения (CSV приложения или cities*.txt GeoNames)
+    CITY_GAZETTEER_PATH: str = os.getenv("CITY_GAZETTEER_PATH", "app/data/cities.csv")
+    # Сколько секунд браузеры и CDN могут кэшировать подсказки городов
+    SUGGESTIONS_CACHE_MAX_AGE: int = int(os.getenv("SUGGESTIONS_CACHE_MAX_AGE", "3600"))
+
+    # Пул HTTP соединений к OpenWeatherMap
+    HTTP_POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "50"))
+    HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+    HTTP_DNS_CACHE_TTL: int = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+    HTTP_REQUEST_TIMEOUT: float = float(os.getenv("HTTP_REQUEST_TIMEOUT", "10"))
+
+    # Минимальный размер ответа API (байт), начиная с которого он сжимается gzip/brotli
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+    # Ограничение запросов к OpenWeatherMap (общее для всех процессов)
+    UPSTREAM_RATE_LIMIT: float = float(os.getenv("UPSTREAM_RATE_LIMIT", "10"))
+    UPSTREAM_RATE_BURST: float = float(os.getenv("UPSTREAM_RATE_BURST", "20"))
+    UPSTREAM_RATE_MAX_WAIT: float = float(os.getenv("UPSTREAM_RATE_MAX_WAIT", "2"))
+    UPSTREAM_FAILURE_THRESHOLD: int = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", "5"))
+    UPSTREAM_BACKOFF_BASE: float = float(os.getenv("UPSTREAM_BACKOFF_BASE", "1"))
+    UPSTREAM_BACKOFF_MAX: float = float(os.getenv("UPSTREAM_BACKOFF_MAX", "60"))
+
+    # Кэш ответов о погоде
+    WEATHER_CACHE_MAXSIZE: int = int(os.getenv("WEATHER_CACHE_MAXSIZE", "1024"))
+    WEATHER_CACHE_SOFT_TTL: int = int(os.getenv("WEATHER_CACHE_SOFT_TTL", "600"))
+    WEATHER_CACHE_HARD_TTL: int = int(os.getenv("WEATHER_CACHE_HARD_TTL", "3600"))
+    # Сколько еще хранить устаревшие данные для отдачи при недоступном API
+    WEATHER_CACHE_STALE_TTL: int = int(os.getenv("WEATHER_CACHE_STALE_TTL", "86400"))
+
+    # Горизонты прогноза: число дней и почасовых отрезков (по 3 часа)
+    FORECAST_DAYS: int = int(os.getenv("FORECAST_DAYS", "5"))
+    FORECAST_HOURLY_POINTS: int = int(os.getenv("FORECAST_HOURLY_POINTS", "8"))
+
+    # Кэш погоды по координатам: точность geohash (5 ~ ячейка 4.9 x 4.9 км)
+    # и радиус поиска ближайшей закэшированной ячейки
+    COORDS_GEOHASH_PRECISION: int = int(os.getenv("COORDS_GEOHASH_PRECISION", "5"))
+    COORDS_NEAREST_MAX_KM: float = float(os.getenv("COORDS_NEAREST_MAX_KM", "3"))
+
+    # Максимум одновременных запросов к API в пакетном эндпоинте
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "10"))
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+    # Объединение одинаковых запросов между процессами
+    SINGLEFLIGHT_LOCK_TTL: float = float(os.getenv("SINGLEFLIGHT_LOCK_TTL", "15"))
+    SINGLEFLIGHT_WAIT_TIMEOUT: float = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", "15"))
+
+    # Отложенная пакетная запись истории поиска
+    HISTORY_BATCH_SIZE: int = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+    HISTORY_FLUSH_INTERVAL: float = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+    HISTORY_LEASE_TTL: int = int(os.getenv("HISTORY_LEASE_TTL", "30"))
+    # После стольких неудачных попыток записи подряд незаписываемые строки уходят в dead-letter
+    HISTORY_MAX_ATTEMPTS: int = int(os.getenv("HISTORY_MAX_ATTEMPTS", "5"))
+
+    # Статистика поиска городов
+    STATS_UNION_TTL: int = int(os.getenv("STATS_UNION_TTL", "10"))
+    STATS_RECONCILE_INTERVAL: int = int(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+
+    # Прогрев кэша популярных городов: частота планирования, число городов
+    # и интервал обновления (самые популярные - чаще, все - раньше soft TTL)
+    WARMUP_INTERVAL: int = int(os.getenv("WARMUP_INTERVAL", "60"))
+    WARMUP_TOP_N: int = int(os.getenv("WARMUP_TOP_N", "50"))
+    WARMUP_MIN_REFRESH: int = int(os.getenv("WARMUP_MIN_REFRESH", "180"))
+    WARMUP_MAX_REFRESH: int = int(os.getenv("WARMUP_MAX_REFRESH", "480"))
+
+    # Очистка истории поиска (час запуска по UTC и срок хранения)
+    CLEANUP_HOUR: int = int(os.getenv("CLEANUP_HOUR", "3"))
+    HISTORY_RETENTION_DAYS: int = int(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+    # Секции истории поиска: ширина в днях (1 - по дням, 7 - по неделям)
+    # и на сколько дней вперед они создаются
+    HISTORY_PARTITION_DAYS: int = int(os.getenv("HISTORY_PARTITION_DAYS", "1"))
+    HISTORY_PARTITION_PREMAKE_DAYS: int = int(os.getenv("HISTORY_PARTITION_PREMAKE_DAYS", "7"))
+
+    # Метрики Prometheus: порт HTTP сервера метрик воркера Celery (0 - выключен)
+    # и период замера задержки event loop
+    CELERY_METRICS_PORT: int = int(os.getenv("CELERY_METRICS_PORT", "9100"))
+    EVENT_LOOP_LAG_INTERVAL: float = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+    # Логи пакета app: уровень, формат (json или text) и доля частых подробных
+    # событий, попадающих в лог (по умолчанию и по ключам: "weather_by_city=0.1,...")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")
+
+    # Трассировка OpenTelemetry: экспорт в OTLP коллектор, файл или консоль
+    # (otlp, file, console; пусто - выключена)
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "")
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "weather-app")
+    TRACING_OTLP_ENDPOINT: str = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    TRACING_FILE_PATH: str = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
     
     class Config:
         env_file = ".env"
@@ -11,6 +11,8 @@ TORTOISE_ORM = {
                 "user": settings.DATABASE_USER,      
                 "password": settings.DATABASE_PASSWORD,
                 "database": settings.DATABASE_NAME,
+                "minsize": settings.DATABASE_POOL_MINSIZE,
+                "maxsize": settings.DATABASE_POOL_MAXSIZE,
             }
         }
     },
@@ -0,0 +1,41 @@
+import hashlib
+from typing import Dict
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts, weak: bool = False) -> str:
+    """ETag по версии данных.
+
+    Слабый (W/) - если тело для одной версии данных может отличаться
+    несущественно (например, временем ответа).
+    """
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'{"W/" if weak else ""}"{digest[:20]}"'
+
+
+def _opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match запроса"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Для If-None-Match используется слабое сравнение (RFC 9110)
+    candidates = (value.strip() for value in header.split(","))
+    return _opaque(etag) in (_opaque(value) for value in candidates)
+
+
+def cache_headers(etag: str, max_age: float, private: bool = False) -> Dict[str, str]:
+    """Заголовки ETag и Cache-Control для ответа"""
+    scope = "private" if private else "public"
+    return {"ETag": etag, "Cache-Control": f"{scope}, max-age={max(0, int(max_age))}"}
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    """Ответ 304 без тела"""
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,222 @@
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .serialization import dumps_str
+
+
+# Идентификатор запроса: задается middleware, передается в задачи Celery
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Заголовок сообщения Celery с идентификатором запроса
+CELERY_REQUEST_ID_HEADER = "request_id"
+
+# Поля LogRecord, которые не считаются дополнительными (extra)
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "correlation_id", "sample"}
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Доли сэмплирования из строки вида "weather_by_city=0.01,weather=0.1" """
+    rates = {}
+    for part in value.split(","):
+        key, sep, rate = part.partition("=")
+        if sep and key.strip():
+            rates[key.strip()] = float(rate)
+    return rates
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Добавление идентификатора запроса в запись (в потоке, где она создана)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Сэмплирование частых подробных событий.
+
+    Записи с extra={"sample": "<ключ>"} пропускаются с долей из rates
+    (по умолчанию default_rate), ошибки и записи без ключа - всегда.
+    """
+
+    def __init__(self, default_rate: float, rates: Optional[Dict[str, float]] = None, rng=random.random):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self._rng = rng
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        return self._rng() < self.rates.get(key, self.default_rate)
+
+
+class JSONFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            payload["correlation_id"] = record.correlation_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        try:
+            return dumps_str(payload)
+        except TypeError:
+            return dumps_str({
+                key: value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+                for key, value in payload.items()
+            })
+
+
+class _AsyncQueueHandler(QueueHandler):
+    """Постановка записи в очередь; запись в поток вывода - в отдельном потоке"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и traceback форматируются здесь, пока доступны аргументы и кадры стека
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+_listener_pid: Optional[int] = None
+
+
+def setup_logging(
+    level: str = settings.LOG_LEVEL,
+    log_format: str = settings.LOG_FORMAT,
+    sample_rate: float = settings.LOG_SAMPLE_RATE,
+    sample_rates: str = settings.LOG_SAMPLE_RATES,
+):
+    """Настройка логов пакета app: очередь + поток записи в stdout.
+
+    Вызывается повторно в дочерних процессах (prefork Celery): поток
+    записи не переживает fork, поэтому в новом процессе он создается заново.
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if log_format == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s"
+        ))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _AsyncQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate, parse_sample_rates(sample_rates)))
+    queue_handler.addFilter(CorrelationIdFilter())
+
+    app_logger = logging.getLogger("app")
+    for handler in list(app_logger.handlers):
+        if isinstance(handler, _AsyncQueueHandler):
+            app_logger.removeHandler(handler)
+    app_logger.addHandler(queue_handler)
+    app_logger.setLevel(level.upper())
+    # Логи приложения выводятся только своим обработчиком (без дублей через root)
+    app_logger.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+
+
+def shutdown_logging():
+    """Остановка потока записи с выводом оставшихся в очереди записей"""
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+    _listener_pid = None
+
+
+class CorrelationIdMiddleware:
+    """Идентификатор запроса из X-Request-ID (или новый) для логов и задач Celery"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                # Значение от клиента ограничиваем по длине - оно попадает в логи
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = correlation_id.set(request_id)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            correlation_id.reset(token)
+
+
+_task_tokens: Dict[str, object] = {}
+
+
+def _on_task_publish(headers=None, **kwargs):
+    request_id = correlation_id.get()
+    if headers is not None and request_id:
+        headers[CELERY_REQUEST_ID_HEADER] = request_id
+
+
+def _on_task_prerun(task_id=None, task=None, **kwargs):
+    request_id = task.request.get(CELERY_REQUEST_ID_HEADER) or (task.request.headers or {}).get(CELERY_REQUEST_ID_HEADER)
+    # Задачи без запроса (beat) - по идентификатору самой задачи
+    _task_tokens[task_id] = correlation_id.set(request_id or task_id)
+
+
+def _on_task_postrun(task_id=None, **kwargs):
+    token = _task_tokens.pop(task_id, None)
+    if token is not None:
+        correlation_id.reset(token)
+
+
+def instrument_celery_logging():
+    """Передача идентификатора запроса в задачи Celery"""
+    before_task_publish.connect(_on_task_publish, weak=False)
+    task_prerun.connect(_on_task_prerun, weak=False)
+    task_postrun.connect(_on_task_postrun, weak=False)
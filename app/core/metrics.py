@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from celery.signals import before_task_publish, task_postrun, task_prerun, worker_init
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+    multiprocess, start_http_server,
+)
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+# Основные бакеты - от 5 мс до 10 с, для задержки event loop - мельче
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP запроса",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Время ответа источника погоды (до заголовков)",
+    ["provider", "endpoint", "status"], buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_HEDGES = Counter(
+    "upstream_hedged_requests_total",
+    "Резервные запросы (hedge - основной не ответил вовремя, failover - ошибка основного, "
+    "throttled - не отправлен из-за бюджета)",
+    ["operation", "reason"],
+)
+UPSTREAM_HEDGE_WINS = Counter(
+    "upstream_hedge_wins_total", "Чей ответ использован после отправки резервного запроса",
+    ["operation", "winner"],
+)
+CELERY_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds", "Время задачи в очереди от публикации до начала выполнения",
+    ["task"], buckets=_LATENCY_BUCKETS,
+)
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds", "Время выполнения задачи Celery",
+    ["task", "state"], buckets=_LATENCY_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Время запроса к БД",
+    ["query"], buckets=_LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Обращения к кэшу погоды (hit - свежая запись, stale - устаревшая, miss - промах)",
+    ["cache", "result"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Задержка срабатывания таймера event loop",
+    buckets=_LAG_BUCKETS,
+)
+
+# Заголовок сообщения Celery со временем публикации задачи
+PUBLISHED_AT_HEADER = "published_at"
+
+
+def _registry() -> CollectorRegistry:
+    # Несколько процессов (воркеры uvicorn, prefork Celery) пишут метрики в
+    # PROMETHEUS_MULTIPROC_DIR, при сборе они суммируются
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Метрики в формате Prometheus"""
+    return Response(generate_latest(_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
+@contextmanager
+def observe_db(query: str):
+    """Замер времени запроса к БД (и спан трассировки)"""
+    started = time.perf_counter()
+    try:
+        with span(f"db {query}", kind="client", **{"db.system": "postgresql", "db.operation": query}):
+            yield
+    finally:
+        DB_QUERY_DURATION.labels(query).observe(time.perf_counter() - started)
+
+
+def _route_label(scope: Scope) -> str:
+    # Шаблон пути (/weather/{city}), а не сам путь - иначе число рядов не ограничено
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Смонтированные приложения (статика) - по префиксу
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    """Гистограмма времени обработки HTTP запросов по маршрутам"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(scope["method"], _route_label(scope), str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+class EventLoopLagMonitor:
+    """Замер задержки event loop: насколько позже срабатывает sleep(interval).
+
+    Рост задержки означает, что event loop заблокирован синхронной работой
+    и все запросы процесса ждут.
+    """
+
+    def __init__(self, interval: float = settings.EVENT_LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - self.interval))
+
+
+# Время начала выполнения задач процесса воркера по task_id
+_task_started: Dict[str, Tuple[float, str]] = {}
+
+
+def _on_task_publish(headers=None, **kwargs):
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def _on_task_prerun(task_id=None, task=None, **kwargs):
+    published_at = task.request.get(PUBLISHED_AT_HEADER) or (task.request.headers or {}).get(PUBLISHED_AT_HEADER)
+    if published_at is not None:
+        CELERY_QUEUE_WAIT.labels(task.name).observe(max(0.0, time.time() - float(published_at)))
+    _task_started[task_id] = (time.perf_counter(), task.name)
+
+
+def _on_task_postrun(task_id=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_DURATION.labels(started[1], state or "UNKNOWN").observe(time.perf_counter() - started[0])
+
+
+def _on_worker_init(**kwargs):
+    if settings.CELERY_METRICS_PORT:
+        start_http_server(settings.CELERY_METRICS_PORT, registry=_registry())
+        logger.info("Celery metrics exposed on port %s", settings.CELERY_METRICS_PORT)
+
+
+def instrument_celery():
+    """Метрики очереди и выполнения задач Celery"""
+    before_task_publish.connect(_on_task_publish, weak=False)
+    task_prerun.connect(_on_task_prerun, weak=False)
+    task_postrun.connect(_on_task_postrun, weak=False)
+    worker_init.connect(_on_worker_init, weak=False)
@@ -0,0 +1,35 @@
+import asyncio
+import weakref
+from typing import Dict, Optional
+
+import redis.asyncio as aioredis
+
+from .config import settings
+
+
+# Клиенты по event loop: соединения redis.asyncio привязаны к loop, в котором созданы
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, aioredis.Redis]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_redis(url: Optional[str] = settings.REDIS_URL) -> Optional[aioredis.Redis]:
+    """Общий клиент Redis процесса (один пул соединений на адрес).
+
+    Кэши, лимиты, буфер истории и статистика работают через один пул,
+    а не открывают каждый свой. None - Redis не используется.
+    """
+    if url is None:
+        return None
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(url)
+    if client is None:
+        client = clients[url] = aioredis.from_url(url)
+    return client
+
+
+async def close_redis():
+    """Закрытие общих клиентов текущего event loop (при остановке процесса)"""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
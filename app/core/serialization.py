@@ -0,0 +1,68 @@
+import json
+from datetime import date, datetime
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson не установлен
+    orjson = None
+
+
+# Имя сериализатора kombu для задач и результатов Celery
+CELERY_SERIALIZER = "fastjson"
+CELERY_CONTENT_TYPE = "application/x-fastjson"
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Сериализация в JSON (UTF-8 байты)"""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Разбор JSON из байтов или строки"""
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> bytes:
+        """Сериализация в JSON (UTF-8 байты)"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Разбор JSON из байтов или строки"""
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return json.loads(data)
+
+
+def dumps_str(obj: Any) -> str:
+    """Сериализация в JSON строку (для API, которые ждут str)"""
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON ответ FastAPI через orjson (или стандартный json без него)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def register_celery_serializer():
+    """Регистрация сериализатора fastjson в kombu"""
+    from kombu.serialization import register
+
+    register(
+        CELERY_SERIALIZER,
+        dumps_str,
+        loads,
+        content_type=CELERY_CONTENT_TYPE,
+        content_encoding="utf-8",
+    )
@@ -0,0 +1,79 @@
+import json
+import os
+import re
+import stat
+from functools import lru_cache
+from typing import Dict
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Scope
+
+from .compression import choose_encoding
+
+
+STATIC_DIR = "app/static"
+# Результат scripts/build_static.py: файлы с хэшем в имени, .gz/.br и манифест
+BUILD_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# style.3f2a1b9c0d4e.css - содержимое файла с таким именем никогда не меняется
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[A-Za-z0-9]+$")
+_PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+@lru_cache(maxsize=1)
+def load_manifest(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """Манифест собранной статики: исходный путь -> путь с хэшем"""
+    path = os.path.join(static_dir, BUILD_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def static_url(path: str) -> str:
+    """URL статического файла (собранной версии с хэшем, если она есть)"""
+    hashed = load_manifest().get(path)
+    if hashed is not None:
+        return f"/static/{BUILD_DIR}/{hashed}"
+    return f"/static/{path}"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """Статика с отдачей заранее сжатых .br/.gz версий файлов.
+
+    Если клиент принимает brotli или gzip и рядом с файлом лежит сжатая
+    версия, отдается она без сжатия на лету. Файлы с хэшем содержимого
+    в имени кэшируются браузером и CDN бессрочно.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await self._precompressed_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        if _HASHED_NAME.search(path) and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+    async def _precompressed_response(self, path: str, scope: Scope):
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        available = [encoding for encoding, _ in _PRECOMPRESSED]
+        while available:
+            encoding = choose_encoding(accept_encoding, available)
+            if encoding is None:
+                return None
+            available.remove(encoding)
+            suffix = dict(_PRECOMPRESSED)[encoding]
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            # Тип содержимого берется из имени без .br/.gz
+            response = self.file_response(full_path, stat_result, scope)
+            response.headers["Content-Encoding"] = encoding
+            response.headers["Vary"] = "Accept-Encoding"
+            return response
+        return None
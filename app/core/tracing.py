@@ -0,0 +1,189 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Sequence
+
+from celery.signals import after_task_publish, before_task_publish, task_postrun, task_prerun
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # pragma: no cover - OpenTelemetry не установлен
+    trace = None
+
+
+logger = logging.getLogger(__name__)
+
+_tracer = None
+
+
+if trace is not None:
+    class FileSpanExporter(SpanExporter):
+        """Запись спанов в файл, по строке JSON на спан (для анализа без коллектора)"""
+
+        def __init__(self, path: str):
+            self.path = path
+            self._lock = threading.Lock()
+
+        def export(self, spans: Sequence[ReadableSpan]) -> "SpanExportResult":
+            lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            pass
+
+
+def _make_exporter(name: str):
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    if name == "file":
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown tracing exporter: {name}")
+
+
+def setup_tracing(service_name: str, exporter: str = settings.TRACING_EXPORTER):
+    """Включение трассировки (без TRACING_EXPORTER или OpenTelemetry - выключена).
+
+    После fork провайдер наследуется: BatchSpanProcessor сам перезапускает
+    поток экспорта в дочернем процессе.
+    """
+    global _tracer
+    if not exporter or _tracer is not None:
+        return
+    if trace is None:
+        logger.warning("TRACING_EXPORTER=%s, but OpenTelemetry is not installed", exporter)
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    # Экспорт пачками в фоновом потоке, запрос не ждет отправки спанов
+    provider.add_span_processor(BatchSpanProcessor(_make_exporter(exporter)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("app")
+
+
+def shutdown_tracing():
+    """Отправка накопленных спанов при остановке процесса"""
+    if _tracer is not None:
+        trace.get_tracer_provider().shutdown()
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes) -> Iterator[Any]:
+    """Спан вокруг блока кода (без трассировки - ничего не делает).
+
+    kind - internal, client, server, producer или consumer.
+    """
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, kind=SpanKind[kind.upper()], attributes=attributes) as current:
+        yield current
+
+
+class TracingMiddleware:
+    """Серверный спан HTTP запроса с контекстом из заголовка traceparent"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if _tracer is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        parent = propagate.extract(carrier)
+        with _tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}", context=parent, kind=SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        ) as current:
+            async def send_wrapper(message: Message):
+                if message["type"] == "http.response.start":
+                    current.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        current.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    # Имя по шаблону маршрута, чтобы спаны одного эндпоинта группировались
+                    current.update_name(f"{scope['method']} {route.path}")
+                    current.set_attribute("http.route", route.path)
+
+
+# Спаны публикации и выполнения задач Celery по task_id
+_publish_spans: Dict[str, Any] = {}
+_task_spans: Dict[str, Any] = {}
+
+
+def _on_before_task_publish(sender=None, headers=None, **kwargs):
+    if _tracer is None or headers is None:
+        return
+    current = _tracer.start_span(f"celery.publish {sender}", kind=SpanKind.PRODUCER)
+    current.set_attribute("celery.task_id", headers.get("id", ""))
+    _publish_spans[headers.get("id")] = current
+    # Контекст спана публикации уходит в заголовках сообщения (traceparent)
+    propagate.inject(headers, context=trace.set_span_in_context(current))
+
+
+def _on_after_task_publish(headers=None, **kwargs):
+    current = _publish_spans.pop((headers or {}).get("id"), None)
+    if current is not None:
+        current.end()
+
+
+def _on_task_prerun(task_id=None, task=None, **kwargs):
+    if _tracer is None:
+        return
+    carrier = dict(task.request.headers or {})
+    for key in ("traceparent", "tracestate"):
+        value = task.request.get(key)
+        if value:
+            carrier[key] = value
+    current = _tracer.start_span(
+        f"celery.run {task.name}", context=propagate.extract(carrier), kind=SpanKind.CONSUMER,
+        attributes={"celery.task_id": task_id},
+    )
+    token = otel_context.attach(trace.set_span_in_context(current))
+    _task_spans[task_id] = (current, token)
+
+
+def _on_task_postrun(task_id=None, state=None, **kwargs):
+    started = _task_spans.pop(task_id, None)
+    if started is None:
+        return
+    current, token = started
+    current.set_attribute("celery.state", state or "UNKNOWN")
+    if state == "FAILURE":
+        current.set_status(Status(StatusCode.ERROR))
+    otel_context.detach(token)
+    current.end()
+
+
+def instrument_celery_tracing():
+    """Передача контекста трассировки через заголовки сообщений Celery"""
+    before_task_publish.connect(_on_before_task_publish, weak=False)
+    after_task_publish.connect(_on_after_task_publish, weak=False)
+    task_prerun.connect(_on_task_prerun, weak=False)
+    task_postrun.connect(_on_task_postrun, weak=False)
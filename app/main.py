@@ -1,29 +1,64 @@
+import asyncio
 import uvicorn
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from tortoise import Tortoise
-from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
 from app.core.database import TORTOISE_ORM, init_db, close_db
-from app.api.v1.routes import router as api_router
+from app.core.serialization import FastJSONResponse
+from app.core.compression import CompressionMiddleware
+from app.core.logging import CorrelationIdMiddleware, setup_logging, shutdown_logging
+from app.core.metrics import EventLoopLagMonitor, MetricsMiddleware, metrics_endpoint
+from app.core.redis_client import close_redis
+from app.core.tracing import TracingMiddleware, setup_tracing, shutdown_tracing
+from app.core.static_assets import STATIC_DIR, PrecompressedStaticFiles
+from app.api.v1.routes import router as api_router, weather_service, result_waiter, city_index
+from app.api.v1.services.search_service import history_buffer
+
+
+loop_lag_monitor = EventLoopLagMonitor()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):    
     await init_db()
+    await asyncio.to_thread(city_index.load_file, settings.CITY_GAZETTEER_PATH)
+    await weather_service.start()
+    await history_buffer.start()
+    await loop_lag_monitor.start()
     yield
+    await loop_lag_monitor.stop()
+    await history_buffer.stop()
+    await result_waiter.close()
+    await weather_service.close()
+    await close_redis()
     await close_db()
+    shutdown_tracing()
+    shutdown_logging()
 
 
 def create_app() -> FastAPI:
+    setup_logging()
+    setup_tracing(settings.TRACING_SERVICE_NAME)
+    
     app = FastAPI(
         title="Weather Forecast App",
         version="1.0.0",
+        default_response_class=FastJSONResponse,
         lifespan=lifespan
     )
     
 
-    app.mount("/static", StaticFiles(directory="app/static"), name="static")
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+    # Добавлен последним - внешний, замеряет запрос целиком, включая сжатие
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(TracingMiddleware)
+    # Идентификатор запроса доступен всем middleware и обработчикам
+    app.add_middleware(CorrelationIdMiddleware)
+    
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    
+    app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
     
     app.include_router(api_router, prefix="/api/v1")
     
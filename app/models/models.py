@@ -4,8 +4,10 @@ from datetime import datetime
 
 
 class SearchHistory(models.Model):
+    # В БД таблица секционирована по timestamp (см. migrations/models),
+    # первичный ключ там - (id, timestamp)
     id = fields.IntField(pk=True)
-    user_id = fields.CharField(max_length=255, index=True)
+    user_id = fields.CharField(max_length=255)
     city = fields.CharField(max_length=100, index=True)
     temperature = fields.FloatField()
     timestamp = fields.DatetimeField(default=datetime.utcnow)
@@ -13,6 +15,8 @@ class SearchHistory(models.Model):
     class Meta:
         table = "search_history"
         ordering = ["-timestamp"]
+        # История пользователя читается по user_id в порядке убывания времени
+        indexes = (("user_id", "timestamp", "id"),)
     
     def __str__(self):
         return f"SearchHistory(city='{self.city}', temp={self.temperature})"
\ No newline at end of file
@@ -261,8 +261,9 @@ class WeatherApp {
                 <h3>🕐 Почасовой прогноз</h3>
                 <div class="hourly-forecast">
                     ${hourlyForecast.slice(0, 8).map(hour => {
-                        const time = new Date(hour.time);
-                        const timeStr = time.toLocaleTimeString('ru-RU', { hour: '2-digit', minute: '2-digit' });
+                        // Время приходит в часовом поясе города (ISO 8601 со смещением):
+                        // показываем его как есть, без перевода в пояс браузера
+                        const timeStr = String(hour.time).slice(11, 16);
                         
                         return `
                             <div class="forecast-item">
@@ -313,8 +314,10 @@ class WeatherApp {
             const controller = new AbortController();
             const timeoutId = setTimeout(() => controller.abort(), 10000);
             
+            // Браузер перепроверит ответ по ETag и получит 304, если статистика не изменилась
             const response = await fetch('/api/v1/stats', {
-                signal: controller.signal
+                signal: controller.signal,
+                cache: 'no-cache'
             });
             
             clearTimeout(timeoutId);
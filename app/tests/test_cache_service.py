@@ -0,0 +1,126 @@
+import pytest
+import asyncio
+
+from app.api.v1.services.cache_service import (
+    LRUCache, CacheEntry, WeatherCache, normalize_city_key
+)
+from app.core.redis_client import close_redis, get_redis
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_normalize_city_key():
+    """Нормализация ключа города"""
+    assert normalize_city_key("  New   York ") == "new york"
+    assert normalize_city_key("МОСКВА") == normalize_city_key("москва")
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Вытеснение самой старой по использованию записи"""
+    clock = FakeClock()
+    cache = LRUCache(maxsize=2, ttl=60, clock=clock)
+    cache.set("a", CacheEntry(1, clock()))
+    cache.set("b", CacheEntry(2, clock()))
+    cache.get("a")
+    cache.set("c", CacheEntry(3, clock()))
+
+    assert cache.get("b") is None
+    assert cache.get("a").value == 1
+    assert cache.get("c").value == 3
+
+
+def test_lru_cache_expires_entries():
+    """Истечение TTL записи"""
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("a", CacheEntry(1, clock()))
+
+    clock.now += 61
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_weather_cache_fetches_once():
+    """Повторный запрос обслуживается из кэша"""
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {"city": "Moscow"}
+
+    cache = WeatherCache(redis_url=None, soft_ttl=60, hard_ttl=120, clock=FakeClock())
+    assert await cache.get_or_fetch("moscow", fetch) == {"city": "Moscow"}
+    assert await cache.get_or_fetch("moscow", fetch) == {"city": "Moscow"}
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_weather_cache_serves_stale_while_revalidating():
+    """Устаревшая запись отдается сразу, обновление идет в фоне"""
+    clock = FakeClock()
+    cache = WeatherCache(redis_url=None, soft_ttl=60, hard_ttl=600, clock=clock)
+    await cache.set("moscow", {"temperature": 10})
+
+    async def fetch():
+        return {"temperature": 20}
+
+    clock.now += 120
+    assert await cache.get_or_fetch("moscow", fetch) == {"temperature": 10}
+
+    await asyncio.gather(*cache._refresh_tasks)
+    assert await cache.get_or_fetch("moscow", fetch) == {"temperature": 20}
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    """Одновременные запросы с одним ключом выполняются один раз"""
+    from app.api.v1.services.singleflight import SingleFlight
+
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"city": "Moscow"}
+
+    flight = SingleFlight("test", redis_url=None)
+    results = await asyncio.gather(*[flight.do("moscow", fetch) for _ in range(20)])
+
+    assert len(calls) == 1
+    assert all(r == {"city": "Moscow"} for r in results)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_errors():
+    """Ошибка общего запроса получают все ожидающие"""
+    from app.api.v1.services.singleflight import SingleFlight
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise Exception("Город не найден")
+
+    flight = SingleFlight("test", redis_url=None)
+    results = await asyncio.gather(
+        *[flight.do("nowhere", fetch) for _ in range(5)], return_exceptions=True
+    )
+
+    assert all(str(r) == "Город не найден" for r in results)
+
+
+@pytest.mark.asyncio
+async def test_caches_share_one_redis_client():
+    """Кэши процесса используют один клиент Redis (один пул соединений)"""
+    first = WeatherCache("test:first", redis_url="redis://shared-test:6379")
+    second = WeatherCache("test:second", redis_url="redis://shared-test:6379")
+
+    assert first._get_redis() is second._get_redis()
+    assert first._get_redis() is get_redis("redis://shared-test:6379")
+    await close_redis()
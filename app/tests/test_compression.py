@@ -0,0 +1,80 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, choose_encoding
+from app.core.static_assets import PrecompressedStaticFiles
+
+
+def make_client(tmp_path=None) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/big")
+    async def big():
+        return {"hourly": [{"temperature": i, "weather": "Ясно"} for i in range(100)]}
+
+    @app.get("/tagged")
+    async def tagged():
+        return JSONResponse([{"temperature": i} for i in range(100)], headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    async def small():
+        return {"city": "Moscow"}
+
+    if tmp_path is not None:
+        app.mount("/static", PrecompressedStaticFiles(directory=str(tmp_path)), name="static")
+    return TestClient(app)
+
+
+def test_choose_encoding_respects_q_values():
+    """Кодировка выбирается с учетом q-значений Accept-Encoding"""
+    assert choose_encoding("gzip, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert choose_encoding("br, gzip", ["br", "gzip"]) == "br"
+    assert choose_encoding("identity", ["gzip"]) is None
+    assert choose_encoding("*", ["gzip"]) == "gzip"
+
+
+def test_large_response_is_compressed():
+    """Ответы больше порога сжимаются"""
+    client = make_client()
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["hourly"][99]["temperature"] == 99
+
+
+def test_compressed_response_gets_weak_etag():
+    """Сильный ETag сжатого ответа становится слабым, несжатый остается как есть"""
+    client = make_client()
+
+    assert client.get("/tagged", headers={"Accept-Encoding": "gzip"}).headers["etag"] == 'W/"abc"'
+    assert client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"abc"'
+
+
+def test_small_response_is_not_compressed():
+    """Ответы меньше порога отдаются как есть"""
+    client = make_client()
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"city": "Moscow"}
+
+
+def test_precompressed_static_file(tmp_path):
+    """Статика отдается из заранее сжатого файла с бессрочным кэшем"""
+    css = b"body { color: red; }" * 50
+    (tmp_path / "style.0123456789ab.css").write_bytes(css)
+    (tmp_path / "style.0123456789ab.css.gz").write_bytes(gzip.compress(css))
+    client = make_client(tmp_path)
+
+    response = client.get("/static/style.0123456789ab.css", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/css")
+    assert "immutable" in response.headers["cache-control"]
+    assert response.content == css
@@ -0,0 +1,57 @@
+from app.api.v1.services.forecast import CompactForecast
+
+
+def make_payload(timezone_offset: int = 0):
+    # 2024-01-01 00:00 UTC, шаг 3 часа, два дня
+    start = 1704067200
+    items = []
+    for i in range(16):
+        items.append({
+            "dt": start + i * 3 * 3600,
+            "main": {"temp": float(i)},
+            "weather": [{"description": "ясно" if i % 2 else "облачно"}],
+            "pop": 0.5 if i == 3 else 0,
+            **({"rain": {"3h": 1.25}} if i in (2, 10) else {}),
+        })
+    return {"list": items, "city": {"timezone": timezone_offset}}
+
+
+def test_daily_aggregates_by_utc_day():
+    """Дневные минимум, максимум и осадки"""
+    forecast = CompactForecast.from_payload(make_payload())
+    daily = forecast.daily()
+
+    assert [day["date"] for day in daily] == ["2024-01-01", "2024-01-02"]
+    assert (daily[0]["temp_min"], daily[0]["temp_max"]) == (0, 7)
+    assert daily[0]["precipitation"] == 1.2
+    assert daily[0]["weather"] == "Облачно"
+
+
+def test_daily_uses_city_timezone():
+    """Границы суток считаются по местному времени города"""
+    forecast = CompactForecast.from_payload(make_payload(timezone_offset=3 * 3600))
+    daily = forecast.daily()
+
+    # 21:00 UTC 1 января - уже 2 января в UTC+3
+    assert [day["date"] for day in daily] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert (daily[0]["temp_min"], daily[0]["temp_max"]) == (0, 6)
+    assert len(forecast.daily(days=2)) == 2
+
+
+def test_hourly_horizon_and_local_time():
+    """Почасовой прогноз ограничен горизонтом и содержит местное время"""
+    forecast = CompactForecast.from_payload(make_payload(timezone_offset=3 * 3600))
+    hourly = forecast.hourly(points=4)
+
+    assert len(hourly) == 4
+    assert hourly[0]["time"] == "2024-01-01T03:00:00+03:00"
+    assert hourly[3]["precipitation_probability"] == 50
+
+
+def test_round_trip_through_dict():
+    """Компактная форма сохраняется в JSON и восстанавливается без потерь"""
+    forecast = CompactForecast.from_payload(make_payload(timezone_offset=-5 * 3600))
+    restored = CompactForecast.from_dict(forecast.to_dict())
+
+    assert restored.summary() == forecast.summary()
+    assert len(restored.descriptions) == 2
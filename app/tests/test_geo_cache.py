@@ -0,0 +1,45 @@
+from app.api.v1.services.geo_cache import (
+    NearestPointIndex, geohash_center, geohash_encode, haversine_km
+)
+
+
+def test_geohash_encode():
+    """Кодирование координат в geohash"""
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash_encode(55.7558, 37.6176, 5) == geohash_encode(55.7601, 37.6199, 5)
+
+
+def test_geohash_center_inside_tile():
+    """Центр ячейки лежит внутри нее"""
+    tile = geohash_encode(55.7558, 37.6176, 5)
+    lat, lon = geohash_center(tile)
+    assert geohash_encode(lat, lon, 5) == tile
+    assert haversine_km(55.7558, 37.6176, lat, lon) < 5
+
+
+def test_nearest_point_index():
+    """Поиск ближайшей точки в радиусе"""
+    index = NearestPointIndex(cell_km=3)
+    index.add("center", 55.7558, 37.6176)
+    index.add("north", 55.80, 37.70)
+
+    assert index.nearest(55.76, 37.62, max_km=3) == "center"
+    assert index.nearest(56.50, 37.60, max_km=3) is None
+
+    index.remove("center")
+    assert index.nearest(55.76, 37.62, max_km=3) is None
+    assert len(index) == 1
+
+
+def test_nearest_point_index_is_bounded():
+    """Индекс хранит не больше maxsize точек, вытесняя давно не использованные"""
+    index = NearestPointIndex(cell_km=3, maxsize=2)
+    index.add("moscow", 55.7558, 37.6176)
+    index.add("london", 51.5074, -0.1278)
+    assert index.nearest(55.76, 37.62, max_km=3) == "moscow"
+
+    index.add("paris", 48.8566, 2.3522)
+
+    assert len(index) == 2
+    assert index.nearest(51.51, -0.13, max_km=3) is None
+    assert index.nearest(55.76, 37.62, max_km=3) == "moscow"
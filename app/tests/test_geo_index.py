@@ -0,0 +1,46 @@
+import pytest
+
+from app.api.v1.services.geo_index import CityIndex
+
+
+@pytest.fixture(scope="module")
+def city_index():
+    index = CityIndex()
+    index.load_file("app/data/cities.csv")
+    return index
+
+
+def test_prefix_search(city_index):
+    """Поиск по префиксу названия"""
+    result = city_index.search("Mosc")
+    assert result[0]["name"] == "Moscow"
+    assert result[0]["country"] == "RU"
+
+
+def test_alternate_names(city_index):
+    """Поиск по альтернативному названию"""
+    assert city_index.search("питер")[0]["name"] == "Saint Petersburg"
+    assert city_index.search("Москва")[0]["name"] == "Moscow"
+
+
+def test_short_prefix_ranked_by_population(city_index):
+    """Короткие префиксы ранжируются по населению"""
+    result = city_index.search("ka", limit=3)
+    assert result[0]["name"] == "Kazan"
+
+
+def test_fuzzy_search(city_index):
+    """Нечеткий поиск при опечатке"""
+    assert city_index.search("Novosibirks")[0]["name"] == "Novosibirsk"
+
+
+def test_learned_city_is_indexed():
+    """Город из внешнего API добавляется в индекс"""
+    index = CityIndex()
+    assert index.search("Obninsk") == []
+
+    index.add({"name": "Obninsk", "country": "RU", "lat": 55.1, "lon": 36.6}, alternate_names=["Обнинск"])
+    index.add({"name": "Obninsk", "country": "RU", "lat": 55.1, "lon": 36.6})
+
+    assert len(index) == 1
+    assert index.search("обн")[0]["display_name"] == "Obninsk, RU"
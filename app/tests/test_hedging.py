@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from app.api.v1.services.providers import (
+    HedgedRequests, OpenMeteoProvider, OpenWeatherMapProvider, WeatherProvider, create_provider
+)
+from app.api.v1.services.providers.open_meteo import current_from_payload, forecast_from_payload, place_to_city
+from app.api.v1.services.rate_limiter import UpstreamUnavailable
+
+
+def make_call(delay, result=None, error=None, calls=None, name=None):
+    async def call():
+        if calls is not None:
+            calls.append(name)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if calls is not None:
+                calls.append(f"{name}:cancelled")
+            raise
+        if error is not None:
+            raise error
+        return result
+    return call
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_does_not_hedge():
+    """Основной источник ответил до дедлайна - резервный запрос не отправляется"""
+    hedging = HedgedRequests(min_delay=0.05, max_delay=0.05)
+    calls = []
+
+    result = await hedging.run(
+        "current", make_call(0.01, "primary", calls=calls, name="primary"),
+        make_call(0, "backup", calls=calls, name="backup"),
+    )
+
+    assert result == "primary"
+    assert calls == ["primary"]
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled():
+    """Медленный основной источник - ответ резервного, основной запрос отменяется"""
+    hedging = HedgedRequests(min_delay=0.01, max_delay=0.05)
+    calls = []
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await hedging.run(
+        "current", make_call(1, "primary", calls=calls, name="primary"),
+        make_call(0.01, "backup", calls=calls, name="backup"),
+    )
+
+    assert result == "backup"
+    assert loop.time() - started < 0.5
+    assert calls == ["primary", "backup", "primary:cancelled"]
+
+
+@pytest.mark.asyncio
+async def test_delay_follows_primary_quantile():
+    """Дедлайн - квантиль времени ответа основного источника в пределах min/max"""
+    hedging = HedgedRequests(quantile=0.95, min_delay=0.01, max_delay=2, min_samples=20)
+    assert hedging.delay("current") == 2
+    for i in range(100):
+        hedging.record("current", 0.1 if i < 95 else 1.5)
+    assert hedging.delay("current") == 1.5
+    for _ in range(200):
+        hedging.record("current", 0.001)
+    assert hedging.delay("current") == 0.01
+
+
+@pytest.mark.asyncio
+async def test_failover_and_budget():
+    """Ошибка основного - сразу резервный запрос; задержки дублируются в пределах бюджета"""
+    hedging = HedgedRequests(min_delay=0.01, max_delay=0.01, budget=0, burst=1)
+    hedging._tokens = 0
+
+    result = await hedging.run(
+        "forecast", make_call(0, error=UpstreamUnavailable(5)), make_call(0, "backup")
+    )
+    assert result == "backup"
+
+    # Бюджет исчерпан - ждем основной источник
+    result = await hedging.run("forecast", make_call(0.05, "primary"), make_call(0, "backup"))
+    assert result == "primary"
+
+    # Ошибка, не связанная с доступностью, возвращается без резервного запроса
+    calls = []
+    with pytest.raises(Exception, match="Город не найден"):
+        await hedging.run(
+            "forecast", make_call(0, error=Exception("Город не найден")),
+            make_call(0, "backup", calls=calls, name="backup"),
+        )
+    assert calls == []
+
+
+def test_open_meteo_payload_normalized():
+    """Ответ Open-Meteo приводится к общей схеме и шагу прогноза 3 часа"""
+    place = {"name": "Москва", "country_code": "RU", "latitude": 55.75, "longitude": 37.62}
+    current = current_from_payload(place, {"current": {
+        "temperature_2m": 12.3, "relative_humidity_2m": 60, "apparent_temperature": 10.1,
+        "weather_code": 63, "wind_speed_10m": 14.4,
+    }})
+    assert current == {
+        "city": "Москва", "country": "RU", "temperature": 12.3, "feels_like": 10.1, "humidity": 60,
+        "description": "дождь", "weather_code": 61, "wind_speed": 14.4,
+    }
+
+    start = 1_700_000_000 // 3600 * 3600
+    hours = 6 * 24
+    forecast = forecast_from_payload({
+        "utc_offset_seconds": 10800,
+        "hourly": {
+            "time": [start + i * 3600 for i in range(hours)],
+            "temperature_2m": [float(i % 24) for i in range(hours)],
+            "precipitation_probability": [10, 50, None] * (hours // 3),
+            "precipitation": [0.1, 0.2, None] * (hours // 3),
+            "weather_code": [0, 3, 61] * (hours // 3),
+        },
+    }, now=start + 1)
+
+    assert len(forecast) == 40
+    assert forecast.timestamps[0] == start + 3600
+    assert forecast.timestamps[1] - forecast.timestamps[0] == 10800
+    assert forecast.descriptions[forecast.weather[0]] == "Небольшой Дождь"
+    assert forecast.pop[0] == 0.5
+    assert forecast.rain[0] == pytest.approx(0.3)
+    assert forecast.tz_offset == 10800
+
+
+def test_primary_provider_from_config():
+    """Основной источник выбирается по имени, интерфейс нельзя создать без реализации"""
+    assert isinstance(create_provider(lambda: None, "openweathermap"), OpenWeatherMapProvider)
+    assert isinstance(create_provider(lambda: None, "open-meteo"), OpenMeteoProvider)
+    with pytest.raises(ValueError):
+        create_provider(lambda: None, "unknown")
+    with pytest.raises(TypeError):
+        WeatherProvider(lambda: None, "upstream:test")
+
+
+def test_open_meteo_place_as_city_suggestion():
+    """Результат геокодирования Open-Meteo приводится к формату подсказок"""
+    place = {"name": "Москва", "admin1": "Москва", "country_code": "RU", "latitude": 55.75, "longitude": 37.62}
+    assert place_to_city(place) == {
+        "name": "Москва", "display_name": "Москва, Москва, RU", "country": "RU", "lat": 55.75, "lon": 37.62,
+    }
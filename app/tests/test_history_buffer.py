@@ -0,0 +1,91 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from tortoise.exceptions import ValidationError
+
+from app.api.v1.services.history_buffer import PartialWriteError, SearchHistoryBuffer
+
+
+@pytest.mark.asyncio
+@patch('app.models.models.SearchHistory.bulk_create', new_callable=AsyncMock)
+async def test_flush_writes_single_batch(mock_bulk_create):
+    """Накопленные события записываются одним многострочным INSERT"""
+    buffer = SearchHistoryBuffer(redis_url=None, batch_size=100)
+    for city in ["Moscow", "London", "Paris"]:
+        await buffer.record("user-1", city, 20.0, datetime(2024, 1, 1, 12, 0))
+
+    mock_bulk_create.assert_not_awaited()
+    assert await buffer.flush() == 3
+
+    mock_bulk_create.assert_awaited_once()
+    rows = mock_bulk_create.await_args.args[0]
+    assert [row.city for row in rows] == ["Moscow", "London", "Paris"]
+    assert await buffer.flush() == 0
+
+
+@pytest.mark.asyncio
+@patch('app.models.models.SearchHistory.bulk_create', new_callable=AsyncMock)
+async def test_failed_flush_keeps_events(mock_bulk_create):
+    """При ошибке БД события остаются в буфере"""
+    buffer = SearchHistoryBuffer(redis_url=None)
+    await buffer.record("user-1", "Moscow", 20.0)
+
+    mock_bulk_create.side_effect = Exception("connection lost")
+    with pytest.raises(Exception, match="connection lost"):
+        await buffer.flush()
+
+    mock_bulk_create.side_effect = None
+    assert await buffer.flush() == 1
+
+
+@pytest.mark.asyncio
+@patch('app.models.models.SearchHistory.bulk_create', new_callable=AsyncMock)
+async def test_overlong_user_id_is_truncated(mock_bulk_create):
+    """Слишком длинный user_id из cookie обрезается до длины поля"""
+    buffer = SearchHistoryBuffer(redis_url=None)
+    await buffer.record("u" * 300, "C" * 150, 20.0)
+
+    assert await buffer.flush() == 1
+    row = mock_bulk_create.await_args.args[0][0]
+    assert len(row.user_id) == 255
+    assert len(row.city) == 100
+
+
+@pytest.mark.asyncio
+@patch('app.models.models.SearchHistory.save', new_callable=AsyncMock)
+@patch('app.models.models.SearchHistory.bulk_create', new_callable=AsyncMock)
+async def test_bad_row_goes_to_dead_letter(mock_bulk_create, mock_save):
+    """Незаписываемое событие не блокирует остальные и не повторяется"""
+    buffer = SearchHistoryBuffer(redis_url=None)
+    await buffer.record("user-1", "Bad", 20.0)
+    await buffer.record("user-1", "Moscow", 21.0)
+
+    mock_bulk_create.side_effect = ValidationError("user_id: Length 300 > 255")
+    mock_save.side_effect = [ValidationError("user_id: Length 300 > 255"), None]
+
+    assert await buffer.flush() == 1
+    assert mock_save.await_count == 2
+    assert await buffer.flush() == 0
+
+
+
+@pytest.mark.asyncio
+@patch('app.models.models.SearchHistory.save', new_callable=AsyncMock)
+@patch('app.models.models.SearchHistory.bulk_create', new_callable=AsyncMock)
+async def test_connection_error_keeps_unwritten_rows(mock_bulk_create, mock_save):
+    """Ошибка соединения при построчной записи оставляет незаписанные события в очереди"""
+    buffer = SearchHistoryBuffer(redis_url=None)
+    for city in ["Moscow", "London", "Paris"]:
+        await buffer.record("user-1", city, 20.0)
+
+    mock_bulk_create.side_effect = ConnectionError("connection lost")
+    mock_save.side_effect = [None, ConnectionError("connection lost")]
+    with pytest.raises(PartialWriteError):
+        await buffer.flush()
+
+    assert [event["city"] for event in buffer._local] == ["London", "Paris"]
+
+    mock_bulk_create.side_effect = None
+    assert await buffer.flush() == 2
+    assert [row.city for row in mock_bulk_create.await_args.args[0]] == ["London", "Paris"]
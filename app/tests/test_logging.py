@@ -0,0 +1,90 @@
+import json
+import logging
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import logging as app_logging
+from app.core.logging import (
+    CorrelationIdFilter, CorrelationIdMiddleware, JSONFormatter, SamplingFilter, correlation_id,
+    parse_sample_rates,
+)
+
+
+def make_record(msg="Weather lookup finished", level=logging.INFO, **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, (), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extra_and_correlation_id():
+    """JSON запись содержит extra поля и идентификатор запроса"""
+    token = correlation_id.set("req-1")
+    try:
+        record = make_record(city="Moscow", sample="weather")
+        CorrelationIdFilter().filter(record)
+    finally:
+        correlation_id.reset(token)
+
+    payload = json.loads(JSONFormatter().format(record))
+
+    assert payload["message"] == "Weather lookup finished"
+    assert payload["level"] == "INFO"
+    assert payload["correlation_id"] == "req-1"
+    assert payload["city"] == "Moscow"
+    assert "sample" not in payload
+
+
+def test_json_formatter_serializes_unknown_extra_values():
+    """Несериализуемые extra значения выводятся через repr"""
+    payload = json.loads(JSONFormatter().format(make_record(data=object())))
+    assert payload["data"].startswith("<object")
+
+
+def test_sampling_filter_uses_per_key_rates():
+    """Сэмплирование по долям для ключей; записи без ключа и от WARNING проходят всегда"""
+    sampling = SamplingFilter(0.0, parse_sample_rates("weather_by_city=0.5, weather=1"), rng=lambda: 0.3)
+
+    assert sampling.filter(make_record(sample="weather_by_city"))
+    assert sampling.filter(make_record(sample="weather"))
+    assert not sampling.filter(make_record(sample="other"))
+    # Без ключа и предупреждения - всегда
+    assert sampling.filter(make_record())
+    assert sampling.filter(make_record(level=logging.WARNING, sample="other"))
+
+
+def test_middleware_sets_and_returns_request_id():
+    """Middleware берет X-Request-ID клиента или создает новый"""
+    app = FastAPI()
+    app.add_middleware(CorrelationIdMiddleware)
+
+    @app.get("/id")
+    async def get_id():
+        return {"id": correlation_id.get()}
+
+    client = TestClient(app)
+    response = client.get("/id", headers={"X-Request-ID": "abc"})
+    assert response.json() == {"id": "abc"}
+    assert response.headers["X-Request-ID"] == "abc"
+
+    generated = client.get("/id")
+    assert generated.json()["id"] == generated.headers["X-Request-ID"]
+    assert correlation_id.get() is None
+
+
+def test_request_id_passed_to_celery_task():
+    """Идентификатор запроса передается в задачу Celery"""
+    headers = {}
+    token = correlation_id.set("req-2")
+    try:
+        app_logging._on_task_publish(headers=headers)
+    finally:
+        correlation_id.reset(token)
+
+    request = SimpleNamespace(headers=None, **headers)
+    request.get = lambda key, default=None: getattr(request, key, default)
+    app_logging._on_task_prerun(task_id="task-1", task=SimpleNamespace(request=request))
+    assert correlation_id.get() == "req-2"
+    app_logging._on_task_postrun(task_id="task-1")
+    assert correlation_id.get() is None
@@ -5,8 +5,13 @@ from fastapi.testclient import TestClient
 from unittest.mock import Mock, patch, AsyncMock
 from datetime import datetime
 import uuid
+import json
+import time
 
 from app.main import app
+from app.api.v1.routes import weather_service
+from app.api.v1.services.cache_service import CacheEntry
+from app.api.v1.services.search_service import decode_history_cursor
 from app.models.models import SearchHistory
 
 
@@ -34,9 +39,9 @@ class TestMainApp:
     def test_home_page_with_user_history(self, mock_filter, client):
         """Тест главной страницы с историей пользователя"""
         # Мокаем историю поиска
-        mock_search = Mock()
-        mock_search.city = "Moscow"
-        mock_filter.return_value.order_by.return_value.limit.return_value = AsyncMock(return_value=[mock_search])
+        mock_filter.return_value.order_by.return_value.limit.return_value.values_list = AsyncMock(
+            return_value=["Moscow"]
+        )
         
         response = client.get("/", cookies={"user_id": "test-user-id"})
         assert response.status_code == 200
@@ -72,6 +77,61 @@ class TestMainApp:
         assert len(data["suggestions"]) == 1
         assert data["suggestions"][0]["name"] == "Moscow"
     
+    @patch('app.api.v1.routes.city_index')
+    @patch('app.api.v1.services.weather_service.WeatherService.search_cities')
+    async def test_city_suggestions_index_canonical_name_only(self, mock_search_cities, mock_index, async_client):
+        """Тест: найденный во внешнем API город попадает в индекс без текста запроса"""
+        city = {"name": "Moscow", "display_name": "Moscow, RU", "country": "RU", "lat": 55.7558, "lon": 37.6176}
+        mock_search_cities.return_value = [city]
+        mock_index.version = 1
+        mock_index.search.return_value = []
+        
+        response = await async_client.get("/api/v1/cities/suggestions?q=Moskvaa")
+        assert response.status_code == 200
+        mock_index.add.assert_called_once_with(city)
+    
+    @patch('app.api.v1.services.weather_service.WeatherService.search_cities')
+    async def test_city_suggestions_not_modified(self, mock_search_cities, async_client):
+        """Тест ответа 304 на повторный запрос подсказок с тем же ETag"""
+        mock_search_cities.return_value = [
+            {"name": "Moscow", "display_name": "Moscow, RU", "country": "RU", "lat": 55.7558, "lon": 37.6176}
+        ]
+        
+        response = await async_client.get("/api/v1/cities/suggestions?q=Moscow")
+        etag = response.headers["etag"]
+        assert etag.startswith('W/"')
+        assert "max-age" in response.headers["cache-control"]
+        
+        response = await async_client.get(
+            "/api/v1/cities/suggestions?q=Moscow", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+    
+    @patch('app.api.v1.routes.record_search', new_callable=AsyncMock)
+    @patch('app.api.v1.routes.run_weather_lookup', new_callable=AsyncMock)
+    async def test_get_weather_by_city_not_modified(self, mock_lookup, mock_record, async_client):
+        """Тест ответа 304 по ETag записи в кэше без получения погоды"""
+        entry = CacheEntry({"city": "Moscow", "current": {"temperature": 25}}, time.time())
+        
+        with patch.object(weather_service.cache, 'get_shared_entry', AsyncMock(return_value=entry)):
+            mock_lookup.return_value = dict(entry.value)
+            response = await async_client.get("/api/v1/weather/Moscow", cookies={"user_id": "user-1"})
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            assert etag.startswith('W/"')
+            assert response.headers["cache-control"].startswith("public")
+            
+            response = await async_client.get(
+                "/api/v1/weather/Moscow",
+                headers={"If-None-Match": etag},
+                cookies={"user_id": "user-1"}
+            )
+        
+        assert response.status_code == 304
+        mock_lookup.assert_called_once()
+        mock_record.assert_called_once_with("user-1", entry.value)
+    
     @patch('app.api.v1.services.weather_service.WeatherService.search_cities')
     async def test_city_suggestions_error(self, mock_search_cities, async_client):
         """Тест ошибки при получении подсказок городов"""
@@ -131,6 +191,28 @@ class TestMainApp:
         
         assert response.status_code == 404
     
+    @patch('app.celery_dir.tasks.get_weather_async.delay')
+    @patch('app.api.v1.routes.wait_for_celery_task')
+    async def test_get_weather_upstream_unavailable(self, mock_wait_task, mock_celery_task, async_client):
+        """Тест ответа 503 с Retry-After при недоступном API"""
+        mock_task = Mock()
+        mock_task.id = "test-task-id"
+        mock_celery_task.return_value = mock_task
+        
+        mock_wait_task.return_value = {
+            "error": "Сервис погоды временно недоступен (429)",
+            "status_code": 503,
+            "retry_after": 12.3
+        }
+        
+        response = await async_client.post(
+            "/api/v1/weather",
+            json={"city": "Moscow"}
+        )
+        
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "13"
+    
     @patch('app.celery_dir.tasks.get_weather_async.delay')
     @patch('app.api.v1.routes.wait_for_celery_task')
     async def test_get_weather_timeout(self, mock_wait_task, mock_celery_task, async_client):
@@ -148,6 +230,27 @@ class TestMainApp:
         
         assert response.status_code == 408
     
+    @patch('app.api.v1.routes.settings.WEATHER_EXECUTION_MODE', 'inline')
+    @patch('app.celery_dir.tasks.get_weather_async.delay')
+    @patch('app.api.v1.routes.get_weather_for_user', new_callable=AsyncMock)
+    async def test_get_weather_inline_mode(self, mock_lookup, mock_celery_task, async_client):
+        """Тест получения погоды без Celery (режим inline)"""
+        mock_lookup.return_value = {
+            "city": "Moscow",
+            "current": {"temperature": 25},
+            "daily_forecast": [],
+            "hourly_forecast": []
+        }
+        
+        response = await async_client.post(
+            "/api/v1/weather",
+            json={"city": "Moscow"}
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["city"] == "Moscow"
+        mock_celery_task.assert_not_called()
+    
     @patch('app.celery_dir.tasks.get_weather_async.delay')
     async def test_start_weather_task(self, mock_celery_task, async_client):
         """Тест запуска задачи получения погоды"""
@@ -164,6 +267,55 @@ class TestMainApp:
         data = response.json()
         assert data["task_id"] == "test-task-id"
     
+    @patch('app.api.v1.services.weather_service.WeatherService.get_weather_by_coords_cached')
+    async def test_get_weather_by_coords(self, mock_coords, async_client):
+        """Тест получения погоды по координатам"""
+        mock_coords.return_value = {
+            "city": "Moscow",
+            "country": "RU",
+            "temperature": 20.5,
+            "feels_like": 19.0,
+            "humidity": 60,
+            "description": "ясно",
+            "weather_code": 0,
+            "wind_speed": 11,
+            "weather_id": 800,
+            "tile": "ucfv0"
+        }
+        
+        response = await async_client.get("/api/v1/weather/coords?lat=55.75&lon=37.61")
+        assert response.status_code == 200
+        assert response.json()["tile"] == "ucfv0"
+        mock_coords.assert_called_once_with(55.75, 37.61)
+    
+    async def test_get_weather_by_coords_invalid(self, async_client):
+        """Тест валидации координат"""
+        response = await async_client.get("/api/v1/weather/coords?lat=120&lon=37.61")
+        assert response.status_code == 422
+    
+    async def test_get_weather_batch(self, async_client):
+        """Тест пакетного запроса погоды (NDJSON)"""
+        async def fake_batch(cities, coords):
+            yield {"query": {"city": "Moscow"}, "status": "ok", "data": {"city": "Moscow"}}
+            yield {"query": {"lat": 55.75, "lon": 37.61}, "status": "error", "error": "timeout"}
+
+        with patch('app.api.v1.routes.weather_service.get_weather_batch', side_effect=fake_batch) as mock_batch:
+            response = await async_client.post(
+                "/api/v1/weather/batch",
+                json={"cities": ["Moscow"], "coords": [{"lat": 55.75, "lon": 37.61}]}
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["status"] for line in lines] == ["ok", "error"]
+        mock_batch.assert_called_once_with(["Moscow"], [(55.75, 37.61)])
+
+    async def test_get_weather_batch_empty(self, async_client):
+        """Тест валидации пустого пакетного запроса"""
+        response = await async_client.post("/api/v1/weather/batch", json={"cities": []})
+        assert response.status_code == 422
+
     @patch('celery.result.AsyncResult')
     def test_get_task_status_success(self, mock_async_result, client):
         """Тест получения статуса задачи - успех"""
@@ -209,8 +361,9 @@ class TestMainApp:
         assert data["status"] == "FAILURE"
         assert data["error"] == "Task failed"
     
+    @patch('app.api.v1.routes.stats_store.top', new_callable=AsyncMock, return_value=None)
     @patch('tortoise.connections.get')
-    async def test_get_search_stats(self, mock_get_connection, async_client):
+    async def test_get_search_stats(self, mock_get_connection, mock_top, async_client):
         """Тест получения статистики поиска"""
         # Мокаем соединение с БД
         mock_conn = Mock()
@@ -229,15 +382,32 @@ class TestMainApp:
         assert data["stats"][0]["city"] == "Moscow"
         assert data["stats"][0]["count"] == 10
     
+    @patch('app.api.v1.routes.stats_store.top', new_callable=AsyncMock)
+    @patch('tortoise.connections.get')
+    async def test_get_search_stats_from_counters(self, mock_get_connection, mock_top, async_client):
+        """Тест статистики за окно из счетчиков без запроса к БД"""
+        mock_top.return_value = [{"city": "Paris", "count": 3}]
+        
+        response = await async_client.get("/api/v1/stats?window=day")
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["window"] == "day"
+        assert data["stats"] == [{"city": "Paris", "count": 3}]
+        mock_top.assert_awaited_once_with("day", limit=20)
+        mock_get_connection.assert_not_called()
+    
     @patch('app.models.models.SearchHistory.filter')
     async def test_get_user_history_with_user(self, mock_filter, async_client):
         """Тест получения истории пользователя"""
         # Мокаем историю
         mock_history = [
-            Mock(city="Moscow", timestamp=datetime.now(), temperature=25),
-            Mock(city="London", timestamp=datetime.now(), temperature=15)
+            {"id": 2, "city": "Moscow", "timestamp": datetime(2024, 1, 2, 12, 0), "temperature": 25},
+            {"id": 1, "city": "London", "timestamp": datetime(2024, 1, 1, 12, 0), "temperature": 15}
         ]
-        mock_filter.return_value.order_by.return_value.limit.return_value = AsyncMock(return_value=mock_history)
+        mock_filter.return_value.order_by.return_value.limit.return_value.values = AsyncMock(
+            return_value=mock_history
+        )
         
         response = await async_client.get(
             "/api/v1/user/history",
@@ -248,6 +418,47 @@ class TestMainApp:
         data = response.json()
         assert "history" in data
         assert len(data["history"]) == 2
+        assert data["next_cursor"] is None
+        mock_filter.return_value.order_by.assert_called_once_with("-timestamp", "-id")
+        mock_filter.return_value.order_by.return_value.limit.assert_called_once_with(51)
+    
+    @patch('app.models.models.SearchHistory.filter')
+    async def test_get_user_history_pagination(self, mock_filter, async_client):
+        """Тест постраничной истории: курсор следующей страницы"""
+        mock_history = [
+            {"id": 3, "city": "Moscow", "timestamp": datetime(2024, 1, 3, 12, 0), "temperature": 25},
+            {"id": 2, "city": "London", "timestamp": datetime(2024, 1, 2, 12, 0), "temperature": 15},
+            {"id": 1, "city": "Paris", "timestamp": datetime(2024, 1, 1, 12, 0), "temperature": 18}
+        ]
+        mock_filter.return_value.order_by.return_value.limit.return_value.values = AsyncMock(
+            return_value=mock_history
+        )
+        
+        response = await async_client.get(
+            "/api/v1/user/history?limit=2",
+            cookies={"user_id": "test-user-id"}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["city"] for item in data["history"]] == ["Moscow", "London"]
+        assert decode_history_cursor(data["next_cursor"]) == (datetime(2024, 1, 2, 12, 0), 2)
+        
+        # Следующая страница запрашивается с условием по позиции курсора
+        await async_client.get(
+            f"/api/v1/user/history?limit=2&cursor={data['next_cursor']}",
+            cookies={"user_id": "test-user-id"}
+        )
+        assert len(mock_filter.call_args.args) == 3
+    
+    async def test_get_user_history_invalid_cursor(self, async_client):
+        """Тест некорректного курсора истории"""
+        response = await async_client.get(
+            "/api/v1/user/history?cursor=not-a-cursor",
+            cookies={"user_id": "test-user-id"}
+        )
+        
+        assert response.status_code == 400
     
     async def test_get_user_history_without_user(self, async_client):
         """Тест получения истории без user_id"""
@@ -305,38 +516,41 @@ class TestUtilityFunctions:
     """Тесты вспомогательных функций"""
     
     @pytest.mark.asyncio
-    async def test_wait_for_celery_task_success(self):
+    @patch('app.api.v1.routes.result_waiter.wait', new_callable=AsyncMock)
+    async def test_wait_for_celery_task_success(self, mock_wait):
         """Тест успешного ожидания Celery задачи"""
         from app.api.v1.routes import wait_for_celery_task
         
         mock_task = Mock()
-        mock_task.ready.return_value = True
-        mock_task.successful.return_value = True
-        mock_task.result = {"test": "data"}
+        mock_task.id = "test-task-id"
+        mock_wait.return_value = {"status": "SUCCESS", "result": {"test": "data"}}
         
         result = await wait_for_celery_task(mock_task, timeout=1)
         assert result == {"test": "data"}
+        mock_wait.assert_awaited_once_with("test-task-id", 1)
     
     @pytest.mark.asyncio
-    async def test_wait_for_celery_task_timeout(self):
+    @patch('app.api.v1.routes.result_waiter.wait', new_callable=AsyncMock)
+    async def test_wait_for_celery_task_timeout(self, mock_wait):
         """Тест таймаута при ожидании Celery задачи"""
         from app.api.v1.routes import wait_for_celery_task
         
         mock_task = Mock()
-        mock_task.ready.return_value = False
+        mock_task.id = "test-task-id"
+        mock_wait.side_effect = asyncio.TimeoutError()
         
         with pytest.raises(Exception, match="Task timeout exceeded"):
             await wait_for_celery_task(mock_task, timeout=0.1)
     
     @pytest.mark.asyncio
-    async def test_wait_for_celery_task_failure(self):
+    @patch('app.api.v1.routes.result_waiter.wait', new_callable=AsyncMock)
+    async def test_wait_for_celery_task_failure(self, mock_wait):
         """Тест неудачного выполнения Celery задачи"""
         from app.api.v1.routes import wait_for_celery_task
         
         mock_task = Mock()
-        mock_task.ready.return_value = True
-        mock_task.successful.return_value = False
-        mock_task.info = "Task failed"
+        mock_task.id = "test-task-id"
+        mock_wait.return_value = {"status": "FAILURE", "result": "Task failed"}
         
         with pytest.raises(Exception, match="Task failed"):
             await wait_for_celery_task(mock_task, timeout=1)
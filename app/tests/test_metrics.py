@@ -0,0 +1,102 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core import metrics
+from app.core.metrics import EventLoopLagMonitor, MetricsMiddleware, metrics_endpoint, observe_db
+
+
+def sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    return app
+
+
+def test_request_duration_labelled_by_route_template():
+    """Время запроса учитывается по шаблону маршрута, а не по пути"""
+    labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", labels)
+
+    client = TestClient(make_app())
+    client.get("/items/1")
+    client.get("/items/2")
+
+    assert sample("http_request_duration_seconds_count", labels) == before + 2
+
+
+def test_unmatched_requests_share_one_label():
+    """Запросы без маршрута попадают в один ряд unmatched"""
+    labels = {"method": "GET", "route": "unmatched", "status": "404"}
+    before = sample("http_request_duration_seconds_count", labels)
+
+    TestClient(make_app()).get("/missing/123")
+
+    assert sample("http_request_duration_seconds_count", labels) == before + 1
+
+
+def test_metrics_endpoint_exposes_prometheus_format():
+    """/metrics отдает метрики в формате Prometheus"""
+    response = TestClient(make_app()).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "http_request_duration_seconds" in response.text
+
+
+def test_observe_db_records_failed_queries():
+    """Время запроса к БД учитывается и при ошибке"""
+    before = sample("db_query_duration_seconds_count", {"query": "test_query"})
+
+    with pytest.raises(RuntimeError):
+        with observe_db("test_query"):
+            raise RuntimeError("db error")
+
+    assert sample("db_query_duration_seconds_count", {"query": "test_query"}) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_event_loop_lag_monitor_detects_blocking():
+    """Блокировка event loop видна в задержке таймера"""
+    before = sample("event_loop_lag_seconds_sum")
+    monitor = EventLoopLagMonitor(interval=0.01)
+    await monitor.start()
+    await asyncio.sleep(0)
+    time.sleep(0.05)  # блокирующий вызов в event loop
+    await asyncio.sleep(0.02)
+    await monitor.stop()
+
+    assert sample("event_loop_lag_seconds_sum") - before >= 0.03
+
+
+def test_celery_queue_wait_and_duration():
+    """Ожидание в очереди и время выполнения задачи Celery"""
+    headers = {}
+    metrics._on_task_publish(headers=headers)
+    headers[metrics.PUBLISHED_AT_HEADER] -= 2
+
+    request = SimpleNamespace(headers=None, **headers)
+    request.get = lambda key, default=None: getattr(request, key, default)
+    task = SimpleNamespace(name="test.task", request=request)
+    wait_before = sample("celery_task_queue_wait_seconds_sum", {"task": "test.task"})
+    runs_before = sample("celery_task_duration_seconds_count", {"task": "test.task", "state": "SUCCESS"})
+
+    metrics._on_task_prerun(task_id="1", task=task)
+    metrics._on_task_postrun(task_id="1", state="SUCCESS")
+
+    assert sample("celery_task_queue_wait_seconds_sum", {"task": "test.task"}) - wait_before >= 2
+    assert sample("celery_task_duration_seconds_count", {"task": "test.task", "state": "SUCCESS"}) == runs_before + 1
@@ -0,0 +1,122 @@
+import logging
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.api.v1.services.partition_service import (
+    HistoryRetention, parse_partition_name, partition_name
+)
+
+
+class FakeConnection:
+    def __init__(self, partitioned: bool, partitions=(), default_rows=None):
+        self.partitioned = partitioned
+        self.partitions = list(partitions)
+        # Ответы на подсчет записей в секции по умолчанию: [(число, самая старая запись)]
+        self.default_rows = None if default_rows is None else list(default_rows)
+        self.scripts = []
+
+    async def execute_query_dict(self, query, values=None):
+        if "relkind" in query:
+            return [{"partitioned": self.partitioned}]
+        if "IS NOT NULL" in query:
+            return [{"present": self.default_rows is not None}]
+        if "count(*)" in query:
+            total, oldest = self.default_rows.pop(0)
+            return [{"total": total, "oldest": oldest}]
+        return [{"name": name} for name in self.partitions]
+
+    async def execute_script(self, script):
+        self.scripts.append(script)
+
+
+def make_retention(partition_days=1, now=datetime(2024, 3, 15, 10, 0)):
+    return HistoryRetention(
+        partition_days=partition_days, premake_days=2, retention_days=30, clock=lambda: now
+    )
+
+
+def test_partition_name_roundtrip():
+    """Имя секции строится и разбирается обратно в границы"""
+    name = partition_name(date(2024, 1, 1), date(2024, 1, 2))
+    assert name == "search_history_p20240101_20240102"
+    assert parse_partition_name(name) == (date(2024, 1, 1), date(2024, 1, 2))
+    assert parse_partition_name("search_history") is None
+
+
+def test_weekly_period_starts_on_monday():
+    """Недельные секции начинаются с понедельника"""
+    start, end = make_retention(partition_days=7).period(date(2024, 3, 15))
+    assert start == date(2024, 3, 11)
+    assert start.weekday() == 0
+    assert end == date(2024, 3, 18)
+
+
+def test_plan_creates_future_and_drops_expired():
+    """План создает секции вперед и удаляет устаревшие"""
+    existing = [
+        (date(2024, 2, 13), date(2024, 2, 14)),
+        (date(2024, 2, 14), date(2024, 2, 15)),
+        (date(2024, 3, 15), date(2024, 3, 16)),
+    ]
+    create, drop = make_retention().plan(existing)
+
+    assert create == [(date(2024, 3, 16), date(2024, 3, 17)), (date(2024, 3, 17), date(2024, 3, 18))]
+    # Секция 14-15 февраля содержит записи не старше срока хранения
+    assert drop == [(date(2024, 2, 13), date(2024, 2, 14))]
+
+
+def test_plan_skips_overlapping_partitions():
+    """Период, пересекающийся с существующей секцией, не создается"""
+    # Недельная секция, созданная до перехода на дневные
+    create, _ = make_retention().plan([(date(2024, 3, 11), date(2024, 3, 18))])
+    assert create == []
+
+
+@pytest.mark.asyncio
+async def test_apply_creates_and_drops_partitions():
+    """Применение плана выполняет CREATE и DROP секций"""
+    conn = FakeConnection(True, ["search_history_p20240101_20240102", "search_history_p20240315_20240316"])
+
+    result = await make_retention().apply(conn)
+
+    assert result["dropped"] == ["search_history_p20240101_20240102"]
+    assert len(result["created"]) == 2
+    assert conn.scripts[0].startswith('CREATE TABLE IF NOT EXISTS "search_history_p20240316_20240317"')
+    assert "FROM ('2024-03-16 00:00:00+00') TO ('2024-03-17 00:00:00+00')" in conn.scripts[0]
+    assert conn.scripts[-1] == 'DROP TABLE IF EXISTS "search_history_p20240101_20240102"'
+
+
+@pytest.mark.asyncio
+async def test_apply_drains_default_partition(caplog):
+    """Записи из секции по умолчанию переносятся в созданные для них секции"""
+    conn = FakeConnection(
+        True,
+        ["search_history_p20240315_20240316"],
+        default_rows=[(3, datetime(2024, 3, 10, 12, 0, tzinfo=timezone.utc)), (0, None)],
+    )
+
+    with caplog.at_level(logging.WARNING):
+        result = await make_retention().apply(conn)
+
+    assert result["default_rows"] == 0
+    assert result["created"][0] == "search_history_p20240310_20240311"
+    assert conn.scripts[0].startswith('DELETE FROM "search_history_default" WHERE "timestamp" < \'2024-02-14')
+    move = conn.scripts[1]
+    assert 'DELETE FROM "search_history_default" WHERE "timestamp" >= \'2024-03-10 00:00:00+00\'' in move
+    assert 'PARTITION OF "search_history" FOR VALUES' in move
+    assert "3 search history rows found in search_history_default" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_apply_reports_rows_left_in_default_partition(caplog):
+    """Оставшиеся в секции по умолчанию записи отмечаются ошибкой в логе"""
+    conn = FakeConnection(
+        True, default_rows=[(2, datetime(2024, 3, 15, 9, 0, tzinfo=timezone.utc)), (1, None)]
+    )
+
+    with caplog.at_level(logging.ERROR):
+        result = await make_retention().apply(conn)
+
+    assert result["default_rows"] == 1
+    assert any(record.levelno == logging.ERROR for record in caplog.records)
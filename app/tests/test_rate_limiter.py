@@ -0,0 +1,118 @@
+import pytest
+
+from app.api.v1.services.cache_service import WeatherCache
+from app.api.v1.services.rate_limiter import CircuitBreaker, RateLimiter, UpstreamUnavailable
+from app.api.v1.services.weather_service import WeatherService
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_rejects_when_bucket_empty():
+    """Запросы сверх лимита отклоняются, если токена не дождаться"""
+    clock = FakeClock()
+    limiter = RateLimiter(redis_url=None, rate=1, burst=2, max_wait=0.1, clock=clock)
+
+    await limiter.acquire()
+    await limiter.acquire()
+    with pytest.raises(UpstreamUnavailable) as exc_info:
+        await limiter.acquire()
+    assert exc_info.value.retry_after == pytest.approx(1)
+
+    clock.now += 1
+    await limiter.acquire()
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_after_failures():
+    """Предохранитель открывается после серии ошибок и сбрасывается успехом"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(redis_url=None, failure_threshold=2, base_backoff=10, max_backoff=60, clock=clock)
+
+    await breaker.record_failure()
+    await breaker.check()
+    await breaker.record_failure()
+    with pytest.raises(UpstreamUnavailable) as exc_info:
+        await breaker.check()
+    assert 5 <= exc_info.value.retry_after <= 10
+
+    clock.now += 10
+    await breaker.check()
+    await breaker.record_success()
+    await breaker.record_failure()
+    await breaker.check()
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_success_resets_shared_failures():
+    """Успех сбрасывает общий счетчик ошибок других процессов и не трогает Redis без ошибок"""
+    class FakeRedis:
+        def __init__(self):
+            self.failures = None
+            self.deleted = []
+
+        async def mget(self, *keys):
+            return [None, self.failures]
+
+        async def delete(self, key):
+            self.deleted.append(key)
+
+    redis = FakeRedis()
+    breaker = CircuitBreaker(namespace="test:breaker", redis=redis)
+
+    await breaker.check()
+    await breaker.record_success()
+    assert redis.deleted == []
+
+    redis.failures = b"2"
+    await breaker.check()
+    await breaker.record_success()
+    assert redis.deleted == ["test:breaker:failures"]
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_respects_retry_after():
+    """Retry-After из ответа 429 открывает предохранитель сразу"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(redis_url=None, failure_threshold=5, clock=clock)
+
+    await breaker.record_failure(retry_after=30)
+    with pytest.raises(UpstreamUnavailable) as exc_info:
+        await breaker.check()
+    assert exc_info.value.retry_after == 30
+
+
+def test_circuit_breaker_backoff_grows_exponentially():
+    """Пауза растет экспоненциально, но не больше max_backoff"""
+    breaker = CircuitBreaker(redis_url=None, failure_threshold=1, base_backoff=1, max_backoff=8)
+
+    assert 0.5 <= breaker.backoff(1) <= 1
+    assert 2 <= breaker.backoff(3) <= 4
+    assert 4 <= breaker.backoff(10) <= 8
+
+
+@pytest.mark.asyncio
+async def test_weather_service_serves_stale_when_upstream_unavailable():
+    """При недоступном API отдается последнее сохраненное значение"""
+    clock = FakeClock()
+    service = WeatherService()
+    service.cache = WeatherCache("test:stale", soft_ttl=10, hard_ttl=20, stale_ttl=100, redis_url=None, clock=clock)
+    await service.cache.set("moscow", {"city": "Moscow"})
+    clock.now += 50
+
+    async def unavailable(city):
+        raise UpstreamUnavailable(5)
+
+    service._fetch_weather_by_city = unavailable
+
+    result = await service.get_weather_by_city("Moscow")
+    assert result == {"city": "Moscow", "stale": True}
+
+    with pytest.raises(UpstreamUnavailable):
+        await service.get_weather_by_city("London")
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from app.core.serialization import FastJSONResponse, dumps, dumps_str, loads
+
+
+def test_round_trip_keeps_unicode_and_datetimes():
+    """Кириллица не экранируется, datetime пишется в ISO формате"""
+    data = {"city": "Москва", "timestamp": datetime(2024, 1, 1, 12, 30), "temps": [1.5, -2]}
+
+    encoded = dumps(data)
+
+    assert "Москва".encode("utf-8") in encoded
+    assert loads(encoded) == {"city": "Москва", "timestamp": "2024-01-01T12:30:00", "temps": [1.5, -2]}
+    assert loads(dumps_str(data)) == loads(encoded)
+
+
+def test_non_string_keys():
+    """Нестроковые ключи приводятся к строкам, как в стандартном json"""
+    assert loads(dumps({1: "a"})) == {"1": "a"}
+
+
+def test_fast_json_response_renders_bytes():
+    """Ответ FastAPI сериализуется через общий слой"""
+    response = FastJSONResponse(content={"city": "Москва"})
+
+    assert loads(response.body) == {"city": "Москва"}
+    assert response.media_type == "application/json"
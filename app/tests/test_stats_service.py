@@ -0,0 +1,37 @@
+import pytest
+
+from app.api.v1.services.stats_service import STATS_WINDOWS, SearchStatsStore
+
+
+class FakePipeline:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args))
+
+    async def execute(self):
+        return []
+
+
+class FakeRedis:
+    def __init__(self):
+        self.calls = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.calls)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_resets_buckets_without_rows():
+    """Сверка сбрасывает все корзины окна, а не только те, где есть строки"""
+    store = SearchStatsStore(namespace="test:stats", redis=FakeRedis())
+
+    await store.rebuild([{"city": "Moscow", "count": 3}], {window: [] for window in STATS_WINDOWS})
+
+    deleted = [args for name, args in store._redis.calls if name == "delete"]
+    for window, (_, count) in STATS_WINDOWS.items():
+        window_keys = [args for args in deleted if args[0].startswith(f"test:stats:{window}:")]
+        assert len(window_keys) == 1
+        assert len(window_keys[0]) == count + 1
+    assert ("set", (store.ready_key,)) in [(name, args[:1]) for name, args in store._redis.calls]
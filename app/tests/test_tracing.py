@@ -0,0 +1,85 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from app.core import tracing
+from app.core.tracing import FileSpanExporter, TracingMiddleware, span
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "_tracer", provider.get_tracer("test"))
+    return exporter
+
+
+def test_span_is_noop_without_tracing():
+    """Без трассировки span ничего не делает"""
+    with span("noop") as current:
+        assert current is None
+
+
+def test_request_span_named_by_route_with_remote_parent(exporter):
+    """Спан запроса по шаблону маршрута и с родителем из traceparent"""
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        with span("db query", kind="client"):
+            return {"id": item_id}
+
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    TestClient(app).get("/items/1", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    server, child = spans["GET /items/{item_id}"], spans["db query"]
+    assert format(server.context.trace_id, "032x") == trace_id
+    assert server.attributes["http.status_code"] == 200
+    assert child.parent.span_id == server.context.span_id
+
+
+def test_celery_headers_carry_trace_context(exporter):
+    """Контекст трассировки передается через заголовки задачи Celery"""
+    headers = {"id": "task-1"}
+    with span("handler"):
+        tracing._on_before_task_publish(sender="app.tasks.get_weather_async", headers=headers)
+    tracing._on_after_task_publish(headers=headers)
+    assert "traceparent" in headers
+
+    request = SimpleNamespace(headers=None, **headers)
+    request.get = lambda key, default=None: getattr(request, key, default)
+    task = SimpleNamespace(name="app.tasks.get_weather_async", request=request)
+    tracing._on_task_prerun(task_id="task-1", task=task)
+    with span("upstream weather", kind="client"):
+        pass
+    tracing._on_task_postrun(task_id="task-1", state="SUCCESS")
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    publish = spans["celery.publish app.tasks.get_weather_async"]
+    run = spans["celery.run app.tasks.get_weather_async"]
+    assert run.parent.span_id == publish.context.span_id
+    assert spans["upstream weather"].parent.span_id == run.context.span_id
+    assert publish.parent.span_id == spans["handler"].context.span_id
+
+
+def test_file_exporter_writes_json_lines(exporter, tmp_path):
+    """Файловый экспортер пишет спан на строку JSON"""
+    with span("one"):
+        pass
+    path = tmp_path / "traces.jsonl"
+    FileSpanExporter(str(path)).export(exporter.get_finished_spans())
+
+    lines = path.read_text().splitlines()
+    assert json.loads(lines[0])["name"] == "one"
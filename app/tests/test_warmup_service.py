@@ -0,0 +1,61 @@
+import pytest
+
+from app.api.v1.services.cache_service import WeatherCache
+from app.api.v1.services.warmup_service import CacheWarmer
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeWeatherService:
+    def __init__(self, clock):
+        self.cache = WeatherCache("test:warmup", redis_url=None, clock=clock)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def warmer(clock):
+    return CacheWarmer(
+        FakeWeatherService(clock), interval=60, min_refresh=100, max_refresh=500, clock=clock
+    )
+
+
+def test_refresh_interval_adapts_to_popularity(warmer):
+    """Популярные города обновляются чаще"""
+    assert warmer.refresh_interval(100, 100) == 100
+    assert warmer.refresh_interval(50, 100) == 300
+    assert warmer.refresh_interval(0, 100) == 500
+
+
+@pytest.mark.asyncio
+async def test_plan_spreads_missing_cities(warmer):
+    """Отсутствующие в кэше города прогреваются с разносом по времени"""
+    cities = [{"city": "Moscow", "count": 10}, {"city": "London", "count": 5}, {"city": "Paris", "count": 1}]
+
+    plan = await warmer.plan(cities)
+
+    assert [city for city, _, _ in plan] == ["Moscow", "London", "Paris"]
+    assert [delay for _, delay, _ in plan] == [0, 20, 40]
+
+
+@pytest.mark.asyncio
+async def test_plan_schedules_refresh_before_expiry(warmer, clock):
+    """Обновление планируется до истечения записи в кэше"""
+    cache = warmer.weather_service.cache
+    await cache.set("moscow", {"city": "Moscow"})
+    await cache.set("london", {"city": "London"})
+    clock.now += 80
+
+    plan = await warmer.plan([{"city": "Moscow", "count": 10}, {"city": "London", "count": 1}])
+
+    # Moscow обновляется каждые 100 секунд, London - только через 500
+    assert plan == [("Moscow", 20, 100)]
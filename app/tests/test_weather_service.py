@@ -5,24 +5,72 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from aiohttp.test_utils import TestServer
+
 from app.api.v1.services.weather_service import WeatherService
+from app.api.v1.services.cache_service import WeatherCache
+from app.api.v1.services.providers import OpenWeatherMapProvider
+from app.api.v1.services.rate_limiter import CircuitBreaker, RateLimiter, UpstreamUnavailable
+from benchmarks.mock_owm import MockConfig, make_app
 
 @pytest.fixture
 def weather_service():
     return WeatherService()
 
+@pytest.fixture
+async def mock_owm():
+    """Локальная замена OpenWeatherMap (без сети)"""
+    config = MockConfig(seed=1)
+    server = TestServer(make_app(config))
+    await server.start_server()
+    yield server, config
+    await server.close()
+
+
+def point_to(service: WeatherService, server: TestServer) -> WeatherService:
+    service.provider = OpenWeatherMapProvider(
+        service._get_session,
+        base_url=str(server.make_url("/data/2.5")),
+        geo_url=str(server.make_url("/geo/1.0")),
+        api_key="test",
+        rate_limiter=RateLimiter(redis_url=None),
+        breaker=CircuitBreaker(redis_url=None),
+    )
+    return service
+
+
 @pytest.mark.asyncio
-async def test_search_cities(weather_service):
+async def test_search_cities(weather_service, mock_owm):
     """Тест поиска городов"""
-    # Тест с коротким запросом
-    result = await weather_service.search_cities("M")
-    assert isinstance(result, list)
-    
-    # Тест с нормальным запросом
-    result = await weather_service.search_cities("Moscow")
-    assert isinstance(result, list)
-    # В реальном API должны быть результаты
-    # assert len(result) > 0
+    service = point_to(weather_service, mock_owm[0])
+    try:
+        # Тест с коротким запросом
+        result = await service.search_cities("M")
+        assert isinstance(result, list)
+
+        # Тест с нормальным запросом
+        result = await service.search_cities("Moscow")
+        assert isinstance(result, list)
+        assert result[0]["name"] == "Moscow"
+        assert result[0]["display_name"] == "Moscow, Region, RU"
+    finally:
+        await service.close()
+
+
+@pytest.mark.asyncio
+async def test_upstream_429_raises_unavailable(weather_service, mock_owm):
+    """Ответ 429 с Retry-After - UpstreamUnavailable с задержкой повтора"""
+    server, config = mock_owm
+    config.rate_429 = 1
+    config.retry_after = 7
+    service = point_to(weather_service, server)
+    try:
+        with pytest.raises(UpstreamUnavailable) as error:
+            await service.search_cities("Moscow")
+        assert error.value.retry_after == 7
+        assert config.requests == {"direct:429": 1}
+    finally:
+        await service.close()
 
 @pytest.mark.asyncio
 async def test_get_coordinates(weather_service):
@@ -62,4 +110,93 @@ def test_format_weather_data(weather_service):
     assert "current" in result
     assert "daily_forecast" in result
     assert "hourly_forecast" in result
-    assert result["current"]["temperature"] == 20.5
\ No newline at end of file
+    assert result["current"]["temperature"] == 20.5
+
+@pytest.mark.asyncio
+async def test_get_weather_by_city_fetches_concurrently(weather_service):
+    """Текущая погода и прогноз запрашиваются параллельно"""
+    async def fake_current(city):
+        await asyncio.sleep(0.2)
+        return {"city": city, "temperature": 20.4, "description": "ясно",
+                "weather_code": 0, "humidity": 50, "wind_speed": 3.0}
+
+    async def fake_forecast(city):
+        await asyncio.sleep(0.2)
+        return {"daily": [], "hourly": []}
+
+    weather_service._get_current_weather = fake_current
+    weather_service._get_forecast = fake_forecast
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await weather_service._fetch_weather_by_city("Moscow")
+
+    assert loop.time() - started < 0.35
+    assert result["city"] == "Moscow"
+    assert result["current"]["temperature"] == 20
+
+
+@pytest.mark.asyncio
+async def test_get_weather_by_city_cancels_sibling_on_error(weather_service):
+    """Ошибка одного запроса отменяет параллельный запрос"""
+    cancelled = asyncio.Event()
+
+    async def failing_current(city):
+        raise Exception("Город не найден")
+
+    async def slow_forecast(city):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    weather_service._get_current_weather = failing_current
+    weather_service._get_forecast = slow_forecast
+
+    with pytest.raises(Exception, match="Город не найден"):
+        await weather_service._fetch_weather_by_city("Nowhere")
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_get_weather_batch_dedupes_and_yields_hits_first(weather_service):
+    """Пакетный запрос объединяет дубли и сначала отдает попадания в кэш"""
+    weather_service.cache = WeatherCache("test:city", redis_url=None)
+    weather_service.tile_cache = WeatherCache("test:tile", redis_url=None)
+    await weather_service.cache.set("london", {"city": "London"})
+    calls = []
+
+    async def fake_fetch(city):
+        calls.append(city)
+        await asyncio.sleep(0.05)
+        if city == "Nowhere":
+            raise Exception("Город не найден")
+        return {"city": city}
+
+    weather_service._fetch_weather_by_city = fake_fetch
+
+    results = [item async for item in weather_service.get_weather_batch(
+        ["Moscow", "London", " moscow ", "Nowhere"], []
+    )]
+
+    assert results[0] == {"query": {"city": "London"}, "status": "ok", "data": {"city": "London"}}
+    assert sorted(calls) == ["Moscow", "Nowhere"]
+    statuses = {item["query"]["city"]: item["status"] for item in results}
+    assert statuses == {"London": "ok", "Moscow": "ok", "Nowhere": "error"}
+
+
+@pytest.mark.asyncio
+async def test_fetch_weather_by_city_from_provider(weather_service, mock_owm):
+    """Ответ OpenWeatherMap приводится к схеме get_weather_by_city"""
+    service = point_to(weather_service, mock_owm[0])
+    service.forecast_cache = WeatherCache("test:forecast", redis_url=None)
+    try:
+        result = await service._fetch_weather_by_city("Moscow")
+        assert result["city"] == "Moscow"
+        assert set(result["current"]) == {"temperature", "weather", "weather_code", "humidity", "wind_speed"}
+        assert result["current"]["weather_code"] in (0, 1, 2, 3, 45, 51, 61, 71, 95)
+        assert len(result["daily_forecast"]) >= 5
+        assert len(result["hourly_forecast"]) == 8
+    finally:
+        await service.close()
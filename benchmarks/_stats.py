@@ -0,0 +1,9 @@
+"""Общие функции статистики для скриптов замеров."""
+from typing import List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль pct (0-100) по ближайшему рангу"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
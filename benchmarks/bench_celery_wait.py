@@ -0,0 +1,173 @@
+"""Сравнение ожидания Celery задач: опрос task.ready() против pub/sub.
+
+Оба варианта работают с настоящим Redis backend'ом Celery (REDIS_URL):
+push - это wait_for_celery_task из app/api/v1/routes.py (CeleryResultWaiter
+с подпиской на канал результата), poll - прежний цикл с синхронным
+task.ready() каждые 100 мс.
+
+Источник результатов (--source):
+  backend - отдельный поток записывает результат через celery_app.backend
+            .store_result (тот же SET + PUBLISH, что делает воркер) в заранее
+            заданный момент; задержка = пробуждение обработчика - запись;
+  worker  - настоящие задачи (встроенная celery.accumulate) в запущенном
+            воркере; задержка = пробуждение обработчика - date_done задачи.
+
+Отчет: p50/p99 задержки, суммарное время блокировки event loop синхронными
+вызовами и p99 лага event loop.
+
+Запуск (нужен Redis, для --source worker - и воркер):
+    python benchmarks/bench_celery_wait.py --requests 500 --task-ms 150
+    celery -A app.celery_dir.celery_app worker --loglevel=warning &
+    python benchmarks/bench_celery_wait.py --source worker --requests 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import timezone
+from typing import Dict, List, Tuple
+
+from celery import states
+from celery.result import AsyncResult
+
+from _stats import percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.v1.routes import result_waiter, wait_for_celery_task
+from app.celery_dir.celery_app import celery_app
+from app.core.redis_client import close_redis
+
+
+class ResultWriter(threading.Thread):
+    """Запись результатов задач в backend в заданные моменты (time.time())"""
+
+    def __init__(self, schedule: List[Tuple[float, str]]):
+        super().__init__(daemon=True)
+        self.schedule = sorted(schedule)
+        self.stored_at: Dict[str, float] = {}
+
+    def run(self):
+        for done_at, task_id in self.schedule:
+            delay = done_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            # Момент до записи: PUBLISH может разбудить обработчик раньше возврата из store_result
+            self.stored_at[task_id] = time.time()
+            celery_app.backend.store_result(task_id, {"ok": True}, states.SUCCESS)
+
+
+async def legacy_poll_wait(task: AsyncResult, blocking: Dict[str, float], timeout: float = 30):
+    """Прежняя реализация: синхронная проверка ready() каждые 100 мс"""
+    for _ in range(int(timeout * 10)):
+        started = time.perf_counter()
+        ready = task.ready()
+        blocking["total"] += time.perf_counter() - started
+        if ready:
+            started = time.perf_counter()
+            result = task.result
+            blocking["total"] += time.perf_counter() - started
+            return result
+        await asyncio.sleep(0.1)
+    raise Exception("Task timeout exceeded")
+
+
+async def monitor_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval) * 1000)
+
+
+async def run(mode: str, source: str, requests: int, mean_task: float, seed: int) -> Dict[str, float]:
+    rng = random.Random(seed)
+    blocking = {"total": 0.0}
+    woke_at: Dict[str, float] = {}
+    lag: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(stop, lag))
+
+    if source == "backend":
+        now = time.time()
+        task_ids = [uuid.uuid4().hex for _ in range(requests)]
+        writer = ResultWriter([(now + rng.expovariate(1 / mean_task), task_id) for task_id in task_ids])
+        tasks = [AsyncResult(task_id, app=celery_app) for task_id in task_ids]
+    else:
+        tasks = [celery_app.send_task("celery.accumulate", args=[i]) for i in range(requests)]
+
+    async def one(task: AsyncResult):
+        if mode == "poll":
+            await legacy_poll_wait(task, blocking)
+        else:
+            await wait_for_celery_task(task)
+        woke_at[task.id] = time.time()
+
+    started = time.perf_counter()
+    waiters = asyncio.gather(*[one(task) for task in tasks])
+    if source == "backend":
+        writer.start()
+    await waiters
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    if source == "backend":
+        writer.join()
+        done_at = writer.stored_at
+    else:
+        done_at = {}
+        for task in tasks:
+            date_done = task.date_done
+            if date_done.tzinfo is None:
+                date_done = date_done.replace(tzinfo=timezone.utc)
+            done_at[task.id] = date_done.timestamp()
+    overheads = [(woke_at[task_id] - done_at[task_id]) * 1000 for task_id in woke_at]
+    for task in tasks:
+        task.forget()
+
+    return {
+        "p50_ms": percentile(overheads, 50),
+        "p99_ms": percentile(overheads, 99),
+        "mean_ms": statistics.mean(overheads),
+        "blocking_ms": blocking["total"] * 1000,
+        "loop_lag_p99_ms": percentile(lag, 99) if lag else 0.0,
+        "elapsed_s": elapsed,
+    }
+
+
+async def run_all(args) -> Dict[str, Dict[str, float]]:
+    results = {}
+    try:
+        for mode in ("poll", "push"):
+            results[mode] = await run(mode, args.source, args.requests, args.task_ms / 1000, args.seed)
+    finally:
+        await result_waiter.close()
+        await close_redis()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("backend", "worker"), default="backend")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--task-ms", type=float, default=150, help="Среднее время до результата (--source backend)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_all(args))
+    print(f"{'mode':<6} {'p50, ms':>9} {'p99, ms':>9} {'mean, ms':>9} {'blocking, ms':>13} {'lag p99, ms':>12}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<6} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['mean_ms']:>9.1f} "
+            f"{result['blocking_ms']:>13.1f} {result['loop_lag_p99_ms']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Нагрузочный замер задержки эндпоинтов погоды в разных режимах выполнения.
+
+Скрипт обращается к запущенному приложению, поэтому сравнение режимов
+делается двумя прогонами:
+
+    WEATHER_EXECUTION_MODE=celery uvicorn app.main:app --port 8000
+    python benchmarks/bench_execution_mode.py --label celery
+
+    WEATHER_EXECUTION_MODE=inline uvicorn app.main:app --port 8000
+    python benchmarks/bench_execution_mode.py --label inline
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+import aiohttp
+
+from _stats import percentile
+
+
+async def run(base_url: str, cities: List[str], requests: int, concurrency: int):
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(base_url=base_url) as session:
+        async def one(i: int):
+            nonlocal errors
+            city = cities[i % len(cities)]
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post("/api/v1/weather", json={"city": city}) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(requests)])
+        elapsed = time.perf_counter() - started
+
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--cities", default="Moscow,London,Paris,Berlin,Tokyo")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--label", default="run")
+    args = parser.parse_args()
+
+    latencies, errors, elapsed = asyncio.run(
+        run(args.url, args.cities.split(","), args.requests, args.concurrency)
+    )
+    print(
+        f"{args.label}: {len(latencies) / elapsed:.1f} req/s, "
+        f"p50={percentile(latencies, 50):.1f}ms p95={percentile(latencies, 95):.1f}ms "
+        f"p99={percentile(latencies, 99):.1f}ms errors={errors}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Микробенчмарк сериализации JSON на типичных данных о погоде.
+
+Сравнивает стандартный json и orjson (если установлен) на ответе
+/forecast OpenWeatherMap (40 отрезков) и на ответе эндпоинта погоды:
+время кодирования/декодирования и выделения памяти на одну операцию.
+
+    python benchmarks/bench_json.py --number 2000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def forecast_payload() -> Dict[str, Any]:
+    """Ответ /forecast: 40 отрезков по 3 часа"""
+    start = 1704067200
+    return {
+        "cod": "200",
+        "message": 0,
+        "cnt": 40,
+        "list": [
+            {
+                "dt": start + i * 10800,
+                "main": {
+                    "temp": -3.5 + i * 0.25, "feels_like": -7.1 + i * 0.25, "temp_min": -4.0,
+                    "temp_max": -3.0, "pressure": 1012, "sea_level": 1012, "grnd_level": 990,
+                    "humidity": 80 + i % 10, "temp_kf": 0.4,
+                },
+                "weather": [{"id": 600 + i % 3, "main": "Snow", "description": "небольшой снег", "icon": "13n"}],
+                "clouds": {"all": 100},
+                "wind": {"speed": 4.2, "deg": 220, "gust": 9.1},
+                "visibility": 10000,
+                "pop": 0.2 * (i % 5),
+                "snow": {"3h": 0.31},
+                "sys": {"pod": "n" if i % 8 < 4 else "d"},
+                "dt_txt": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + i * 10800)),
+            }
+            for i in range(40)
+        ],
+        "city": {
+            "id": 524901, "name": "Москва", "coord": {"lat": 55.7522, "lon": 37.6156},
+            "country": "RU", "population": 1000000, "timezone": 10800,
+            "sunrise": 1704088453, "sunset": 1704113621,
+        },
+    }
+
+
+def weather_response() -> Dict[str, Any]:
+    """Ответ эндпоинта /weather/{city}"""
+    return {
+        "city": "Москва",
+        "current": {"temperature": -3, "weather": "Небольшой Снег", "weather_code": 71, "humidity": 85, "wind_speed": 15},
+        "daily_forecast": [
+            {"date": f"2024-01-0{d + 1}", "temp_max": -1, "temp_min": -6, "weather": "Небольшой Снег", "precipitation": 1.2}
+            for d in range(5)
+        ],
+        "hourly_forecast": [
+            {"time": f"2024-01-01T{h * 3:02d}:00:00+03:00", "temperature": -3, "weather": "Небольшой Снег",
+             "precipitation_probability": 20}
+            for h in range(8)
+        ],
+        "timestamp": "2024-01-01T12:00:00.000000",
+    }
+
+
+def codecs() -> List[Tuple[str, Callable[[Any], Any], Callable[[Any], Any]]]:
+    result = [(
+        "json",
+        lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        json.loads,
+    )]
+    if orjson is not None:
+        result.append(("orjson", orjson.dumps, orjson.loads))
+    return result
+
+
+def measure(fn: Callable[[], Any], number: int) -> Tuple[float, float, float]:
+    """(мкс на вызов, выделено КБ на вызов, пик КБ)"""
+    started = time.perf_counter()
+    for _ in range(number):
+        fn()
+    elapsed = (time.perf_counter() - started) / number * 1e6
+
+    allocations = max(1, number // 20)
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    results = [fn() for _ in range(allocations)]
+    snapshot_after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename"))
+    del results
+    return elapsed, allocated / allocations / 1024, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson не установлен, измеряется только стандартный json")
+
+    for payload_name, payload in (("forecast", forecast_payload()), ("weather", weather_response())):
+        for name, dumps, loads in codecs():
+            encoded = dumps(payload)
+            encode = measure(lambda: dumps(payload), args.number)
+            decode = measure(lambda: loads(encoded), args.number)
+            print(
+                f"{payload_name:<8} {name:<6} {len(encoded):>6}B  "
+                f"encode {encode[0]:8.1f}us {encode[1]:6.1f}KB/op  "
+                f"decode {decode[0]:8.1f}us {decode[1]:6.1f}KB/op peak {decode[2]:.0f}KB"
+            )
+
+
+if __name__ == "__main__":
+    main()
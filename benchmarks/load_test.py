@@ -0,0 +1,202 @@
+"""Нагрузочные сценарии для API с отчетом и сравнением с базовым прогоном.
+
+Сценарии: weather (POST /api/v1/weather), suggestions (/cities/suggestions),
+stats (/stats) и history (/user/history с переходом по next_cursor).
+Для воспроизводимости приложение запускается против локальной замены
+OpenWeatherMap (benchmarks/mock_owm.py):
+
+    python benchmarks/mock_owm.py --port 9001 --latency-ms 80 &
+    WEATHER_API_BASE_URL=http://localhost:9001/data/2.5 \\
+    WEATHER_GEO_URL=http://localhost:9001/geo/1.0 uvicorn app.main:app --port 8000 &
+
+    # Сохранить базовый прогон
+    python benchmarks/load_test.py --save benchmarks/baseline.json
+
+    # Сравнить с ним (код возврата 1 при регрессии больше --tolerance)
+    python benchmarks/load_test.py --baseline benchmarks/baseline.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+
+from _stats import percentile
+
+
+CITIES = [
+    "Moscow", "London", "Paris", "Berlin", "Tokyo", "Madrid", "Rome", "Vienna",
+    "Prague", "Warsaw", "Oslo", "Helsinki", "Dublin", "Lisbon", "Athens", "Kazan",
+]
+# Регрессией считается рост задержки или падение пропускной способности
+LATENCY_METRICS = ("p50", "p95", "p99")
+
+
+class Scenario:
+    """Сценарий нагрузки: запрос номер i для пользователя user_id"""
+
+    def __init__(self, name: str, request: Callable[[aiohttp.ClientSession, int, str], Any]):
+        self.name = name
+        self.request = request
+
+
+async def weather_request(session: aiohttp.ClientSession, i: int, user_id: str) -> int:
+    city = CITIES[i % len(CITIES)]
+    async with session.post("/api/v1/weather", json={"city": city}, cookies={"user_id": user_id}) as response:
+        await response.read()
+        return response.status
+
+
+async def suggestions_request(session: aiohttp.ClientSession, i: int, user_id: str) -> int:
+    city = CITIES[i % len(CITIES)]
+    prefix = city[:2 + i % (len(city) - 1)]
+    async with session.get("/api/v1/cities/suggestions", params={"q": prefix}) as response:
+        await response.read()
+        return response.status
+
+
+async def stats_request(session: aiohttp.ClientSession, i: int, user_id: str) -> int:
+    window = ("all", "hour", "day", "month")[i % 4]
+    async with session.get("/api/v1/stats", params={"window": window}) as response:
+        await response.read()
+        return response.status
+
+
+async def history_request(session: aiohttp.ClientSession, i: int, user_id: str) -> int:
+    # Первая страница и, если есть, следующая по курсору
+    params = {"limit": "20"}
+    for _ in range(2):
+        async with session.get("/api/v1/user/history", params=params, cookies={"user_id": user_id}) as response:
+            body = await response.json()
+            if response.status != 200 or not body.get("next_cursor"):
+                return response.status
+            params["cursor"] = body["next_cursor"]
+    return 200
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("weather", weather_request),
+        Scenario("suggestions", suggestions_request),
+        Scenario("stats", stats_request),
+        Scenario("history", history_request),
+    )
+}
+
+
+async def run_scenario(
+    base_url: str, scenario: Scenario, requests: int, concurrency: int, users: int, warmup: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    user_ids = [f"load-test-{n}" for n in range(users)]
+
+    async with aiohttp.ClientSession(base_url=base_url) as session:
+        async def one(i: int, record: bool):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    status = str(await scenario.request(session, i, user_ids[i % users]))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status = type(e).__name__
+                if record:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        # Прогрев: кэши, пулы соединений, история пользователей
+        await asyncio.gather(*[one(i, record=False) for i in range(warmup)])
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one(i, record=True) for i in range(requests)])
+        elapsed = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if status not in ("200", "304"))
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "error_rate": errors / max(1, len(latencies)),
+        "statuses": statuses,
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Регрессии относительно базового прогона"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {base[metric]:.1f}ms -> {result[metric]:.1f}ms")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}.throughput: {base['throughput']:.1f} -> {result['throughput']:.1f} req/s"
+            )
+        if result["error_rate"] > base["error_rate"] + tolerance / 10:
+            regressions.append(f"{name}.error_rate: {base['error_rate']:.2%} -> {result['error_rate']:.2%}")
+    return regressions
+
+
+def format_result(name: str, result: Dict[str, Any], base: Optional[Dict[str, Any]]) -> str:
+    line = (
+        f"{name:<12} {result['throughput']:8.1f} req/s  p50 {result['p50']:7.1f}ms  "
+        f"p95 {result['p95']:7.1f}ms  p99 {result['p99']:7.1f}ms  errors {result['error_rate']:.2%}"
+    )
+    if base is not None:
+        delta = (result["p95"] / base["p95"] - 1) * 100 if base["p95"] else 0
+        line += f"  (p95 {delta:+.0f}% к базовому)"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Через запятую: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--save", help="Сохранить результаты как базовый прогон (JSON)")
+    parser.add_argument("--baseline", help="Базовый прогон для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Допустимое ухудшение (доля)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+
+    results = {}
+    for name in args.scenarios.split(","):
+        results[name] = asyncio.run(run_scenario(
+            args.url, SCENARIOS[name], args.requests, args.concurrency, args.users, args.warmup
+        ))
+        print(format_result(name, results[name], baseline.get(name)))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "params": {"requests": args.requests, "concurrency": args.concurrency, "users": args.users},
+                "scenarios": results,
+            }, f, indent=2, sort_keys=True)
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Локальная замена OpenWeatherMap для нагрузочных тестов.
+
+Отдает правдоподобные ответы /data/2.5/weather, /data/2.5/forecast и
+/geo/1.0/direct с настраиваемой задержкой, долей ошибок 500 и ответов 429
+(с Retry-After). Города, начинающиеся с "unknown", возвращают 404.
+
+    python benchmarks/mock_owm.py --port 9001 --latency-ms 80 --jitter-ms 40 \\
+        --error-rate 0.01 --rate-429 0.01
+
+    WEATHER_API_BASE_URL=http://localhost:9001/data/2.5 \\
+    WEATHER_GEO_URL=http://localhost:9001/geo/1.0 \\
+    uvicorn app.main:app --port 8000
+"""
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    error_rate: float = 0
+    rate_429: float = 0
+    retry_after: int = 1
+    seed: Optional[int] = None
+    # Счетчики запросов по эндпоинтам и статусам (для отчета и тестов)
+    requests: Dict[str, int] = field(default_factory=dict)
+
+
+DESCRIPTIONS = [
+    (800, "ясно", "01d"), (801, "небольшая облачность", "02d"), (803, "облачно с прояснениями", "04d"),
+    (500, "небольшой дождь", "10d"), (600, "небольшой снег", "13d"), (701, "туман", "50d"),
+]
+
+
+def _city_seed(city: str) -> int:
+    return zlib.crc32(city.casefold().encode("utf-8"))
+
+
+def _coords(city: str):
+    seed = _city_seed(city)
+    return round((seed % 14000) / 100 - 70, 4), round((seed // 14000 % 36000) / 100 - 180, 4)
+
+
+def weather_payload(city: str, now: Optional[int] = None) -> Dict[str, Any]:
+    """Ответ /data/2.5/weather"""
+    seed = _city_seed(city)
+    now = now or int(time.time())
+    lat, lon = _coords(city)
+    weather_id, description, icon = DESCRIPTIONS[seed % len(DESCRIPTIONS)]
+    temp = round((seed % 500) / 10 - 15, 2)
+    return {
+        "coord": {"lon": lon, "lat": lat},
+        "weather": [{"id": weather_id, "main": "Clouds", "description": description, "icon": icon}],
+        "base": "stations",
+        "main": {
+            "temp": temp, "feels_like": round(temp - 2.1, 2), "temp_min": temp - 1, "temp_max": temp + 1,
+            "pressure": 1012, "humidity": 40 + seed % 50, "sea_level": 1012, "grnd_level": 990,
+        },
+        "visibility": 10000,
+        "wind": {"speed": round(seed % 120 / 10, 1), "deg": seed % 360, "gust": 9.1},
+        "clouds": {"all": seed % 100},
+        "dt": now,
+        "sys": {"type": 2, "id": 2000000 + seed % 1000, "country": "RU", "sunrise": now - 20000, "sunset": now + 20000},
+        "timezone": 10800,
+        "id": seed % 10000000,
+        "name": city.strip().title(),
+        "cod": 200,
+    }
+
+
+def forecast_payload(city: str, now: Optional[int] = None) -> Dict[str, Any]:
+    """Ответ /data/2.5/forecast: 40 отрезков по 3 часа"""
+    seed = _city_seed(city)
+    start = (now or int(time.time())) // 10800 * 10800
+    lat, lon = _coords(city)
+    items = []
+    for i in range(40):
+        weather_id, description, icon = DESCRIPTIONS[(seed + i // 4) % len(DESCRIPTIONS)]
+        temp = round((seed % 500) / 10 - 15 + 4 * ((i % 8) - 4) / 4, 2)
+        items.append({
+            "dt": start + i * 10800,
+            "main": {
+                "temp": temp, "feels_like": temp - 2, "temp_min": temp - 0.5, "temp_max": temp + 0.5,
+                "pressure": 1012, "sea_level": 1012, "grnd_level": 990, "humidity": 70 + i % 20, "temp_kf": 0,
+            },
+            "weather": [{"id": weather_id, "main": "Clouds", "description": description, "icon": icon}],
+            "clouds": {"all": 75},
+            "wind": {"speed": 4.2, "deg": 220, "gust": 9.1},
+            "visibility": 10000,
+            "pop": round((i * 7 + seed) % 10 / 10, 1),
+            "rain": {"3h": 0.3} if weather_id == 500 else {},
+            "sys": {"pod": "d" if i % 8 in (3, 4, 5, 6) else "n"},
+            "dt_txt": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + i * 10800)),
+        })
+    return {
+        "cod": "200",
+        "message": 0,
+        "cnt": 40,
+        "list": items,
+        "city": {
+            "id": seed % 10000000, "name": city.strip().title(), "coord": {"lat": lat, "lon": lon},
+            "country": "RU", "population": 100000 + seed % 1000000, "timezone": 10800,
+            "sunrise": start - 20000, "sunset": start + 20000,
+        },
+    }
+
+
+def geo_payload(query: str, limit: int) -> List[Dict[str, Any]]:
+    """Ответ /geo/1.0/direct"""
+    results = []
+    for i in range(min(limit, 3)):
+        name = query.strip().title() + ("" if i == 0 else f" {i + 1}")
+        lat, lon = _coords(name)
+        results.append({
+            "name": name,
+            "local_names": {"ru": name, "en": name},
+            "lat": lat,
+            "lon": lon,
+            "country": "RU",
+            "state": "Region",
+        })
+    return results
+
+
+def make_app(config: MockConfig) -> web.Application:
+    rng = random.Random(config.seed)
+
+    async def simulate(request: web.Request, endpoint: str) -> Optional[web.Response]:
+        delay = config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if request.query.get("appid") is None:
+            status = 401
+        else:
+            roll = rng.random()
+            if roll < config.rate_429:
+                status = 429
+            elif roll < config.rate_429 + config.error_rate:
+                status = 500
+            else:
+                status = 200
+        key = f"{endpoint}:{status}"
+        config.requests[key] = config.requests.get(key, 0) + 1
+
+        if status == 429:
+            return web.json_response(
+                {"cod": 429, "message": "Too many requests"}, status=429,
+                headers={"Retry-After": str(config.retry_after)},
+            )
+        if status != 200:
+            return web.json_response({"cod": status, "message": "error"}, status=status)
+        return None
+
+    def city_or_404(request: web.Request):
+        city = request.query.get("q", "")
+        if not city or city.casefold().startswith("unknown"):
+            return None, web.json_response({"cod": "404", "message": "city not found"}, status=404)
+        return city, None
+
+    async def weather(request: web.Request) -> web.Response:
+        error = await simulate(request, "weather")
+        if error is not None:
+            return error
+        if "lat" in request.query and "lon" in request.query:
+            return web.json_response(weather_payload(f"{request.query['lat']},{request.query['lon']}"))
+        city, not_found = city_or_404(request)
+        return not_found or web.json_response(weather_payload(city))
+
+    async def forecast(request: web.Request) -> web.Response:
+        error = await simulate(request, "forecast")
+        if error is not None:
+            return error
+        city, not_found = city_or_404(request)
+        return not_found or web.json_response(forecast_payload(city))
+
+    async def direct(request: web.Request) -> web.Response:
+        error = await simulate(request, "direct")
+        if error is not None:
+            return error
+        return web.json_response(geo_payload(request.query.get("q", ""), int(request.query.get("limit", 5))))
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(config.requests)
+
+    app = web.Application()
+    app.router.add_get("/data/2.5/weather", weather)
+    app.router.add_get("/data/2.5/forecast", forecast)
+    app.router.add_get("/geo/1.0/direct", direct)
+    app.router.add_get("/_stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-429", type=float, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_429=args.rate_429, retry_after=args.retry_after, seed=args.seed,
+    )
+    web.run_app(make_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "search_history" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "user_id" VARCHAR(255) NOT NULL,
+    "city" VARCHAR(100) NOT NULL,
+    "temperature" DOUBLE PRECISION NOT NULL,
+    "timestamp" TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_search_hist_user_id_cfbc5a" ON "search_history" ("user_id");
+CREATE INDEX IF NOT EXISTS "idx_search_hist_city_4758d4" ON "search_history" ("city");
+CREATE TABLE IF NOT EXISTS "aerich" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "version" VARCHAR(255) NOT NULL,
+    "app" VARCHAR(100) NOT NULL,
+    "content" JSONB NOT NULL
+);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        """
@@ -0,0 +1,13 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX IF NOT EXISTS "idx_search_hist_user_id_8f8082" ON "search_history" ("user_id", "timestamp" DESC, "id" DESC);
+        DROP INDEX IF EXISTS "idx_search_hist_user_id_cfbc5a";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX IF NOT EXISTS "idx_search_hist_user_id_cfbc5a" ON "search_history" ("user_id");
+        DROP INDEX IF EXISTS "idx_search_hist_user_id_8f8082";"""
@@ -0,0 +1,57 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "search_history" RENAME TO "search_history_old";
+        ALTER INDEX "search_history_pkey" RENAME TO "search_history_old_pkey";
+        DROP INDEX IF EXISTS "idx_search_hist_user_id_8f8082";
+        DROP INDEX IF EXISTS "idx_search_hist_city_4758d4";
+        CREATE TABLE "search_history" (
+    "id" INTEGER NOT NULL DEFAULT nextval('search_history_id_seq'),
+    "user_id" VARCHAR(255) NOT NULL,
+    "city" VARCHAR(100) NOT NULL,
+    "temperature" DOUBLE PRECISION NOT NULL,
+    "timestamp" TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY ("id", "timestamp")
+) PARTITION BY RANGE ("timestamp");
+        ALTER SEQUENCE "search_history_id_seq" OWNED BY "search_history"."id";
+        CREATE INDEX "idx_search_hist_user_id_8f8082" ON "search_history" ("user_id", "timestamp" DESC, "id" DESC);
+        CREATE INDEX "idx_search_hist_city_4758d4" ON "search_history" ("city");
+        DO $$
+        DECLARE
+            day DATE := (COALESCE((SELECT MIN("timestamp") FROM "search_history_old"), NOW()) AT TIME ZONE 'UTC')::date;
+        BEGIN
+            WHILE day <= (NOW() AT TIME ZONE 'UTC')::date + 7 LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF "search_history" FOR VALUES FROM (%L) TO (%L)',
+                    'search_history_p' || to_char(day, 'YYYYMMDD') || '_' || to_char(day + 1, 'YYYYMMDD'),
+                    day::text || ' 00:00:00+00',
+                    (day + 1)::text || ' 00:00:00+00'
+                );
+                day := day + 1;
+            END LOOP;
+        END $$;
+        CREATE TABLE "search_history_default" PARTITION OF "search_history" DEFAULT;
+        INSERT INTO "search_history" ("id", "user_id", "city", "temperature", "timestamp")
+            SELECT "id", "user_id", "city", "temperature", "timestamp" FROM "search_history_old";
+        DROP TABLE "search_history_old";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE "search_history_plain" (
+    "id" INTEGER NOT NULL DEFAULT nextval('search_history_id_seq') PRIMARY KEY,
+    "user_id" VARCHAR(255) NOT NULL,
+    "city" VARCHAR(100) NOT NULL,
+    "temperature" DOUBLE PRECISION NOT NULL,
+    "timestamp" TIMESTAMPTZ NOT NULL
+);
+        INSERT INTO "search_history_plain" ("id", "user_id", "city", "temperature", "timestamp")
+            SELECT "id", "user_id", "city", "temperature", "timestamp" FROM "search_history";
+        ALTER SEQUENCE "search_history_id_seq" OWNED BY "search_history_plain"."id";
+        DROP TABLE "search_history";
+        ALTER TABLE "search_history_plain" RENAME TO "search_history";
+        ALTER INDEX "search_history_plain_pkey" RENAME TO "search_history_pkey";
+        CREATE INDEX "idx_search_hist_user_id_8f8082" ON "search_history" ("user_id", "timestamp" DESC, "id" DESC);
+        CREATE INDEX "idx_search_hist_city_4758d4" ON "search_history" ("city");"""
@@ -0,0 +1,90 @@
+"""Сборка статики: имена с хэшем содержимого и заранее сжатые версии.
+
+Для каждого файла app/static (кроме dist/) создается app/static/dist/<путь
+с хэшем>, рядом - .gz и .br (если установлен brotli), и манифест
+dist/manifest.json с соответствием исходных путей собранным. Шаблоны
+получают URL через static_url(), поэтому после сборки ссылаются на файлы
+с хэшем, которые можно кэшировать бессрочно.
+
+    python scripts/build_static.py
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.static_assets import BUILD_DIR, MANIFEST_NAME, STATIC_DIR  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Сжимать имеет смысл только текстовые форматы
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".html", ".svg", ".json", ".txt", ".map"}
+MIN_COMPRESS_SIZE = 256
+
+
+def hashed_name(path: str, data: bytes) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def build(static_dir: str) -> dict:
+    out_dir = os.path.join(static_dir, BUILD_DIR)
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != out_dir)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            rel_path = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+
+            target_rel = hashed_name(rel_path, data)
+            target = os.path.join(out_dir, target_rel)
+            write_file(target, data)
+            manifest[rel_path] = target_rel
+
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS or len(data) < MIN_COMPRESS_SIZE:
+                continue
+            # mtime=0 - одинаковый результат при повторной сборке
+            write_file(target + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                write_file(target + ".br", brotli.compress(data, quality=11))
+
+    write_file(
+        os.path.join(out_dir, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    args = parser.parse_args()
+
+    manifest = build(args.static_dir)
+    for source, target in manifest.items():
+        print(f"{source} -> {BUILD_DIR}/{target}")
+    if brotli is None:
+        print("brotli не установлен, созданы только .gz версии")
+
+
+if __name__ == "__main__":
+    main()